@@ -1 +1,2 @@
+from .config import config
 from .extension import load_ipython_extension, unload_ipython_extension
@@ -0,0 +1,205 @@
+import re
+import threading
+import weakref
+from typing import Dict, Tuple, Optional, Mapping
+
+import logbook
+import numpy as np
+from pandas import CategoricalDtype, DataFrame, Index, StringDtype
+
+from ipandas import background
+from ipandas.deadline import Deadline
+from ipandas.schema import SchemaFrame
+from ipandas.stats import count
+
+logger = logbook.Logger('IPandasCompleter')
+
+# dtypes standing for the column kinds of the dataframe interchange protocol (DtypeKind values)
+_INTERCHANGE_DTYPES = {
+    0: np.dtype('int64'),
+    1: np.dtype('uint64'),
+    2: np.dtype('float64'),
+    20: np.dtype('bool'),
+    21: StringDtype(),
+    22: np.dtype('datetime64[ns]'),
+    23: CategoricalDtype(),
+}
+
+# dtypes standing for the type names of other libraries' schemas (polars, ibis), by their first word
+_TYPE_NAME_DTYPES = (
+    (re.compile(r'bool'), np.dtype('bool')),
+    (re.compile(r'uint'), np.dtype('uint64')),
+    (re.compile(r'int'), np.dtype('int64')),
+    (re.compile(r'float|double|decimal'), np.dtype('float64')),
+    (re.compile(r'str|utf8'), StringDtype()),
+    (re.compile(r'date|timestamp'), np.dtype('datetime64[ns]')),
+    (re.compile(r'categor|enum'), CategoricalDtype()),
+)
+
+
+def _arrow_schema_of(value):
+    """
+    Returns the pyarrow Schema of a pyarrow Table, RecordBatch or Dataset, or of any object exporting
+    an Arrow C schema. None for other objects, pyarrow is only imported if the value came from it.
+    """
+    value_type = type(value)
+    if value_type.__module__.split('.')[0] == 'pyarrow' and hasattr(value_type, 'schema'):
+        return value.schema
+    if hasattr(value_type, '__arrow_c_schema__'):
+        import pyarrow
+        return pyarrow.schema(value)
+    return None
+
+
+def from_arrow_schema(schema, frame_type: type) -> SchemaFrame:
+    """
+    Adapts a pyarrow Schema, the Arrow types are wrapped as pandas ArrowDtypes.
+    """
+    from pandas import ArrowDtype
+    return SchemaFrame(Index(list(schema.names), dtype=object), index_names=(), frame_type=frame_type,
+                       dtypes=[ArrowDtype(arrow_type) for arrow_type in schema.types])
+
+
+def _dtype_of_type_name(name: str):
+    name = name.lstrip('!').lower()
+    for pattern, dtype in _TYPE_NAME_DTYPES:
+        if pattern.match(name):
+            return dtype
+    return np.dtype(object)
+
+
+def from_schema_attribute(value, frame_type: type) -> Optional[SchemaFrame]:
+    """
+    Adapts a frame by its `schema` - a pyarrow Schema, an object with `names` and `types` (ibis)
+    or a mapping of names to types (polars). A method (ex. ibis' Table.schema()) is called.
+    Lazy frames know their schema without running their query. None if there's no such schema.
+    """
+    schema = getattr(value, 'schema', None)
+    if callable(schema):
+        schema = schema()
+    if schema is None:
+        return None
+    if type(schema).__module__.split('.')[0] == 'pyarrow':
+        return from_arrow_schema(schema, frame_type)
+    if hasattr(schema, 'names') and hasattr(schema, 'types'):
+        names, types = list(schema.names), list(schema.types)
+    elif isinstance(schema, Mapping):
+        names, types = list(schema.keys()), list(schema.values())
+    else:
+        return None
+    return SchemaFrame(Index(names, dtype=object), index_names=(), frame_type=frame_type,
+                       dtypes=[_dtype_of_type_name(str(column_type)) for column_type in types])
+
+
+def from_interchange(value, frame_type: type) -> SchemaFrame:
+    """
+    Adapts an object implementing the dataframe interchange protocol (`__dataframe__`).
+    Only column metadata is read, no buffers are requested - but lazy frames may run their query to build
+    the interchange object, so it's only called while completing the frame, see SchemaAdapters.get.
+    """
+    interchange = value.__dataframe__()
+    names = list(interchange.column_names())
+    dtypes = []
+    for name in names:
+        try:
+            kind = int(interchange.get_column_by_name(name).dtype[0])
+        except (NotImplementedError, TypeError, ValueError):
+            kind = None
+        dtypes.append(_INTERCHANGE_DTYPES.get(kind, np.dtype(object)))
+    return SchemaFrame(Index(names, dtype=object), index_names=(), frame_type=frame_type, dtypes=dtypes)
+
+
+def is_adaptable(value) -> bool:
+    """
+    Returns True for the non pandas frames we complete through their schema - Arrow tables and datasets,
+    and frames implementing the dataframe interchange protocol. Only the type is looked at.
+    """
+    if isinstance(value, (DataFrame, type)):
+        return False
+    value_type = type(value)
+    if value_type.__module__.split('.')[0] == 'pyarrow':
+        return hasattr(value_type, 'schema')
+    return hasattr(value_type, '__arrow_c_schema__') or hasattr(value_type, '__dataframe__')
+
+
+def adapt(value, interchange: bool = False) -> Optional[SchemaFrame]:
+    """
+    Reads the schema of `value` into a SchemaFrame, None if it isn't adaptable or reading it fails.
+    :param interchange: fall back to the dataframe interchange protocol, which may materialize lazy frames
+    """
+    try:
+        schema = _arrow_schema_of(value)
+        if schema is not None:
+            return from_arrow_schema(schema, type(value))
+        if hasattr(type(value), '__dataframe__'):
+            schema = from_schema_attribute(value, type(value))
+            if schema is None and interchange:
+                schema = from_interchange(value, type(value))
+            return schema
+    except Exception as e:
+        # third party frames can fail in any way, completion must not
+        logger.debug('could not read the schema of {}: {!r}'.format(type(value).__name__, e))
+    return None
+
+
+class SchemaAdapters(object):
+    """
+    SchemaFrames of non pandas frames, keyed by the frame object.
+
+    These frames are treated as immutable (Arrow tables are, lazy frames return new objects on every operation),
+    the schema is read once per object and the same SchemaFrame is returned for as long as the object is alive -
+    so the column index and every other cache keyed by the SchemaFrame stay warm.
+    """
+
+    def __init__(self):
+        # id(value) -> (weakref to value, schema)
+        self._schemas = {}  # type: Dict[int, Tuple[weakref.ref, SchemaFrame]]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def _forget(self, key: int) -> None:
+        with self._lock:
+            self._schemas.pop(key, None)
+
+    def cached(self, value) -> Optional[SchemaFrame]:
+        entry = self._schemas.get(id(value))
+        if entry is not None and entry[0]() is value:
+            return entry[1]
+        return None
+
+    def get(self, value, deadline: Deadline = None) -> Optional[SchemaFrame]:
+        """
+        Returns the SchemaFrame of `value`, reading its schema if we haven't seen this object yet.
+        :param deadline: of the request completing `value`. Frames only known through the interchange protocol
+                         are only read with one, on the background thread pool and waiting until the deadline
+        """
+        schema = self.cached(value)
+        count('adapter.hit' if schema is not None else 'adapter.miss')
+        if schema is not None:
+            return schema
+        schema = adapt(value)
+        if schema is None:
+            if deadline is None or not hasattr(type(value), '__dataframe__'):
+                return None
+            return deadline.wait(background.submit(('interchange', id(value)), self._adapt_interchange, value))
+        return self._remember(value, schema)
+
+    def _adapt_interchange(self, value) -> Optional[SchemaFrame]:
+        schema = adapt(value, interchange=True)
+        return self._remember(value, schema) if schema is not None else None
+
+    def _remember(self, value, schema: SchemaFrame) -> SchemaFrame:
+        key = id(value)
+        try:
+            ref = weakref.ref(value, lambda _, key=key: self._forget(key))
+        except TypeError:
+            # not weak-referencable, read the schema on every request rather than keeping the object alive
+            return schema
+        with self._lock:
+            self._schemas[key] = (ref, schema)
+        return schema
+
+
+schema_adapters = SchemaAdapters()
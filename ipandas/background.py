@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait as wait_for
+from typing import Callable, Dict, Hashable, Optional
+
+import logbook
+
+logger = logbook.Logger('IPandasCompleter')
+
+MAX_WORKERS = 2
+
+_executor = None  # type: Optional[ThreadPoolExecutor]
+_pending = {}  # type: Dict[Hashable, Future]
+_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='ipandas')
+    return _executor
+
+
+def _log_failure(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.debug('background task failed: {!r}'.format(future.exception()))
+
+
+def submit(key: Hashable, fn: Callable, *args, **kwargs) -> Future:
+    """
+    Runs `fn` on the background thread pool, unless a task with the same key is already pending.
+    :return: the future of the (possibly already pending) task
+    """
+    with _lock:
+        future = _pending.get(key)
+        if future is not None:
+            return future
+        future = _get_executor().submit(fn, *args, **kwargs)
+        _pending[key] = future
+
+    def _done(f, key=key):
+        with _lock:
+            if _pending.get(key) is f:
+                del _pending[key]
+        _log_failure(f)
+
+    future.add_done_callback(_done)
+    return future
+
+
+def shutdown(wait: bool = False) -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+        for future in _pending.values():
+            future.cancel()
+        _pending.clear()
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def wait(timeout: float = None) -> None:
+    """
+    Blocks until the pending tasks are done, or `timeout` seconds passed.
+    """
+    with _lock:
+        futures = list(_pending.values())
+    wait_for(futures, timeout=timeout)
@@ -0,0 +1,495 @@
+"""
+Static schema inference of method chains.
+
+`df[["a", "b"]].groupby(by="` or `df.rename(columns={"a": "b"}).sort_values("` complete the columns of
+the chain's result. The chain is parsed (not evaluated) and the column labels of the root frame are
+pushed through the methods that change them, so no pandas code runs on the data.
+"""
+import ast
+import re
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Optional, Tuple, Callable, List, Dict
+
+import logbook
+from pandas import DataFrame, Index, MultiIndex
+
+from ipandas.schema import SchemaFrame
+from ipandas.stats import count
+
+logger = logbook.Logger('IPandasCompleter')
+
+# the inferred frame is bound to this name in the text handed to the matchers
+CHAIN_ALIAS = '__ipandas_chain__'
+# inferred schemas of this many chains are kept
+MAX_CACHED_CHAINS = 64
+
+_OPENING = {'(', '[', '{'}
+_CLOSING = {')', ']', '}'}
+_NAME = 'name'
+_CLOSE = 'close'
+_DOT = 'dot'
+_OTHER = 'other'
+
+method_call_re = re.compile(r'\.\s*\w+\s*$')
+
+# methods returning a frame with the columns of the receiver
+PRESERVING_METHODS = frozenset([
+    'abs', 'astype', 'at_time', 'between_time', 'bfill', 'clip', 'convert_dtypes', 'copy', 'cummax', 'cummin',
+    'cumprod', 'cumsum', 'diff', 'drop_duplicates', 'dropna', 'explode', 'ffill', 'fillna', 'head', 'infer_objects',
+    'interpolate', 'isna', 'isnull', 'mask', 'nlargest', 'notna', 'notnull', 'nsmallest', 'pct_change', 'query',
+    'rank', 'replace', 'round', 'sample', 'shift', 'sort_index', 'sort_values', 'tail', 'truncate', 'tz_convert',
+    'tz_localize', 'where',
+])
+
+# pandas functions returning a frame, interpreted by the ChainInterpreter method of the same name
+FUNCTIONS = frozenset(['concat', 'merge'])
+
+# methods changing the columns, interpreted by the ChainInterpreter method of the same name
+HANDLED_METHODS = frozenset([
+    'add_prefix', 'add_suffix', 'assign', 'drop', 'filter', 'merge', 'reindex', 'rename', 'reset_index', 'set_index',
+])
+
+_UNKNOWN = object()
+
+
+class _Unknown(Exception):
+    """
+    Raised when the schema of an expression can't be inferred statically.
+    """
+
+
+def chain_span(text: str) -> Optional[Tuple[int, int]]:
+    """
+    Finds the expression whose call or subscript the cursor (the end of `text`) is in.
+
+    For `x = df.rename(columns={"a": "b"}).groupby(by="` this is `df.rename(columns={"a": "b"})`,
+    for `df[["a"]][["` it is `df[["a"]]`.
+    :return: (start, end) offsets of the expression in `text`, None if the cursor isn't in a call or subscript
+    """
+    # (opening bracket, offset, start of the expression the bracket is applied to or None)
+    brackets = []  # type: List[Tuple[str, int, Optional[int]]]
+    # start of the primary expression (atom followed by trailers) at the current nesting level
+    chain_start = None  # type: Optional[int]
+    previous = _OTHER
+    i, length = 0, len(text)
+    while i < length:
+        char = text[i]
+        if char.isalnum() or char == '_':
+            end = i + 1
+            while end < length and (text[end].isalnum() or text[end] == '_'):
+                end += 1
+            if previous != _DOT:
+                chain_start = i
+            previous = _NAME
+            i = end
+            continue
+        if char in '\'"':
+            end = _string_end(text, i)
+            if end is None:
+                # the cursor is inside this string
+                break
+            chain_start = i
+            previous = _CLOSE
+            i = end
+            continue
+        if char == '#':
+            end = text.find('\n', i)
+            if end == -1:
+                break
+            i = end
+            continue
+        if char in _OPENING:
+            receiver = chain_start if previous in (_NAME, _CLOSE) else None
+            brackets.append((char, i, receiver))
+            chain_start = None
+            previous = _OTHER
+        elif char in _CLOSING:
+            if not brackets:
+                return None
+            _, offset, receiver = brackets.pop()
+            chain_start = receiver if receiver is not None else offset
+            previous = _CLOSE
+        elif char == '.':
+            if previous in (_NAME, _CLOSE):
+                previous = _DOT
+            else:
+                chain_start = None
+                previous = _OTHER
+        elif not char.isspace() and char != '\\':
+            chain_start = None
+            previous = _OTHER
+        i += 1
+
+    # innermost call or subscript, skipping literals like the list in `df.groupby(by=["a", "`
+    for bracket, offset, receiver in reversed(brackets):
+        if receiver is None or bracket == '{':
+            continue
+        if bracket == '[':
+            return receiver, offset
+        method = method_call_re.search(text, receiver, offset)
+        return (receiver, method.start()) if method else None
+    return None
+
+
+def _string_end(text: str, start: int) -> Optional[int]:
+    quote = text[start]
+    if text.startswith(quote * 3, start):
+        end = text.find(quote * 3, start + 3)
+        return end + 3 if end != -1 else None
+    i = start + 1
+    while i < len(text):
+        char = text[i]
+        if char == '\\':
+            i += 2
+            continue
+        if char == quote or char == '\n':
+            return i + 1 if char == quote else None
+        i += 1
+    return None
+
+
+def _literal(node: ast.AST):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return _UNKNOWN
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)) and not isinstance(value, str):
+        return list(value)
+    return [value]
+
+
+def _known(value):
+    if value is _UNKNOWN:
+        raise _Unknown()
+    return value
+
+
+def _labels(labels: list) -> Index:
+    return Index(labels) if labels and all(isinstance(label, tuple) for label in labels) \
+        else Index(labels, dtype=object, tupleize_cols=False)
+
+
+class ChainInterpreter(object):
+    """
+    Abstract interpreter over the AST of a chain, the values are SchemaFrames.
+
+    `resolve` maps a name to the DataFrame bound to it (or None),
+    the names it resolved are kept in `bindings` to validate cached results.
+    """
+
+    def __init__(self, resolve: Callable[[str], Optional[DataFrame]]):
+        self.resolve = resolve
+        self.bindings = []  # type: List[Tuple[str, weakref.ref, weakref.ref]]
+
+    def infer(self, node: ast.AST) -> SchemaFrame:
+        if isinstance(node, ast.Name):
+            return self._name(node.id)
+        if isinstance(node, ast.Subscript):
+            return self._subscript(node)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return self._call(node)
+        raise _Unknown()
+
+    def _name(self, name: str) -> SchemaFrame:
+        frame = self.resolve(name)
+        if frame is None or (isinstance(frame, SchemaFrame) and not issubclass(frame.frame_type, DataFrame)):
+            # the methods of non pandas frames don't follow pandas semantics
+            raise _Unknown()
+        self.bindings.append((name, weakref.ref(frame), weakref.ref(frame.columns)))
+        if isinstance(frame, SchemaFrame):
+            return frame
+        return SchemaFrame(frame.columns, frame.index.names)
+
+    def _subscript(self, node: ast.Subscript) -> SchemaFrame:
+        key = node.slice
+        if isinstance(node.value, ast.Attribute) and node.value.attr in ('loc', 'iloc'):
+            schema = self.infer(node.value.value)
+            if not isinstance(key, ast.Tuple):
+                # rows only
+                if _literal(key) is not _UNKNOWN and not isinstance(key, (ast.List, ast.Slice)):
+                    raise _Unknown()
+                return schema
+            if len(key.elts) != 2:
+                raise _Unknown()
+            columns = key.elts[1]
+            if isinstance(columns, ast.Slice) and columns.lower is None and columns.upper is None:
+                return schema
+            selection = _known(_literal(columns))
+            if not isinstance(selection, list):
+                raise _Unknown()
+            if node.value.attr == 'iloc':
+                return SchemaFrame(schema.columns[selection], schema.index_names)
+            return SchemaFrame(_labels(selection), schema.index_names)
+
+        schema = self.infer(node.value)
+        if isinstance(key, (ast.Slice, ast.Compare, ast.BoolOp, ast.BinOp, ast.UnaryOp)):
+            # row selection
+            return schema
+        selection = _known(_literal(key))
+        if isinstance(selection, list):
+            return SchemaFrame(_labels(selection), schema.index_names)
+        columns = schema.columns
+        if isinstance(columns, MultiIndex) and selection in columns.levels[0]:
+            # df["metric"] on MultiIndex columns is a frame of the remaining levels
+            return SchemaFrame(columns[columns.get_level_values(0) == selection].droplevel(0), schema.index_names)
+        # a single column
+        raise _Unknown()
+
+    def _call(self, node: ast.Call) -> SchemaFrame:
+        method = node.func.attr
+        receiver = node.func.value
+        if method in FUNCTIONS and isinstance(receiver, ast.Name) and self.resolve(receiver.id) is None:
+            # pd.merge(left, right, ...), pd.concat([a, b], ...)
+            if method == 'concat':
+                return self._concat(node.args, self._keywords(node))
+            if not node.args:
+                raise _Unknown()
+            return self._merge(self.infer(node.args[0]), node.args[1:], self._keywords(node))
+        schema = self.infer(receiver)
+        if method in PRESERVING_METHODS:
+            return schema
+        if method not in HANDLED_METHODS:
+            raise _Unknown()
+        return getattr(self, '_' + method)(schema, node.args, self._keywords(node))
+
+    @staticmethod
+    def _keywords(node: ast.Call) -> Dict[str, ast.AST]:
+        if any(keyword.arg is None for keyword in node.keywords):
+            # **kwargs
+            raise _Unknown()
+        return {keyword.arg: keyword.value for keyword in node.keywords}
+
+    @staticmethod
+    def _argument(args: List[ast.AST], kwargs: Dict[str, ast.AST], position: int, name: str, default=None):
+        if name in kwargs:
+            return _literal(kwargs[name])
+        if position < len(args):
+            return _literal(args[position])
+        return default
+
+    def _rename(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        mapper = kwargs.get('columns')
+        if mapper is None:
+            axis = self._argument([], kwargs, 0, 'axis', 0)
+            if axis not in (1, 'columns'):
+                # only the index is renamed
+                return schema
+            mapper = kwargs.get('mapper', args[0] if args else None)
+            if mapper is None:
+                raise _Unknown()
+        if isinstance(mapper, ast.Attribute) and isinstance(mapper.value, ast.Name) and mapper.value.id == 'str':
+            # rename(columns=str.lower)
+            function = getattr(str, mapper.attr, None)
+            if not callable(function):
+                raise _Unknown()
+            rename = lambda label: function(label) if isinstance(label, str) else label
+        else:
+            mapping = _known(_literal(mapper))
+            if not isinstance(mapping, dict):
+                raise _Unknown()
+            rename = lambda label: mapping.get(label, label)
+        columns = schema.columns
+        if isinstance(columns, MultiIndex):
+            renamed = columns.set_levels([level.map(rename) for level in columns.levels], verify_integrity=False)
+        else:
+            renamed = _labels([rename(label) for label in columns])
+        return SchemaFrame(renamed, schema.index_names)
+
+    def _add_prefix(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        prefix = _known(self._argument(args, kwargs, 0, 'prefix'))
+        return SchemaFrame(_labels(['{}{}'.format(prefix, label) for label in schema.columns]), schema.index_names)
+
+    def _add_suffix(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        suffix = _known(self._argument(args, kwargs, 0, 'suffix'))
+        return SchemaFrame(_labels(['{}{}'.format(label, suffix) for label in schema.columns]), schema.index_names)
+
+    def _drop(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        labels = self._argument([], kwargs, 0, 'columns')
+        if labels is None:
+            if self._argument([], kwargs, 0, 'axis', 0) not in (1, 'columns'):
+                # rows are dropped
+                return schema
+            labels = self._argument(args, kwargs, 0, 'labels')
+        labels = _known(labels)
+        return SchemaFrame(schema.columns.drop(_as_list(labels), errors='ignore'), schema.index_names)
+
+    def _filter(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        items = _known(self._argument(args, kwargs, 0, 'items'))
+        if items is None or self._argument([], kwargs, 0, 'axis', None) not in (None, 1, 'columns'):
+            raise _Unknown()
+        return SchemaFrame(schema.columns[schema.columns.isin(_as_list(items))], schema.index_names)
+
+    def _reindex(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        columns = self._argument([], kwargs, 0, 'columns')
+        if columns is None:
+            return schema
+        return SchemaFrame(_labels(_as_list(_known(columns))), schema.index_names)
+
+    def _assign(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        new = [name for name in kwargs if name not in schema.columns]
+        if not new:
+            return schema
+        return SchemaFrame(schema.columns.append(_labels(new)), schema.index_names)
+
+    def _set_index(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        keys = _as_list(_known(self._argument(args, kwargs, 0, 'keys')))
+        drop = _known(self._argument(args, kwargs, 1, 'drop', True))
+        append = _known(self._argument(args, kwargs, 2, 'append', False))
+        columns = schema.columns.drop(keys, errors='ignore') if drop else schema.columns
+        index_names = (schema.index_names if append else ()) + tuple(keys)
+        return SchemaFrame(columns, index_names)
+
+    def _reset_index(self, schema: SchemaFrame, args, kwargs) -> SchemaFrame:
+        level = _known(self._argument(args, kwargs, 0, 'level'))
+        drop = _known(self._argument(args, kwargs, 1, 'drop', False))
+        names = schema.index_names
+        if level is None:
+            reset = list(range(len(names)))
+        else:
+            reset = [names.index(item) if not isinstance(item, int) else item for item in _as_list(level)
+                     if isinstance(item, int) or item in names]
+        remaining = tuple(name for i, name in enumerate(names) if i not in reset) or (None,)
+        if drop:
+            return SchemaFrame(schema.columns, remaining)
+        if len(names) == 1:
+            default = 'level_0' if 'index' in schema.columns else 'index'
+            new = [default if names[0] is None else names[0]]
+        else:
+            new = ['level_{}'.format(i) if names[i] is None else names[i] for i in reset]
+        return SchemaFrame(_labels(new).append(schema.columns), remaining)
+
+    def _merge(self, left: SchemaFrame, args, kwargs) -> SchemaFrame:
+        if args:
+            right = self.infer(args[0])
+        elif 'right' in kwargs:
+            right = self.infer(kwargs['right'])
+        else:
+            raise _Unknown()
+        on = _known(self._argument([], kwargs, 0, 'on'))
+        left_on = _known(self._argument([], kwargs, 0, 'left_on'))
+        right_on = _known(self._argument([], kwargs, 0, 'right_on'))
+        left_index = _known(self._argument([], kwargs, 0, 'left_index', False))
+        right_index = _known(self._argument([], kwargs, 0, 'right_index', False))
+        suffixes = _known(self._argument([], kwargs, 0, 'suffixes', ('_x', '_y')))
+
+        left_columns, right_columns = list(left.columns), list(right.columns)
+        right_set = set(right_columns)
+        if on is None and left_on is None and right_on is None and not left_index and not right_index:
+            on = [label for label in left_columns if label in right_set]
+        if on is not None:
+            keys = set(_as_list(on))
+        else:
+            # a key with the same name on both sides is merged into one column
+            keys = {l for l, r in zip(_as_list(left_on), _as_list(right_on)) if l == r}
+        overlap = (set(left_columns) & right_set) - keys
+
+        def _suffixed(label, suffix):
+            return '{}{}'.format(label, suffix) if label in overlap and suffix is not None else label
+
+        left_suffix, right_suffix = suffixes
+        columns = [_suffixed(label, left_suffix) for label in left_columns] + \
+                  [_suffixed(label, right_suffix) for label in right_columns if label not in keys]
+        return SchemaFrame(_labels(columns))
+
+    def _concat(self, args, kwargs) -> SchemaFrame:
+        frames = args[0] if args else kwargs.get('objs')
+        if not isinstance(frames, (ast.List, ast.Tuple)) or not frames.elts:
+            raise _Unknown()
+        schemas = [self.infer(frame) for frame in frames.elts]
+        axis = _known(self._argument([], kwargs, 0, 'axis', 0))
+        join = _known(self._argument([], kwargs, 0, 'join', 'outer'))
+        columns = schemas[0].columns
+        for schema in schemas[1:]:
+            if axis in (1, 'columns'):
+                columns = columns.append(schema.columns)
+            elif join == 'inner':
+                columns = columns.intersection(schema.columns, sort=False)
+            else:
+                columns = columns.union(schema.columns, sort=False)
+        return SchemaFrame(columns, schemas[0].index_names)
+
+
+class ChainCache(object):
+    """
+    Inferred schemas keyed by the chain's source.
+    An entry is valid while every name it resolved is bound to the same frame with the same columns object.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_CHAINS):
+        self.max_size = max_size
+        self._schemas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._schemas.clear()
+
+    @staticmethod
+    def _valid(bindings, resolve: Callable[[str], Optional[DataFrame]]) -> bool:
+        for name, frame_ref, columns_ref in bindings:
+            frame = frame_ref()
+            if frame is None or resolve(name) is not frame or frame.columns is not columns_ref():
+                return False
+        return True
+
+    def infer(self, source: str, resolve: Callable[[str], Optional[DataFrame]]) -> Optional[SchemaFrame]:
+        """
+        Returns the schema of the frame `source` evaluates to, None if it can't be inferred.
+        """
+        with self._lock:
+            entry = self._schemas.get(source)
+            if entry is not None:
+                self._schemas.move_to_end(source)
+        if entry is not None and self._valid(entry[0], resolve):
+            count('chain.hit')
+            return entry[1]
+        count('chain.miss')
+
+        try:
+            node = ast.parse('(' + source + ')', mode='eval').body
+        except SyntaxError:
+            return None
+        interpreter = ChainInterpreter(resolve)
+        try:
+            schema = interpreter.infer(node)
+        except (_Unknown, KeyError, ValueError, TypeError, IndexError) as e:
+            # not cached, a name we couldn't resolve might be bound by the next cell
+            logger.debug('could not infer the schema of {}: {!r}'.format(source, e))
+            return None
+        with self._lock:
+            self._schemas[source] = (interpreter.bindings, schema)
+            if len(self._schemas) > self.max_size:
+                self._schemas.popitem(last=False)
+        return schema
+
+
+chain_schemas = ChainCache()
+
+
+def resolve_chain(text: str, resolve: Callable[[str], Optional[DataFrame]]) -> Optional[Tuple[str, SchemaFrame]]:
+    """
+    Infers the schema of the chain the cursor is applied to.
+    :return: `text` with the chain replaced by `CHAIN_ALIAS` and the schema,
+             None when the cursor isn't on a chain (a bare name is not a chain) or its schema is unknown
+    """
+    span = chain_span(text)
+    if span is None:
+        return None
+    start, end = span
+    source = text[start:end].strip()
+    if source.isidentifier():
+        return None
+    schema = chain_schemas.infer(source, resolve)
+    if schema is None:
+        return None
+    return CHAIN_ALIAS + text[end:], schema
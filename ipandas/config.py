@@ -0,0 +1,32 @@
+# completion modes
+PREFIX = 'prefix'
+FUZZY = 'fuzzy'
+
+
+class Config(object):
+    """
+    Runtime settings of ipandas, change them on `ipandas.config` at any time, ex.
+
+    >>> import ipandas
+    >>> ipandas.config.latency_budget = 0.05
+    """
+
+    def __init__(self):
+        # seconds a single completion request may take,
+        # when an index isn't ready in time we return partial results and let IPython's matchers chime in
+        self.latency_budget = 0.03
+        # prebuild column indexes and signatures of new or changed frames after every cell execution
+        self.precompute_after_execution = True
+        # per stage latency histograms and cache counters, see the %ipandas_stats magic
+        self.collect_stats = True
+        # PREFIX completes column labels starting with the typed text,
+        # FUZZY ranks prefix, substring and subsequence matches ('421temp' finds 'sensor_0421_temp_c')
+        self.completion_mode = PREFIX
+        # number of best matches returned in FUZZY mode, and of row labels (indexes may have millions)
+        self.max_completions = 100
+        # path of a JSON lines log every completion request is appended to (text, frame schemas, stage timings),
+        # None records nothing. Replay a log offline with `python -m ipandas.replay`, see the %ipandas_record magic
+        self.record_path = None
+
+
+config = Config()
@@ -0,0 +1,34 @@
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Any, Optional
+
+
+class Deadline(object):
+    """
+    Latency budget of a single completion request.
+
+    Stages that can't finish in time return what they have and mark the request as partial.
+    Stages returning capped or ranked matches mark it as truncated - a longer prefix may match labels they don't include.
+    """
+    __slots__ = ('expires_at', 'partial', 'truncated')
+
+    def __init__(self, budget: float):
+        self.expires_at = time.perf_counter() + budget
+        self.partial = False
+        self.truncated = False
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.perf_counter(), 0.0)
+
+    def expired(self) -> bool:
+        return time.perf_counter() >= self.expires_at
+
+    def wait(self, future: Future) -> Optional[Any]:
+        """
+        Waits for `future` until the deadline, returns None (and marks the request as partial) if it isn't done by then.
+        """
+        try:
+            return future.result(timeout=self.remaining())
+        except TimeoutError:
+            self.partial = True
+            return None
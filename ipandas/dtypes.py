@@ -0,0 +1,101 @@
+import weakref
+from typing import Any, Hashable, List, Optional, Tuple, Union
+
+import numpy as np
+from pandas import CategoricalDtype, PeriodDtype
+from pandas.api.types import (is_bool_dtype, is_datetime64_any_dtype, is_numeric_dtype, is_object_dtype,
+                              is_string_dtype, is_timedelta64_dtype)
+
+# dtype kinds, bit flags so a constraint accepting several kinds is a single mask
+NUMERIC = 1
+BOOLEAN = 2
+DATETIME = 4
+TIMEDELTA = 8
+STRING = 16
+# object columns usually hold strings, but may hold anything (lists, dicts, mixed values)
+OBJECT = 32
+CATEGORICAL = 64
+OTHER = 128
+ANY_KIND = 255
+
+
+def kind_of(dtype) -> int:
+    """
+    Returns the kind flag of a numpy or pandas extension dtype.
+    """
+    if isinstance(dtype, CategoricalDtype):
+        return CATEGORICAL
+    if is_bool_dtype(dtype):
+        return BOOLEAN
+    if is_datetime64_any_dtype(dtype) or isinstance(dtype, PeriodDtype):
+        return DATETIME
+    if is_timedelta64_dtype(dtype):
+        return TIMEDELTA
+    if is_numeric_dtype(dtype):
+        return NUMERIC
+    if is_object_dtype(dtype):
+        return OBJECT
+    if is_string_dtype(dtype):
+        return STRING
+    return OTHER
+
+
+def blocks_of(frame) -> Optional[List[Tuple[Any, Union[slice, np.ndarray]]]]:
+    """
+    Returns the (block, column positions) pairs of a DataFrame's block manager, None for other frames.
+
+    The block manager is private to pandas and changed between releases, when it doesn't look like we expect
+    None is returned as well - callers fall back to the public `frame.dtypes`.
+    """
+    try:
+        return [(block, block.mgr_locs.indexer) for block in frame._mgr.blocks]
+    except (AttributeError, TypeError):
+        return None
+
+
+def column_block(frame, column: Hashable) -> Optional[Any]:
+    """
+    Returns the block holding `frame[column]`, None if unknown, see blocks_of.
+    """
+    try:
+        manager = frame._mgr
+        return manager.blocks[manager.blknos[frame.columns.get_loc(column)]]
+    except (AttributeError, TypeError, IndexError):
+        return None
+
+
+def dtypes_version(frame) -> Optional[Tuple]:
+    """
+    Returns a value that changes whenever the dtypes of `frame` may have changed, None if we can't tell.
+
+    A DataFrame's blocks are replaced whenever a column is added, removed or changes its dtype,
+    weakrefs to them compare equal only while the very same blocks are alive.
+    """
+    blocks = blocks_of(frame)
+    if blocks is not None:
+        return tuple(weakref.ref(block) for block, _ in blocks)
+    if getattr(frame, 'dtypes', None) is not None:
+        try:
+            return weakref.ref(frame),
+        except TypeError:
+            return None
+    return None
+
+
+def kind_codes(frame) -> Optional[np.ndarray]:
+    """
+    Returns the kind flag of each column of `frame` as an uint8 array, None if its dtypes are unknown.
+    """
+    blocks = blocks_of(frame)
+    if blocks is not None:
+        # one assignment per block rather than a dtype lookup per column
+        codes = np.full(len(frame.columns), OTHER, dtype=np.uint8)
+        for block, positions in blocks:
+            codes[positions] = kind_of(block.dtype)
+        return codes
+    dtypes = getattr(frame, 'dtypes', None)
+    if dtypes is None:
+        return None
+    kinds = {}
+    return np.fromiter((kinds[dtype] if dtype in kinds else kinds.setdefault(dtype, kind_of(dtype))
+                        for dtype in dtypes), dtype=np.uint8, count=len(dtypes))
@@ -1,39 +1,112 @@
+import sys
 import types
+from typing import TYPE_CHECKING, Optional
 
-from IPython import InteractiveShell
-
-from ipandas.ipandas import ipandas_completer
+if TYPE_CHECKING:
+    from IPython import InteractiveShell
+    from IPython.core.completer import IPCompleter
 
 # global we use to restore ipython state if unloading our extension
 original_merge_completions = None
 
+# the shell our matcher is registered in, pandas and the completion machinery are only imported
+# (and the namespace hooks registered) by the first completion request or cell execution after pandas was imported
+_shell = None  # type: Optional[InteractiveShell]
+_activated = False
+
+
+def _activate() -> None:
+    """
+    Imports the completer and starts tracking the DataFrames in the user namespace.
+    """
+    global _activated
+    from ipandas.namespace import frame_namespace
+    if _shell is not None:
+        frame_namespace.attach(_shell)
+    _activated = True
+
+
+def _on_post_execute() -> None:
+    """
+    Registered at load, activates the completer after the first cell execution that imported pandas,
+    so the frames it created are prebuilt before the first completion request.
+    """
+    if _activated or 'pandas' not in sys.modules:
+        return
+    _activate()
+    from ipandas.namespace import frame_namespace
+    # registered by _activate while this event is being triggered, it only runs from the next one
+    frame_namespace.on_post_execute()
+
+
+def _lazy_context_matcher(self: 'IPCompleter', context) -> dict:
+    if not _activated:
+        _activate()
+    from ipandas.ipandas import ipandas_context_matcher
+    return ipandas_context_matcher(self, context)
+
 
-def load_ipython_extension(ip: InteractiveShell) -> None:
+def _lazy_completer(self: 'IPCompleter', event):
+    if not _activated:
+        _activate()
+    from ipandas.ipandas import ipandas_completer
+    return ipandas_completer(self, event)
+
+
+def load_ipython_extension(ip: 'InteractiveShell') -> None:
     """
     Creates a method for our matcher and loads it into IPythons completer.
+    Nothing else is imported until the first completion request, kernels that never complete pay for a function.
     :param ip: IPython session (this is supplied to us when calling the %load_ext magic)
     :return: None
     """
-    global original_merge_completions
-    print('IPandas IPython Extension is loaded')
+    global original_merge_completions, _shell
+    _shell = ip
+    try:
+        from IPython.core.completer import context_matcher
+    except ImportError:
+        # IPython < 8.6 only supports the v1 matcher API
+        context_matcher = None
+
+    if context_matcher is not None:
+        # the v2 matcher API lets us decide per request whether IPython's other matchers are suppressed
+        matcher = context_matcher()(_lazy_context_matcher)
+        ip.Completer.ipandas_matcher = types.MethodType(matcher, ip.Completer)
+    else:
+        # create a custom matcher object
+        # types.MethodType will add it as a method to the CURRENT ipython completer object!
+        ip.Completer.ipandas_matcher = types.MethodType(_lazy_completer, ip.Completer)
+
+        # don't accept matches from IPythons other matchers when our matcher can offer completion
+        # save original value as global for restoration later
+        original_merge_completions = ip.Completer.merge_completions
+        ip.Completer.merge_completions = False
 
-    # create a custom matcher object
-    # types.MethodType will add it as a method to the CURRENT ipython completer object!
-    ip.Completer.ipandas_matcher = types.MethodType(ipandas_completer, ip.Completer)
     # insert it into ipython matchers list
-    ip.Completer.matchers.insert(0, ip.Completer.ipandas_matcher)
+    ip.Completer.custom_matchers.insert(0, ip.Completer.ipandas_matcher)
+    ip.events.register('post_execute', _on_post_execute)
 
-    # don't accept matches from IPythons other matchers when our matcher can offer completion
-    # save original value as global for restoration later
-    original_merge_completions = ip.Completer.merge_completions
-    ip.Completer.merge_completions = False
+    from ipandas.magics import ipandas_stats, ipandas_record
+    ip.register_magic_function(ipandas_stats, magic_kind='line', magic_name='ipandas_stats')
+    ip.register_magic_function(ipandas_record, magic_kind='line', magic_name='ipandas_record')
 
 
-def unload_ipython_extension(ip: InteractiveShell) -> None:
+def unload_ipython_extension(ip: 'InteractiveShell') -> None:
     """
     Unloads moose logic and restore original IPython state.
     :param ip: IPython session (this is supplied to us when calling the %load_ext magic)
     :return: None
     """
-    ip.Completer.matchers.remove(ip.Completer.moose_matches)
-    ip.Completer.merge_completions = original_merge_completions
+    global _shell, _activated
+    ip.Completer.custom_matchers.remove(ip.Completer.ipandas_matcher)
+    if original_merge_completions is not None:
+        ip.Completer.merge_completions = original_merge_completions
+    try:
+        ip.events.unregister('post_execute', _on_post_execute)
+    except ValueError:
+        pass
+    if _activated:
+        from ipandas.namespace import frame_namespace
+        frame_namespace.detach(ip)
+    _shell = None
+    _activated = False
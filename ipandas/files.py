@@ -0,0 +1,184 @@
+import bz2
+import csv
+import gzip
+import io
+import lzma
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple, Callable, Dict
+
+import logbook
+from pandas import Index
+
+from ipandas import background
+from ipandas.deadline import Deadline
+from ipandas.index import ColumnIndex
+from ipandas.stats import count
+
+logger = logbook.Logger('IPandasCompleter')
+
+# schemas of this many files are kept
+MAX_CACHED_SCHEMAS = 256
+# longest CSV header line we are willing to read
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+
+# matches pd.read_parquet("data.parquet", columns=["a", " and read_csv(path, usecols=['
+file_reader_re = re.compile(r'(?:(?P<module>\w+)\.)?(?P<reader>read_parquet|read_feather|read_csv|read_table)'
+                            r'\((?P<arguments>.*)$', re.DOTALL)
+# the path, either the first positional argument or the path keyword. a string literal or a variable name
+path_argument_re = re.compile(r'''^\s*(?:(?:path|filepath_or_buffer|source)\s*=\s*)?
+                                  (?:[rR]?(?P<quote>['"])(?P<path>[^'"]*)(?P=quote)|(?P<name>\w+))\s*[,)]''',
+                              re.VERBOSE)
+sep_argument_re = re.compile(r'''(?:sep|delimiter)\s*=\s*(?P<quote>['"])(?P<sep>[^'"]+)(?P=quote)''')
+column_argument_re = re.compile(r'''(?:columns|usecols)\s*=\s*\[?(?:[^\]=]*,\s*)?['"](?P<value>[^'"]*)$''')
+
+_COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.open,
+    '.xz': lzma.open,
+}
+
+
+def _data_columns(schema) -> List[str]:
+    """
+    Returns the column names of an Arrow schema without the row index columns pandas stored with the frame
+    (`__index_level_0__` or the index names), listed in the schema's pandas metadata.
+    """
+    names = list(schema.names)
+    metadata = schema.pandas_metadata
+    if not metadata:
+        return names
+    # a RangeIndex isn't stored, it is described by a dict
+    index_columns = {name for name in metadata.get('index_columns', ()) if isinstance(name, str)}
+    return [name for name in names if name not in index_columns]
+
+
+def read_parquet_schema(path: str, **kwargs) -> List[str]:
+    """
+    Reads the column names from the parquet footer, no data pages are read.
+    """
+    import pyarrow.parquet
+    return _data_columns(pyarrow.parquet.read_schema(path))
+
+
+def read_feather_schema(path: str, **kwargs) -> List[str]:
+    """
+    Reads the column names from the Arrow IPC (feather v2) file footer.
+    """
+    import pyarrow.ipc
+    with pyarrow.ipc.open_file(path) as reader:
+        return _data_columns(reader.schema)
+
+
+def read_csv_header(path: str, sep: str = ',', **kwargs) -> List[str]:
+    """
+    Reads the column names from the first line of a (possibly compressed) CSV file.
+    """
+    opener = _COMPRESSED_OPENERS.get(os.path.splitext(path)[1].lower(), open)
+    with opener(path, 'rb') as f:
+        header = f.readline(MAX_HEADER_BYTES)
+    line = header.decode('utf-8', errors='replace').lstrip('\ufeff')
+    if len(sep) != 1:
+        # pandas treats longer separators as regular expressions
+        return re.split(sep, line.strip())
+    return next(csv.reader(io.StringIO(line), delimiter=sep), [])
+
+
+# reader function name -> (schema reader, default separator)
+SCHEMA_READERS = {
+    'read_parquet': (read_parquet_schema, None),
+    'read_feather': (read_feather_schema, None),
+    'read_csv': (read_csv_header, ','),
+    'read_table': (read_csv_header, '\t'),
+}  # type: Dict[str, Tuple[Callable[..., List[str]], Optional[str]]]
+
+
+class SchemaCache(object):
+    """
+    Column names of files on disk, keyed by path, modification time and size,
+    so repeated completion requests never read the file again while it's unchanged.
+    """
+
+    def __init__(self, max_size: int = MAX_CACHED_SCHEMAS):
+        self.max_size = max_size
+        self._schemas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._schemas)
+
+    def _read(self, key: Tuple, reader: str, sep: Optional[str]) -> ColumnIndex:
+        read_schema, default_sep = SCHEMA_READERS[reader]
+        try:
+            columns = ColumnIndex(Index(read_schema(key[0], sep=sep or default_sep)))
+        except ImportError:
+            logger.debug('pyarrow is required to read the schema of {}'.format(key[0]))
+            columns = ColumnIndex(Index([]))
+        except (OSError, ValueError) as e:
+            logger.debug('could not read the schema of {}: {!r}'.format(key[0], e))
+            columns = ColumnIndex(Index([]))
+        with self._lock:
+            self._schemas[key] = columns
+            if len(self._schemas) > self.max_size:
+                self._schemas.popitem(last=False)
+        return columns
+
+    def get(self, path: str, reader: str, sep: str = None, deadline: Deadline = None) -> Optional[ColumnIndex]:
+        """
+        Returns an index of the column names of the file at `path`,
+        None if it doesn't exist or isn't read by the deadline.
+        """
+        try:
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, reader, sep)
+        with self._lock:
+            columns = self._schemas.get(key)
+            if columns is not None:
+                self._schemas.move_to_end(key)
+        count('file_schema.hit' if columns is not None else 'file_schema.miss')
+        if columns is not None:
+            return columns
+        if deadline is None:
+            return self._read(key, reader, sep)
+        return deadline.wait(background.submit(('file_schema',) + key, self._read, key, reader, sep))
+
+
+file_schemas = SchemaCache()
+
+
+def resolve_path(arguments: str, user_ns: dict) -> Optional[str]:
+    """
+    Returns the path passed to a reader, from a string literal or a variable in the user namespace.
+    """
+    match = path_argument_re.match(arguments)
+    if not match:
+        return None
+    if match.group('path') is not None:
+        return os.path.expanduser(match.group('path'))
+    value = user_ns.get(match.group('name'))
+    if isinstance(value, (str, os.PathLike)):
+        return os.path.expanduser(os.fspath(value))
+    return None
+
+
+def complete_file_columns(session, match, deadline: Deadline = None, **kwargs) -> List[str]:
+    """
+    Completes the columns/usecols argument of pandas readers from the file's metadata.
+    """
+    arguments = match.group('arguments')
+    column_match = column_argument_re.search(arguments)
+    if not column_match:
+        return []
+    path = resolve_path(arguments, session.user_ns)
+    if path is None:
+        return []
+    sep_match = sep_argument_re.search(arguments)
+    sep = sep_match.group('sep').encode().decode('unicode_escape') if sep_match else None
+    columns = file_schemas.get(path, match.group('reader'), sep=sep, deadline=deadline)
+    if columns is None:
+        return []
+    return columns.prefix(column_match.group('value'))
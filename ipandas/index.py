@@ -0,0 +1,502 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Optional, Sequence, Union
+
+import numpy as np
+from pandas import DataFrame, Index, MultiIndex
+from pandas.api.types import is_object_dtype, is_string_dtype
+
+from ipandas import background
+from ipandas.config import config, FUZZY
+from ipandas.deadline import Deadline
+from ipandas.dtypes import dtypes_version, kind_codes
+from ipandas.stats import count
+
+# appended to a prefix to get the upper bound of all strings starting with it
+_MAX_CHAR = '\U0010ffff'
+# frames with up to this many columns are indexed inside the completion request, wider ones in the background
+SYNC_BUILD_COLUMNS = 50000
+# number of labels scanned between deadline checks when falling back to a linear scan
+_SCAN_CHUNK_SIZE = 4096
+# rows per chunk when computing character masks, bounds the temporary (rows x longest label) array
+_MASK_CHUNK_SIZE = 65536
+
+# number of (typed levels -> codes present in the next level) results kept per MultiColumnIndex
+_MAX_CACHED_LEVEL_CODES = 64
+
+# fuzzy match scores, a prefix match beats a substring match which beats a subsequence match
+_PREFIX_SCORE = 3000.0
+_SUBSTRING_SCORE = 2000.0
+_SUBSEQUENCE_SCORE = 1000.0
+
+
+def _label_strings(labels: Index) -> List[str]:
+    """
+    String form of every label, non string labels (ints, timestamps, ...) are completed by their str()
+    """
+    if is_object_dtype(labels.dtype) or is_string_dtype(labels.dtype):
+        return [label if isinstance(label, str) else str(label) for label in labels]
+    return labels.astype(str).tolist()
+
+
+def _char_masks(keys: np.ndarray) -> np.ndarray:
+    """
+    Returns a 63 bit mask of the characters of each string in the unicode array `keys`.
+    Characters share bits (codepoint % 63), so the masks can only rule candidates out.
+    """
+    masks = np.zeros(len(keys), dtype=np.uint64)
+    if not len(keys) or keys.dtype.itemsize == 0:
+        return masks
+    # unicode arrays are UCS4, byte string arrays one byte per character
+    char_type = np.uint32 if keys.dtype.kind == 'U' else np.uint8
+    width = keys.dtype.itemsize // np.dtype(char_type).itemsize
+    codepoints = keys.view(char_type).reshape(len(keys), width)
+    for start in range(0, len(keys), _MASK_CHUNK_SIZE):
+        chunk = codepoints[start:start + _MASK_CHUNK_SIZE]
+        bits = np.left_shift(np.uint64(1), (chunk % 63).astype(np.uint64))
+        # codepoint 0 is padding
+        bits[chunk == 0] = 0
+        masks[start:start + _MASK_CHUNK_SIZE] = np.bitwise_or.reduce(bits, axis=1)
+    return masks
+
+
+class LabelInterner(object):
+    """
+    Maps label strings to integer ids shared by all frames,
+    so the column sets of different frames can be intersected as sorted integer arrays.
+    Ids are never reused, the table grows with the number of distinct labels seen in the session.
+    """
+
+    def __init__(self):
+        self._ids = {}  # type: Dict[str, int]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def ids(self, labels: Sequence[str]) -> np.ndarray:
+        with self._lock:
+            ids = self._ids
+            return np.fromiter((ids.setdefault(label, len(ids)) for label in labels), dtype=np.int64,
+                               count=len(labels))
+
+
+label_interner = LabelInterner()
+
+
+class ColumnIndex(object):
+    """
+    Sorted view over the labels of a DataFrame's columns, used to answer prefix queries
+    without rescanning the columns on every completion request.
+
+    Building the index is O(n log n) and is done once per `columns` object,
+    a prefix query is two binary searches plus the matching labels - O(log n + k).
+
+    Fuzzy queries are scored with vectorized string operations, over the labels whose
+    character masks contain all the characters of the query.
+    """
+
+    def __init__(self, columns: Index):
+        labels = _label_strings(columns)
+        # positions in `columns` order, so results keep the order of the frame
+        self.labels = np.array(labels, dtype=object)
+        sorted_keys = np.array(labels, dtype=str) if labels else np.array([], dtype='<U1')
+        self.order = np.argsort(sorted_keys, kind='stable')
+        self.sorted_keys = sorted_keys[self.order]
+        self._lower_keys = None
+        self._masks = None
+        self._lengths = None
+        self._ids = None
+        self._sorted_ids = None
+        # (dtypes version, kind codes) of the last frame these are the columns of
+        self._kinds = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def prefix(self, prefix: str = None, allowed: np.ndarray = None) -> List[str]:
+        """
+        Returns all labels starting with `prefix`, in the order they appear in the frame.
+        :param prefix: the text typed so far, None or empty string matches everything
+        :param allowed: boolean mask of the positions that may be returned, None allows all
+        :return: list of matching labels
+        """
+        if not prefix and allowed is None:
+            return self.labels.tolist()
+        positions = self.prefix_positions(prefix)
+        if allowed is not None:
+            positions = positions[allowed[positions]]
+        return self.labels[positions].tolist()
+
+    def prefix_positions(self, prefix: str = None) -> np.ndarray:
+        """
+        Returns the (sorted) positions in `columns` of the labels starting with `prefix`.
+        """
+        if not prefix:
+            return np.arange(len(self.labels))
+        start = np.searchsorted(self.sorted_keys, prefix, side='left')
+        stop = np.searchsorted(self.sorted_keys, prefix + _MAX_CHAR, side='left')
+        return np.sort(self.order[start:stop])
+
+    def position_of(self, key: str) -> Optional[int]:
+        """
+        Returns the position in `columns` of the first label whose string form is `key`.
+        """
+        i = np.searchsorted(self.sorted_keys, key, side='left')
+        if i < len(self.sorted_keys) and self.sorted_keys[i] == key:
+            return int(self.order[i])
+        return None
+
+    def kind_mask(self, frame, kinds: int) -> Optional[np.ndarray]:
+        """
+        Returns a boolean mask of the columns of `frame` (whose columns are our labels) with a dtype of `kinds`,
+        None if the dtypes of `frame` are unknown.
+        """
+        codes = _cached_kind_codes(self, frame)
+        if codes is None:
+            return None
+        return (codes & kinds) != 0
+
+    def label_ids(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Interned ids of the labels in `columns` order, and their sorted unique values.
+        """
+        if self._sorted_ids is None:
+            ids = label_interner.ids(self.labels)
+            self._ids = ids
+            self._sorted_ids = np.unique(ids)
+        return self._ids, self._sorted_ids
+
+    def shared_prefix(self, prefix: str = None, others: Sequence['ColumnIndex'] = ()) -> List[str]:
+        """
+        Returns the labels starting with `prefix` which are labels of all the `others` too,
+        in the order they appear in the frame. Membership is a binary search over the others' sorted ids,
+        so this is O(k log n) for k labels matching the prefix.
+        """
+        positions = self.prefix_positions(prefix)
+        ids = self.label_ids()[0][positions]
+        for other in others:
+            sorted_ids = other.label_ids()[1]
+            if not len(sorted_ids):
+                return []
+            found = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+            shared = sorted_ids[found] == ids
+            positions, ids = positions[shared], ids[shared]
+        return self.labels[positions].tolist()
+
+    def fuzzy_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Lower cased keys, their character masks and lengths (in sorted order), built on the first fuzzy query.
+        """
+        if self._masks is None:
+            lower_keys = np.char.lower(self.sorted_keys)
+            try:
+                # byte strings are a quarter of the size and about twice as fast to search
+                lower_keys = lower_keys.astype(np.bytes_)
+            except UnicodeEncodeError:
+                pass
+            self._lengths = np.char.str_len(lower_keys)
+            self._masks = _char_masks(lower_keys)
+            self._lower_keys = lower_keys
+        return self._lower_keys, self._masks, self._lengths
+
+    def fuzzy(self, query: str = None, limit: int = 100, allowed: np.ndarray = None) -> List[str]:
+        """
+        Returns up to `limit` labels matching `query` as a prefix, substring or subsequence
+        (case insensitive), best matches first. `421temp` matches `sensor_0421_temp_c`.
+        `allowed` is a boolean mask of the positions that may be returned, None allows all.
+        """
+        if not query:
+            if allowed is not None:
+                return self.labels[np.flatnonzero(allowed)[:limit]].tolist()
+            return self.labels[:limit].tolist()
+        lower_keys, masks, lengths = self.fuzzy_arrays()
+        query = query.lower()
+        if lower_keys.dtype.kind == 'S':
+            try:
+                query = query.encode('ascii')
+            except UnicodeEncodeError:
+                return []
+        query_mask = _char_masks(np.array([query]))[0]
+        is_candidate = (masks & query_mask) == query_mask
+        if allowed is not None:
+            # the keys are in sorted order
+            is_candidate &= allowed[self.order]
+        candidates = np.flatnonzero(is_candidate)
+        if not len(candidates):
+            return []
+        if len(candidates) > len(lower_keys) // 2:
+            # searching everything is cheaper than copying most of the keys
+            candidates = np.arange(len(lower_keys))
+            keys = lower_keys
+        else:
+            keys = lower_keys[candidates]
+
+        scores = np.full(len(candidates), -np.inf)
+        substring = np.char.find(keys, query)
+        is_substring = substring >= 0
+        scores[is_substring] = np.where(substring[is_substring] == 0,
+                                        _PREFIX_SCORE, _SUBSTRING_SCORE - substring[is_substring])
+
+        # substring matches always rank first, subsequences are only needed if there aren't enough of them
+        if is_substring.sum() < limit:
+            rest = np.flatnonzero(~is_substring)
+            rest_keys = keys[rest]
+            # greedy leftmost subsequence match, one vectorized find per query character
+            # over the keys that still match
+            start = np.zeros(len(rest), dtype=np.int64)
+            first = None
+            for i in range(len(query)):
+                found = np.char.find(rest_keys, query[i:i + 1], start)
+                matched = found >= 0
+                if not matched.all():
+                    rest, rest_keys, found, start = rest[matched], rest_keys[matched], found[matched], start[matched]
+                    if first is not None:
+                        first = first[matched]
+                if first is None:
+                    first = found
+                start = found + 1
+            gaps = (start - first) - len(query)
+            scores[rest] = _SUBSEQUENCE_SCORE - gaps - first * 0.1
+
+        found = np.flatnonzero(scores > -np.inf)
+        positions = self.order[candidates[found]]
+        # ties are broken by length, then by frame order
+        scores = scores[found] - lengths[candidates[found]] * 0.001 - positions * (0.0009 / (len(self) + 1))
+        if len(found) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            positions, scores = positions[top], scores[top]
+        return self.labels[positions[np.argsort(-scores, kind='stable')]].tolist()
+
+
+class MultiColumnIndex(object):
+    """
+    Completes MultiIndex columns level by level, ex. the second level of `df[("metric", "`.
+
+    Works on the `levels`/`codes` arrays only, the tuples of the MultiIndex are never built.
+    Each level is completed through the ColumnIndex of its `levels` Index, and the codes present
+    under an already typed prefix of levels are cached.
+    """
+
+    def __init__(self, columns: MultiIndex):
+        self.levels = list(columns.levels)
+        self.codes = [np.asarray(codes) for codes in columns.codes]
+        self.level_indexes = [get_label_index(level) for level in self.levels]
+        self._present_codes = OrderedDict()
+        self._lock = threading.Lock()
+        self._kinds = None
+
+    def __len__(self):
+        return len(self.codes[0]) if self.codes else 0
+
+    def _codes_under(self, typed: Tuple[str, ...]) -> Optional[np.ndarray]:
+        """
+        Returns the codes of level `len(typed)` present in columns starting with the `typed` levels
+        """
+        with self._lock:
+            if typed in self._present_codes:
+                self._present_codes.move_to_end(typed)
+                return self._present_codes[typed]
+
+        mask = None
+        for level, value in enumerate(typed):
+            code = self.level_indexes[level].position_of(value)
+            if code is None:
+                return None
+            level_mask = self.codes[level] == code
+            mask = level_mask if mask is None else mask & level_mask
+        level_codes = self.codes[len(typed)]
+        present = np.unique(level_codes[mask] if mask is not None else level_codes)
+        # -1 marks a missing value
+        present = present[present >= 0]
+
+        with self._lock:
+            self._present_codes[typed] = present
+            if len(self._present_codes) > _MAX_CACHED_LEVEL_CODES:
+                self._present_codes.popitem(last=False)
+        return present
+
+    def complete_level(self, typed: Sequence[str] = (), prefix: str = None) -> List[str]:
+        """
+        Completes the level following the already `typed` level values.
+        :param typed: values of the first levels, as typed by the user
+        :param prefix: the text typed so far in the level being completed
+        """
+        typed = tuple(typed)
+        if len(typed) >= len(self.levels):
+            return []
+        present = self._codes_under(typed)
+        if present is None or not len(present):
+            return []
+        level_index = self.level_indexes[len(typed)]
+        positions = np.intersect1d(level_index.prefix_positions(prefix), present, assume_unique=True)
+        return level_index.labels[positions].tolist()
+
+    def prefix(self, prefix: str = None, allowed: np.ndarray = None) -> List[str]:
+        if allowed is None:
+            return self.complete_level((), prefix)
+        level_index = self.level_indexes[0]
+        positions = level_index.prefix_positions(prefix)
+        return level_index.labels[positions[allowed[positions]]].tolist()
+
+    def fuzzy(self, query: str = None, limit: int = 100, allowed: np.ndarray = None) -> List[str]:
+        present = set(self.level_indexes[0].labels[self._codes_under(())].tolist())
+        return [label for label in self.level_indexes[0].fuzzy(query, limit=len(self.levels[0]), allowed=allowed)
+                if label in present][:limit]
+
+    def kind_mask(self, frame, kinds: int) -> Optional[np.ndarray]:
+        """
+        Returns a boolean mask of the first level values with at least one column with a dtype of `kinds`,
+        None if the dtypes of `frame` are unknown.
+        """
+        codes = _cached_kind_codes(self, frame)
+        if codes is None:
+            return None
+        level_codes = self.codes[0][(codes & kinds) != 0]
+        mask = np.zeros(len(self.levels[0]), dtype=bool)
+        mask[level_codes[level_codes >= 0]] = True
+        return mask
+
+    def fuzzy_arrays(self):
+        return self.level_indexes[0].fuzzy_arrays()
+
+
+def _cached_kind_codes(index: Union[ColumnIndex, MultiColumnIndex], frame) -> Optional[np.ndarray]:
+    """
+    Returns the dtype kind codes of the columns of `frame`, rebuilt only when its dtypes change.
+    Frames sharing a columns object (ex. results of astype) share the slot, the last one asked for is kept.
+    """
+    version = dtypes_version(frame)
+    cached = index._kinds
+    if version is not None and cached is not None and cached[0] == version:
+        count('dtype_codes.hit')
+        return cached[1]
+    count('dtype_codes.miss')
+    codes = kind_codes(frame)
+    if codes is None or len(codes) != len(index):
+        return None
+    if version is not None:
+        index._kinds = (version, codes)
+    return codes
+
+
+# id(labels) -> (weakref to labels, index)
+# keyed by id since pandas Index objects are not hashable,
+# the weakref makes sure we drop the entry when the labels object goes away
+_label_indexes = {}  # type: Dict[int, Tuple[weakref.ref, Union[ColumnIndex, MultiColumnIndex]]]
+_lock = threading.Lock()
+
+
+def _forget(key: int) -> None:
+    with _lock:
+        _label_indexes.pop(key, None)
+
+
+def cached_label_index(labels: Index) -> Optional[Union[ColumnIndex, MultiColumnIndex]]:
+    """
+    Returns the ColumnIndex of a pandas Index object if it was already built, None otherwise.
+    """
+    entry = _label_indexes.get(id(labels))
+    if entry is not None:
+        ref, index = entry
+        if ref() is labels:
+            return index
+    return None
+
+
+def get_label_index(labels: Index) -> Union[ColumnIndex, MultiColumnIndex]:
+    """
+    Returns the cached ColumnIndex (MultiColumnIndex for a MultiIndex) of a pandas Index object,
+    building it if we haven't seen this object yet.
+    """
+    index = cached_label_index(labels)
+    if index is not None:
+        return index
+
+    key = id(labels)
+    index = MultiColumnIndex(labels) if isinstance(labels, MultiIndex) else ColumnIndex(labels)
+    with _lock:
+        _label_indexes[key] = (weakref.ref(labels, lambda _, key=key: _forget(key)), index)
+    return index
+
+
+def get_column_index(frame: DataFrame) -> Union[ColumnIndex, MultiColumnIndex]:
+    """
+    Returns the cached ColumnIndex for the frame, building it if the frame's columns object changed.
+    """
+    return get_label_index(frame.columns)
+
+
+def scan_prefix(labels: Index, prefix: str, deadline: Deadline, allowed: np.ndarray = None) -> List[str]:
+    """
+    Linear scan for labels starting with `prefix`, used while the index is built in the background.
+    Stops (and marks the request as partial) when the deadline expires.
+    `allowed` is a boolean mask of the labels that may be returned, None allows all.
+    """
+    prefix = prefix or ''
+    if isinstance(labels, MultiIndex):
+        # only the first level is completed, don't build the tuples
+        labels = labels.levels[0]
+        allowed = None
+    matches = []
+    for start in range(0, len(labels), _SCAN_CHUNK_SIZE):
+        if deadline.expired():
+            deadline.partial = True
+            break
+        chunk = labels[start:start + _SCAN_CHUNK_SIZE]
+        if allowed is not None:
+            chunk = chunk[allowed[start:start + _SCAN_CHUNK_SIZE]]
+        matches.extend(label for label in (str(label) for label in chunk) if label.startswith(prefix))
+    return matches
+
+
+def column_matches(frame: DataFrame, query: str = None, deadline: Deadline = None, kinds: int = None) -> List[str]:
+    """
+    Completes the column labels of `frame` matching `query`, according to `config.completion_mode`.
+    With `kinds` (dtype kind flags, see ipandas.dtypes) only columns of these dtypes are completed.
+
+    Wide frames are indexed in the background, if the index isn't ready by the deadline
+    we fall back to a linear (prefix) scan for the remaining time.
+    """
+    columns = frame.columns
+    index = cached_label_index(columns)
+    count('column_index.hit' if index is not None else 'column_index.miss')
+    if index is None and deadline is not None and len(columns) > SYNC_BUILD_COLUMNS:
+        future = background.submit(('column_index', id(columns)), get_label_index, columns)
+        index = deadline.wait(future)
+        if index is None:
+            codes = kind_codes(frame) if kinds is not None else None
+            return scan_prefix(columns, query, deadline, allowed=(codes & kinds) != 0 if codes is not None else None)
+    if index is None:
+        index = get_label_index(columns)
+    allowed = index.kind_mask(frame, kinds) if kinds is not None else None
+    if config.completion_mode == FUZZY:
+        if deadline is not None:
+            deadline.truncated = True
+        return index.fuzzy(query, limit=config.max_completions, allowed=allowed)
+    return index.prefix(query, allowed=allowed)
+
+
+def shared_column_matches(frames: Sequence[DataFrame], prefix: str = None) -> List[str]:
+    """
+    Completes the column labels all `frames` have, in the order of the first frame. ex. `pd.merge(left, right, on="`.
+    MultiIndex columns are compared by their first level.
+    """
+    indexes = []
+    for frame in frames:
+        index = get_column_index(frame)
+        indexes.append(index.level_indexes[0] if isinstance(index, MultiColumnIndex) else index)
+    if not indexes:
+        return []
+    return indexes[0].shared_prefix(prefix, indexes[1:])
+
+
+def column_level_matches(frame: DataFrame, typed: Sequence[str], prefix: str = None) -> List[str]:
+    """
+    Completes the level after the `typed` levels of MultiIndex columns, ex. `df[("metric", "`.
+    """
+    index = get_column_index(frame)
+    if not isinstance(index, MultiColumnIndex):
+        return []
+    return index.complete_level(typed, prefix)
@@ -1,13 +1,34 @@
+import inspect
 import re
-from typing import List, Union, Callable
+from typing import List, Union, Callable, Optional
 
 import logbook
 from IPython import get_ipython
 from IPython.core.completer import IPCompleter
+try:
+    from IPython.core.completer import context_matcher, SimpleCompletion
+except ImportError:
+    # IPython < 8.6 only supports the v1 matcher API
+    context_matcher = SimpleCompletion = None
 from IPython.terminal.interactiveshell import InteractiveShell
 from pandas import DataFrame
 
-from ipandas.utils import extract_keyword_args_from_arguments_string
+from ipandas.chains import resolve_chain, CHAIN_ALIAS
+from ipandas.config import config
+from ipandas.deadline import Deadline
+from ipandas.files import file_reader_re, complete_file_columns
+from ipandas.index import column_matches, column_level_matches, shared_column_matches
+from ipandas.keywords import KeywordTable, ANY_METHOD
+from ipandas.memo import completion_memo, typed_value
+from ipandas.namespace import frame_namespace
+from ipandas.recorder import session_recorder
+from ipandas.rows import row_label_matches, level_name_matches
+from ipandas.scanner import statement_until_cursor
+from ipandas.schema import frame_type
+from ipandas.signatures import signature_registry
+from ipandas.stats import timed, count, traced, Stopwatch
+from ipandas.utils import extract_keyword_args_from_arguments_string, _extract_argument_from_string
+from ipandas.values import complete_column_values
 
 logger = logbook.Logger('IPandasCompleter')
 
@@ -18,78 +39,323 @@ function_re = re.compile(r'(?P<object>\w+)\.(?P<function>\w+)\((?P<kwargs>.*)$',
 dict_keys_re = re.compile(r'(?P<key>(\'\w*\'*|\"\w*\"*)):(?P<value>(\'\w*\'*|\"\w*\"*)|(\[[@\w,\s\'\"]+]?))?$',
                           re.MULTILINE)
 
+# matches df[df.city == "Lo, df.loc[df["city"] != 'Lo and df[df.city.isin(["London", "Lo
+value_re = re.compile(r'''(?P<dataframe>\w+)(?:\.loc)?\[.*?(?P=dataframe)
+                          (?:\.(?P<attribute>\w+)|\[(?P<key_quote>['"])(?P<key>[^'"]+)(?P=key_quote)\])
+                          \s*(?:[=!]=\s*|\.isin\(\s*\[(?:[^\]]*,\s*)?)
+                          ['"](?P<value>[^'"]*)$''', re.VERBOSE)
+# matches df.query("city == 'Lo
+query_re = re.compile(r'(?P<dataframe>\w+)\.query\((?P<expression>.*)$')
+# matches the last comparison inside a query expression - city == 'Lo, `my city` in ["London", 'Lo
+query_value_re = re.compile(r'''(?:`(?P<quoted_column>[^`]+)`|(?P<column>\w+))
+                                \s*(?:[=!]=|(?:not\s+)?in)\s*(?:\[(?:[^\]]*,\s*)?)?
+                                ['"](?P<value>[^'"]*)$''', re.VERBOSE)
+# matches df[("metric", "a, df[[("metric", "a"), ("metric", "b and df.loc[:, ("metric", "a
+multi_level_re = re.compile(r'''(?P<dataframe>\w+)(?:\[\[?|\.loc\[\s*:\s*,\s*\[?)(?:\([^()]*\)\s*,\s*)*
+                                 \((?P<typed>(?:\s*['"][^'"]*['"]\s*,)*)\s*['"](?P<value>[^'"]*)$''', re.VERBOSE)
+# matches pd.merge(left, right, on=" and merge(left=a, right=b, right_on=["a", "
+merge_function_re = re.compile(r'''(?:\w+\.)?merge\(\s*(?:left\s*=\s*)?(?P<dataframe>\w+)\s*,
+                                   \s*(?:right\s*=\s*)?(?P<right>\w+)\s*,(?P<arguments>.*)$''', re.VERBOSE | re.DOTALL)
+# matches left.merge(right, on=" and left.merge(right=right, left_on="
+merge_method_re = re.compile(r'''(?P<dataframe>\w+)\.merge\(\s*(?:right\s*=\s*)?(?P<right>\w+)\s*,
+                                 (?P<arguments>.*)$''', re.VERBOSE | re.DOTALL)
+# matches df.loc["2021-0, df.loc["a":"b and df.loc[["a", "b
+row_label_re = re.compile(r'''(?P<dataframe>\w+)\.loc\[\s*(?:['"][^'"]*['"]\s*:\s*|\[(?:[^\]]*,\s*)?)?
+                               ['"](?P<value>[^'"]*)$''', re.VERBOSE)
+quoted_value_re = re.compile(r'''['"]([^'"]*)['"]''')
+
 period_followed_by_open_paren = re.compile(r'\.(?=\S+\()', re.MULTILINE)
 
 dict_re = re.compile('{(.+)', re.DOTALL)
 
 
-def complete_columns(frame: DataFrame, method_name=None, current_value=None, **kwargs) -> List[str]:
-    available_columns = list(frame.columns)
-    if not current_value:
-        return available_columns
-    return list(filter(lambda x: x.startswith(current_value), available_columns))
+def complete_columns(frame: DataFrame, method_name=None, current_value=None, deadline: Deadline = None,
+                     kinds: int = None, **kwargs) -> List[str]:
+    with timed('complete_columns'):
+        return column_matches(frame, current_value, deadline=deadline, kinds=kinds)
+
+
+def complete_slice(frame: DataFrame, method_name: str = None, text=None, current_value: str = None,
+                   deadline: Deadline = None, match=None, **kwargs) -> List[str]:
+    # the labels after `df[`, the one being typed is the open string or the last unquoted label (`num[[1`)
+    labels = _extract_argument_from_string(text[match.end('dataframe') + 1:])
+    current_value = labels.current_value
+    if current_value is None and labels.is_collection and labels.argument:
+        # empty after a separator (`num[[1, `)
+        current_value = str(labels.argument[-1]).strip()
+    return complete_columns(frame=frame, method_name=None, current_value=current_value, deadline=deadline)
+
+
+def complete_values(frame: DataFrame, match, deadline: Deadline = None, **kwargs) -> List[str]:
+    column = match.group('attribute') or match.group('key')
+    return complete_column_values(frame, column, current_value=match.group('value'), deadline=deadline)
+
+
+def complete_query_values(frame: DataFrame, match, deadline: Deadline = None, **kwargs) -> List[str]:
+    expression = match.group('expression').lstrip()[1:]
+    value_match = query_value_re.search(expression)
+    if not value_match:
+        return []
+    column = value_match.group('quoted_column') or value_match.group('column')
+    return complete_column_values(frame, column, current_value=value_match.group('value'), deadline=deadline)
+
+
+def complete_multi_level(frame: DataFrame, match, **kwargs) -> List[str]:
+    typed = quoted_value_re.findall(match.group('typed'))
+    with timed('complete_columns'):
+        return column_level_matches(frame, typed, prefix=match.group('value'))
 
 
-def complete_slice(frame: DataFrame, method_name: str = None, text=None, current_value: str = None, **kwargs) -> List[str]:
-    matches = list(re.finditer(r'(\w+)', text))
-    # skip match only df
-    if matches and len(matches) > 1:
-        current_value = matches[-1].groups()[0]
-    return complete_columns(frame=frame, method_name=None, current_value=current_value)
+def complete_row_labels(frame: DataFrame, method_name=None, current_value=None, deadline: Deadline = None,
+                        **kwargs) -> List[str]:
+    with timed('complete_rows'):
+        return row_label_matches(frame, current_value, deadline=deadline)
+
+
+def complete_loc(frame: DataFrame, match, deadline: Deadline = None, **kwargs) -> List[str]:
+    return complete_row_labels(frame, current_value=match.group('value'), deadline=deadline)
+
+
+def complete_level_names(frame: DataFrame, method_name=None, current_value=None, **kwargs) -> List[str]:
+    return level_name_matches(frame, current_value)
+
+
+def complete_merge_keys(frame: DataFrame, match, deadline: Deadline = None,
+                        resolve: Callable[[str], object] = None, **kwargs) -> List[str]:
+    """
+    Completes the keys of a merge - `on` from the columns both frames have, `left_on`/`right_on` from each side.
+    """
+    with timed('kwargs'):
+        keyword_matches = extract_keyword_args_from_arguments_string(match.group('arguments'))
+    if not keyword_matches:
+        return []
+    keyword, current_value = keyword_matches[-1]
+    with timed('resolve'):
+        right = (resolve or frame_namespace.get)(match.group('right'))
+    if keyword == 'left_on' or (keyword == 'on' and right is None):
+        return complete_columns(frame, current_value=current_value, deadline=deadline)
+    if keyword == 'right_on' and right is not None:
+        return complete_columns(right, current_value=current_value, deadline=deadline)
+    if keyword == 'on':
+        with timed('complete_columns'):
+            return shared_column_matches([frame, right], current_value)
+    return []
 
 
 def complete_keyword(frame: DataFrame, session: InteractiveShell,
-                     frame_object_name: str, text: str, **kwargs) -> List[str]:
-    function_name, function_object = get_current_function(session, frame_object_name, text)
-    logger.debug('init text: {}'.format(text))
+                     frame_object_name: str, text: str, deadline: Deadline = None, **kwargs) -> List[str]:
+    function_name = get_current_function_name(text)
+    with timed('signature'):
+        parameters = signature_registry.parameters(frame_type(frame), function_name)
+        function_object = None
+        if parameters is None:
+            # not a method of the frame's class, ex. a callable set on the frame itself
+            function_object = inspect.getattr_static(frame, function_name, None)
+            if not callable(function_object):
+                function_object = None
+    logger.debug('init text: {}', text)
     # find index of last open (
     idx_last_open_paren = text.rfind('(')
     # text begins at idx + 1
     arguments_string = text[idx_last_open_paren + 1:]
 
-    keyword_matches = extract_keyword_args_from_arguments_string(arguments_string, function_object=function_object)
+    with timed('kwargs'):
+        keyword_matches = extract_keyword_args_from_arguments_string(arguments_string, function_object, parameters)
+    if not keyword_matches:
+        return []
 
     keyword_to_complete, current_value = keyword_matches[-1]
-    logger.debug('Final keyword_name {}, keyword_value {}'.format(keyword_to_complete, current_value))
-    completer = get_completer_for_keyword(keyword_name=keyword_to_complete, function_name=function_name)
-    if not completer:
+    if not isinstance(current_value, str):
+        # a complete scalar (`by=1`, `by=True`), labels are completed by their string form
+        current_value = str(current_value)
+    logger.debug('Final keyword_name {}, keyword_value {}', keyword_to_complete, current_value)
+    entry = keyword_table.entry(function_name, keyword_to_complete, frame_type(frame))
+    if entry is None:
         return []
-    return completer(frame=frame, method_name=function_name, current_value=current_value)
+    return entry.completer(frame=frame, method_name=function_name, current_value=current_value, deadline=deadline,
+                           kinds=entry.kinds)
 
 
 MATCHERS = {
+    value_re: complete_values,
+    query_re: complete_query_values,
+    multi_level_re: complete_multi_level,
+    # before function_re, which matches pd.concat([df.loc["a too
+    row_label_re: complete_loc,
+    # before merge_method_re, which matches pd.merge( too
+    merge_function_re: complete_merge_keys,
+    merge_method_re: complete_merge_keys,
+    function_re: complete_keyword,
+    slice_re: complete_slice
+}
+
+# matchers tried on the schema of a method chain (ex. `df[["a"]].groupby(by="`), these only need the columns
+CHAIN_MATCHERS = {
+    multi_level_re: complete_multi_level,
+    merge_method_re: complete_merge_keys,
     function_re: complete_keyword,
     slice_re: complete_slice
 }
 
+# matchers that complete without a DataFrame in memory, tried before MATCHERS.
+# callbacks get the session, text and match, MATCHERS are still tried when they return nothing
+SCHEMA_MATCHERS = {
+    file_reader_re: complete_file_columns,
+}
+
+# overrides of the keyword table, which is derived from the DataFrame API
 # {'keyword':
-#    {'function_name' (* = default): function}
+#    {'function_name' (* = any method): function}
 # }
+# dtype constraints of the parameters are declared in ipandas.keywords.DTYPE_CONSTRAINTS
 KEYWORDS_TO_COMPLETION_FUNCTION = {
-    'by': {
-        'groupby': complete_columns
-    },
-    'subset': {
-        'drop_duplicates': complete_columns
-    }
+    'key': {'xs': complete_row_labels},
+    # methods whose `level` is a level of the row index
+    'level': {method_name: complete_level_names
+              for method_name in ('droplevel', 'groupby', 'reset_index', 'sort_index', 'unstack', 'xs')},
 }
 
+keyword_table = KeywordTable(default_completer=complete_columns, overrides=KEYWORDS_TO_COMPLETION_FUNCTION)
+
+
+def register_keyword_completer(keyword_name: str, completer: Callable[..., List[str]],
+                               function_name: str = ANY_METHOD, kinds: int = None) -> None:
+    """
+    Completes `keyword_name` of `function_name` (any method by default) with `completer`,
+    which is called like complete_columns. `kinds` (ipandas.dtypes flags) is passed on to it.
+    """
+    keyword_table.register(keyword_name, completer, function_name, kinds=kinds)
+
 
 # We are not going to use IPython regular completer hook (ip.set_hook('complete_command')) since
 # it only accepts a string key or regex for command completion.
 # we are going to instead insert a custom matcher, inspect the query object
 # and offer completions based on internal state.
 # noinspection PyProtectedMember
-def ipandas_completer(self: IPCompleter, event) -> List[str]:
+def ipandas_completer(self: IPCompleter, event, deadline: Deadline = None) -> List[str]:
     """
     Main completer for moose queries. Handles bucket and field completion for query object.
     Currently only completes keyword args
     :param self: IPython completer state
     :param event: This is dispatched to the InteractiveSession and to hooks, we do not use this.
+    :param deadline: latency budget of this request, defaults to `config.latency_budget`
     :return: list of matches
     """
+    if deadline is None:
+        deadline = Deadline(config.latency_budget)
+    if config.record_path is not None:
+        return _record(self, deadline)
+    with timed('total'):
+        matches = _complete(self, deadline)
+    if deadline.partial:
+        count('deadline.partial')
+    return matches
+
+
+def _record(self: IPCompleter, deadline: Deadline) -> List[str]:
+    """
+    Completes like ipandas_completer, and appends the request with its stage timings to `config.record_path`.
+    """
+    bindings = []
+    generation = frame_namespace.generation
+    with traced() as trace:
+        with timed('total'):
+            matches = _complete(self, deadline, bindings)
+        if deadline.partial:
+            count('deadline.partial')
+    session_recorder.record(_cell_text_until_cursor(self), _cell_text(self), generation, bindings, matches,
+                            deadline, trace)
+    return matches
+
+
+def _complete(self: IPCompleter, deadline: Deadline, bindings: list = None) -> List[str]:
+    """
+    :param bindings: receives the (name, frame) pairs the request resolved
+    """
     # we will need InteractiveShell instance to fetch query object from python namespace
     ip = get_ipython()
+    with timed('text'):
+        text_until_cursor = _text_until_cursor(self)
+
+    with timed('memo'):
+        matches = completion_memo.refine(text_until_cursor, frame_namespace.generation, frame_namespace.get)
+    if matches is not None:
+        return matches
+
+    generation = frame_namespace.generation
+    # the frames this request resolves, the memo of its matches is only valid while they stay bound
+    if bindings is None:
+        bindings = []
+
+    def resolve(name: str) -> Optional[DataFrame]:
+        frame = frame_namespace.get(name, deadline)
+        if frame is not None:
+            bindings.append((name, frame))
+        return frame
+
+    matches = _complete_text(ip, text_until_cursor, resolve, deadline)
+    if deadline.partial or deadline.truncated:
+        completion_memo.clear()
+    else:
+        completion_memo.remember(text_until_cursor, matches, generation, bindings)
+    return matches
+
+
+def _complete_text(ip: InteractiveShell, text_until_cursor: str, resolve: Callable[[str], Optional[DataFrame]],
+                   deadline: Deadline) -> List[str]:
+    # the regex scans of a request are a single 'matchers' sample, however many matchers are tried
+    scan = Stopwatch('matchers')
+    try:
+        for matcher, callback in SCHEMA_MATCHERS.items():
+            with scan:
+                text_match = matcher.search(text_until_cursor)
+            if text_match:
+                with timed('callback.' + callback.__name__):
+                    matches = callback(session=ip, text=text_until_cursor, match=text_match, deadline=deadline)
+                if matches:
+                    return matches
+
+        with timed('chain'):
+            chain = resolve_chain(text_until_cursor, resolve)
+        if chain is not None:
+            chain_text, schema = chain
+            return _run_matchers(ip, CHAIN_MATCHERS, chain_text,
+                                 lambda name: schema if name == CHAIN_ALIAS else resolve(name), deadline, scan)
+
+        return _run_matchers(ip, MATCHERS, text_until_cursor, resolve, deadline, scan)
+    finally:
+        scan.record()
+
+
+def _run_matchers(ip: InteractiveShell, matchers: dict, text_until_cursor: str,
+                  resolve: Callable[[str], object], deadline: Deadline, scan: Stopwatch) -> List[str]:
+    for matcher, callback in matchers.items():
+        with scan:
+            text_match = matcher.search(text_until_cursor)
+        if text_match:
+            frame_object_name, *_ = text_match.groups()
+            with timed('resolve'):
+                dataframe_object = resolve(frame_object_name)
+            if dataframe_object is None:
+                return []
+            with timed('callback.' + callback.__name__):
+                return callback(frame=dataframe_object, session=ip, text=text_until_cursor,
+                                frame_object_name=frame_object_name, match=text_match, deadline=deadline,
+                                resolve=resolve)
+    return []
+
+
+def _cell_text(self: IPCompleter) -> str:
+    """
+    Returns the whole input being completed, the notebook cell when running in a kernel.
+    """
+    try:
+        return self.shell.parent_header['content']['code']
+    except (AttributeError, KeyError, TypeError):
+        return self.line_buffer
+
+
+def _cell_text_until_cursor(self: IPCompleter) -> str:
     text_until_cursor = self.text_until_cursor
     if text_until_cursor.startswith('  '):
         # 1 If we are running on notebook, text_until_cursor hook will fail for multiline inputs
@@ -104,36 +370,41 @@ def ipandas_completer(self: IPCompleter, event) -> List[str]:
         except AttributeError:
             # if we are running in a shell, always hook to default API
             text_until_cursor = self.text_until_cursor
+    return text_until_cursor
 
-    for matcher, callback in MATCHERS.items():
-        text_match = matcher.search(text_until_cursor)
-        if text_match:
-            frame_object_name, *_ = text_match.groups()
-            dataframe_object = ip._ofind(frame_object_name).get('obj')
-            if not isinstance(dataframe_object, DataFrame):
-                return []
-            return callback(frame=dataframe_object, session=ip, text=text_until_cursor,
-                            frame_object_name=frame_object_name)
-    return []
+
+def _text_until_cursor(self: IPCompleter) -> str:
+    # only the statement under the cursor is relevant, this keeps the matchers below
+    # from scanning the whole cell on every keystroke
+    return statement_until_cursor(_cell_text_until_cursor(self))
+
+
+def ipandas_context_matcher(self: IPCompleter, context) -> dict:
+    """
+    ipandas_completer for the v2 matcher API of IPython >= 8.6.
+    Complete results replace the matches of IPython's other matchers, partial results
+    (the latency budget ran out) are merged with them.
+    """
+    deadline = Deadline(config.latency_budget)
+    matches = ipandas_completer(self, None, deadline=deadline)
+    result = {
+        'completions': [SimpleCompletion(text=match, type='ipandas') for match in matches],
+        'suppress': bool(matches) and not deadline.partial,
+    }
+    if matches:
+        # the whole typed value is replaced, IPython's token stops at spaces and other delimiters ("New Y")
+        result['matched_fragment'] = typed_value(context.text_until_cursor, matches)
+    return result
+
+
+if context_matcher is not None:
+    ipandas_context_matcher = context_matcher()(ipandas_context_matcher)
 
 
 def get_completer_for_keyword(keyword_name, function_name) -> Union[Callable[..., List[str]], None]:
-    completion_func_or_dict = KEYWORDS_TO_COMPLETION_FUNCTION.get(keyword_name)
-    # We can have a mapping from method name to func, with default being *
-    if isinstance(completion_func_or_dict, dict):
-        func = completion_func_or_dict.get(function_name)
-        if not func:
-            func = completion_func_or_dict.get('*')
-    elif completion_func_or_dict is None:
-        return []
-    else:
-        func = completion_func_or_dict
-    return func
+    return keyword_table.completer(function_name, keyword_name)
 
 
-def get_current_function(ip: InteractiveShell, query_object_name, text_until_cursor):
+def get_current_function_name(text_until_cursor: str) -> str:
     function_names = period_followed_by_open_paren.split(text_until_cursor)
-    function_name = function_names[-1].split('(')[0]
-    # then we find function object (ex. search._stats)
-    function_object = ip._ofind('{}.{}'.format(query_object_name, function_name)).get('obj')
-    return function_name, function_object
+    return function_names[-1].split('(')[0]
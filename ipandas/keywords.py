@@ -0,0 +1,167 @@
+import inspect
+import threading
+from typing import Callable, Dict, Tuple, Optional, NamedTuple, List, Set
+
+import logbook
+
+from ipandas.dtypes import NUMERIC, BOOLEAN, DATETIME, OBJECT
+from ipandas.stats import count
+
+logger = logbook.Logger('IPandasCompleter')
+
+# method name standing for every method in overrides
+ANY_METHOD = '*'
+
+# parameters taking column labels of the frame the method is called on, on any DataFrame method
+COLUMN_PARAMETERS = frozenset(['by', 'column', 'columns', 'id_vars', 'items', 'keys', 'left_on', 'on', 'subset',
+                               'value_vars'])
+# parameters taking column labels only on some methods, elsewhere they take row labels or flags
+METHOD_COLUMN_PARAMETERS = {
+    'index': frozenset(['pivot', 'pivot_table']),
+    'values': frozenset(['pivot', 'pivot_table']),
+}
+# parameters named like column parameters that take something else - new labels or mappings
+EXCLUDED_PARAMETERS = frozenset([
+    ('from_dict', 'columns'),
+    ('from_records', 'columns'),
+    ('insert', 'column'),
+    ('rename', 'columns'),
+    ('rename_axis', 'columns'),
+])
+# parameters taking only columns of some dtypes, (method, parameter) -> dtype kind flags (see ipandas.dtypes)
+DTYPE_CONSTRAINTS = {
+    ('boxplot', 'column'): NUMERIC | BOOLEAN,
+    ('explode', 'column'): OBJECT,
+    ('hist', 'column'): NUMERIC | BOOLEAN,
+    ('nlargest', 'columns'): NUMERIC,
+    ('nsmallest', 'columns'): NUMERIC,
+    ('pivot_table', 'values'): NUMERIC | BOOLEAN,
+    ('resample', 'on'): DATETIME,
+    # offset windows need a datetime column, integer windows work over any monotonic numeric column too
+    ('rolling', 'on'): DATETIME | NUMERIC,
+}  # type: Dict[Tuple[str, str], int]
+
+Completer = Callable[..., List[str]]
+
+
+class KeywordEntry(NamedTuple('KeywordEntry', [('completer', Completer), ('kinds', Optional[int])])):
+    """
+    A completable parameter, `kinds` the dtype kinds of the columns it takes (None for any column).
+    """
+
+
+def _column_parameters(frame_type: type) -> Set[Tuple[str, str]]:
+    """
+    Introspects the public methods of `frame_type` for parameters taking its column labels.
+    :return: (method, parameter) pairs
+    """
+    parameters = set()
+    for method_name in dir(frame_type):
+        if method_name.startswith('_'):
+            continue
+        method = getattr(frame_type, method_name, None)
+        if not callable(method):
+            continue
+        try:
+            signature = inspect.signature(method)
+        except (TypeError, ValueError):
+            continue
+        for name in signature.parameters:
+            is_column_parameter = name in COLUMN_PARAMETERS or method_name in METHOD_COLUMN_PARAMETERS.get(name, ())
+            if is_column_parameter and (method_name, name) not in EXCLUDED_PARAMETERS:
+                parameters.add((method_name, name))
+    return parameters
+
+
+class KeywordTable(object):
+    """
+    Flat (method, keyword) -> KeywordEntry (completer, kinds) dispatch table, one per frame type.
+    Entries are looked up by keyword, the parameter a positional argument stands for comes from ipandas.signatures.
+
+    Derived from introspection of the frame type's API (DataFrame by default) the first time it's used:
+    every parameter taking column labels of the frame is completed by `default_completer`.
+    Other frame types (ex. pyarrow Tables) are introspected the same way, by the same parameter names.
+    `overrides` ({'keyword': {'method' (* = any method): completer}}) take precedence over derived entries,
+    register_keyword_completer adds to them and recompiles the table.
+    `dtype_constraints` ({(method, keyword): dtype kinds}) are passed to the completers as `kinds`.
+    """
+
+    def __init__(self, default_completer: Completer, overrides: Dict[str, Dict[str, Completer]],
+                 dtype_constraints: Dict[Tuple[str, str], int] = None):
+        self.default_completer = default_completer
+        self.overrides = overrides
+        self.dtype_constraints = dict(DTYPE_CONSTRAINTS) if dtype_constraints is None else dtype_constraints
+        self._tables = {}  # type: Dict[type, Dict[Tuple[str, str], KeywordEntry]]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.table)
+
+    @staticmethod
+    def frame_type() -> type:
+        from pandas import DataFrame
+        return DataFrame
+
+    def compile(self, frame_type: type = None) -> Dict[Tuple[str, str], KeywordEntry]:
+        frame_type = frame_type or self.frame_type()
+        table = {key: KeywordEntry(self.default_completer, None) for key in _column_parameters(frame_type)}
+        for keyword, methods in self.overrides.items():
+            if not isinstance(methods, dict):
+                methods = {ANY_METHOD: methods}
+            # overrides for any method replace the derived entries (and their dtype constraint),
+            # overrides for a method replace both
+            for method_name, completer in sorted(methods.items(), key=lambda item: item[0] != ANY_METHOD):
+                if method_name == ANY_METHOD:
+                    kinds = self.dtype_constraints.get((ANY_METHOD, keyword))
+                    for key, entry in table.items():
+                        if key[1] == keyword:
+                            table[key] = entry._replace(completer=completer, kinds=kinds)
+                table[(method_name, keyword)] = KeywordEntry(completer, None)
+        # constraints of a method take precedence over the constraint of an override for any method
+        for key, kinds in self.dtype_constraints.items():
+            if key in table:
+                table[key] = table[key]._replace(kinds=kinds)
+        logger.debug('compiled keyword table of {} with {} entries'.format(frame_type.__name__, len(table)))
+        with self._lock:
+            self._tables[frame_type] = table
+        return table
+
+    @property
+    def table(self) -> Dict[Tuple[str, str], KeywordEntry]:
+        return self.table_of(self.frame_type())
+
+    def table_of(self, frame_type: type) -> Dict[Tuple[str, str], KeywordEntry]:
+        table = self._tables.get(frame_type)
+        if table is None:
+            table = self.compile(frame_type)
+        return table
+
+    def entry(self, method_name: str, keyword: str, frame_type: type = None) -> Optional[KeywordEntry]:
+        table = self.table_of(frame_type) if frame_type is not None else self.table
+        entry = table.get((method_name, keyword))
+        if entry is None:
+            entry = table.get((ANY_METHOD, keyword))
+        count('keywords.hit' if entry is not None else 'keywords.miss')
+        return entry
+
+    def completer(self, method_name: str, keyword: str) -> Optional[Completer]:
+        """
+        Returns the completer of `keyword` of `method_name`, None if it doesn't take column labels.
+        """
+        entry = self.entry(method_name, keyword)
+        return entry.completer if entry is not None else None
+
+    def register(self, keyword: str, completer: Completer, method_name: str = ANY_METHOD,
+                 kinds: int = None) -> None:
+        """
+        Completes `keyword` of `method_name` (any method by default) with `completer`,
+        `kinds` limits it to columns of these dtype kinds.
+        """
+        methods = self.overrides.setdefault(keyword, {})
+        if not isinstance(methods, dict):
+            methods = self.overrides[keyword] = {ANY_METHOD: methods}
+        methods[method_name] = completer
+        if kinds is not None:
+            self.dtype_constraints[(method_name, keyword)] = kinds
+        with self._lock:
+            self._tables.clear()
@@ -0,0 +1,38 @@
+import json
+
+from IPython.core.magic_arguments import magic_arguments, argument, parse_argstring
+
+from ipandas.config import config
+from ipandas.stats import stats
+
+
+@magic_arguments()
+@argument('--json', action='store_true', help='Print the statistics as JSON')
+@argument('--reset', action='store_true', help='Reset the statistics after printing them')
+def ipandas_stats(line: str = '') -> None:
+    """
+    Shows latency percentiles of every completion stage and the cache hit/miss counters.
+    """
+    args = parse_argstring(ipandas_stats, line)
+    if args.json:
+        print(json.dumps(stats.as_dict(), indent=2))
+    else:
+        print(stats.format())
+    if args.reset:
+        stats.reset()
+
+
+@magic_arguments()
+@argument('path', nargs='?', help='JSON lines log the completion requests are appended to')
+@argument('--stop', action='store_true', help='Stop recording')
+def ipandas_record(line: str = '') -> None:
+    """
+    Records every completion request (text, frame schemas, stage timings) to a log,
+    replay it offline under cProfile with `python -m ipandas.replay <path>`.
+    """
+    args = parse_argstring(ipandas_record, line)
+    if args.stop:
+        config.record_path = None
+    elif args.path:
+        config.record_path = args.path
+    print('recording completions to {}'.format(config.record_path) if config.record_path else 'not recording')
@@ -0,0 +1,108 @@
+import re
+import threading
+import weakref
+from typing import List, Optional, Tuple, Sequence, Callable
+
+from pandas import DataFrame
+
+from ipandas.stats import count
+
+# characters typed after the previous request that keep the cursor inside the same value,
+# anything else (quotes, commas, brackets, whitespace, operators) may start another argument
+_EXTENSION_RE = re.compile(r'[\w\-./]*')
+
+
+def typed_value(text: str, matches: Sequence[str]) -> str:
+    """
+    Returns the value the `matches` were completed for - the longest end of `text` all of them start with.
+    """
+    # the common prefix of the smallest and largest strings is the common prefix of all of them
+    low, high = min(matches), max(matches)
+    length = 0
+    for a, b in zip(low, high):
+        if a != b:
+            break
+        length += 1
+    for length in range(min(length, len(text)), 0, -1):
+        if text.endswith(low[:length]):
+            return low[:length]
+    return ''
+
+
+class _Entry(object):
+    __slots__ = ('text', 'value', 'matches', 'generation', 'bindings')
+
+    def __init__(self, text: str, value: str, matches: List[str], generation: int,
+                 bindings: List[Tuple[str, weakref.ref, weakref.ref]]):
+        self.text = text
+        self.value = value
+        self.matches = matches
+        self.generation = generation
+        self.bindings = bindings
+
+
+class CompletionMemo(object):
+    """
+    The context and matches of the last completion request.
+
+    Tab after tab, a value is typed one character at a time. When a request only extends the text of the previous one
+    by characters that can't leave the value being completed, its matches are the previous matches starting with the
+    longer value - they are narrowed instead of running the matchers again.
+
+    The memo is valid while no cell was executed since (`generation`) and every frame name the previous request
+    resolved is still bound to the same frame with the same columns object.
+    Capped, ranked (fuzzy) or partial matches are not remembered, narrowing them could miss labels.
+    """
+
+    def __init__(self):
+        self._entry = None  # type: Optional[_Entry]
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entry = None
+
+    def remember(self, text: str, matches: List[str], generation: int,
+                 bindings: Sequence[Tuple[str, DataFrame]] = ()) -> None:
+        if not matches:
+            self.clear()
+            return
+        refs = [(name, weakref.ref(frame), weakref.ref(frame.columns)) for name, frame in bindings]
+        with self._lock:
+            self._entry = _Entry(text, typed_value(text, matches), matches, generation, refs)
+
+    @staticmethod
+    def _valid(entry: _Entry, generation: int, resolve: Callable[[str], Optional[DataFrame]]) -> bool:
+        if entry.generation != generation:
+            return False
+        for name, frame_ref, columns_ref in entry.bindings:
+            frame = frame_ref()
+            if frame is None or resolve(name) is not frame or frame.columns is not columns_ref():
+                return False
+        return True
+
+    def refine(self, text: str, generation: int, resolve: Callable[[str], Optional[DataFrame]]) -> Optional[List[str]]:
+        """
+        Returns the matches of `text` narrowed from the previous request's, None if they have to be computed.
+        """
+        entry = self._entry
+        if entry is None or not text.startswith(entry.text):
+            count('memo.miss')
+            return None
+        extension = text[len(entry.text):]
+        if _EXTENSION_RE.fullmatch(extension) is None or not self._valid(entry, generation, resolve):
+            count('memo.miss')
+            return None
+        start = len(entry.value)
+        matches = [match for match in entry.matches if match.startswith(extension, start)]
+        if not matches:
+            # nothing left to narrow, another matcher may still complete the text
+            count('memo.miss')
+            return None
+        count('memo.hit')
+        with self._lock:
+            self._entry = _Entry(text, entry.value + extension, matches, generation, entry.bindings)
+        return matches
+
+
+completion_memo = CompletionMemo()
@@ -0,0 +1,139 @@
+import weakref
+from typing import Dict, Optional, List, Union
+
+from IPython import InteractiveShell
+from pandas import DataFrame
+
+from ipandas import background
+from ipandas.adapters import is_adaptable, schema_adapters
+from ipandas.config import config, FUZZY
+from ipandas.deadline import Deadline
+from ipandas.index import get_column_index, cached_label_index, MultiColumnIndex
+from ipandas.schema import SchemaFrame, frame_type
+from ipandas.signatures import signature_registry
+from ipandas.stats import count
+
+
+def prebuild(frame) -> None:
+    """
+    Builds everything the first completion request on `frame` is going to need.
+    Non pandas frames are adapted (their schema is read) first.
+    """
+    if not isinstance(frame, DataFrame):
+        frame = schema_adapters.get(frame)
+        if frame is None:
+            return
+    index = get_column_index(frame)
+    # interned label ids, for completing the columns shared with other frames
+    (index.level_indexes[0] if isinstance(index, MultiColumnIndex) else index).label_ids()
+    if config.completion_mode == FUZZY:
+        index.fuzzy_arrays()
+    signature_registry.precompute(frame_type(frame))
+
+
+class FrameNamespace(object):
+    """
+    Maps names in the user namespace to weak references of the DataFrames bound to them.
+
+    The mapping is refreshed by diffing `user_ns` after every execution,
+    so resolving the frame being completed is a dict lookup instead of a walk through IPython's object finder.
+    Only weak references are kept - deleting a DataFrame in the notebook frees it as usual.
+    """
+
+    def __init__(self):
+        self._refs = {}  # type: Dict[str, weakref.ref]
+        self._user_ns = None  # type: Optional[dict]
+        # incremented by every refresh, anything computed from the namespace before may be stale
+        self.generation = 0
+
+    def attach(self, ip: InteractiveShell) -> None:
+        self._user_ns = ip.user_ns
+        self.refresh()
+        ip.events.register('post_execute', self.on_post_execute)
+
+    def detach(self, ip: InteractiveShell) -> None:
+        try:
+            ip.events.unregister('post_execute', self.on_post_execute)
+        except ValueError:
+            pass
+        self._refs.clear()
+        self._user_ns = None
+
+    def _forget(self, name: str, ref: weakref.ref) -> None:
+        # the name might have been bound to a new frame since, only drop our own entry
+        if self._refs.get(name) is ref:
+            del self._refs[name]
+
+    def _remember(self, name: str, frame) -> None:
+        try:
+            self._refs[name] = weakref.ref(frame, lambda ref, name=name: self._forget(name, ref))
+        except TypeError:
+            # not weak-referencable, looked up in the user namespace on every request instead
+            pass
+
+    @staticmethod
+    def _is_frame(value) -> bool:
+        return isinstance(value, DataFrame) or is_adaptable(value)
+
+    def refresh(self) -> List[DataFrame]:
+        """
+        Diffs the user namespace against the cache.
+        :return: the frames that are new or were rebound since the last refresh
+        """
+        if self._user_ns is None:
+            return []
+        self.generation += 1
+        frames = {name: value for name, value in self._user_ns.items() if self._is_frame(value)}
+        for name in [name for name in self._refs if name not in frames]:
+            self._refs.pop(name, None)
+        changed = []
+        for name, frame in frames.items():
+            ref = self._refs.get(name)
+            if ref is None or ref() is not frame:
+                self._remember(name, frame)
+                changed.append(frame)
+        return changed
+
+    def on_post_execute(self) -> None:
+        self.refresh()
+        if not config.precompute_after_execution:
+            return
+        # new frames as well as frames whose columns were changed in place
+        for frame in self.frames():
+            if isinstance(frame, DataFrame):
+                prebuilt = cached_label_index(frame.columns) is not None
+            else:
+                prebuilt = schema_adapters.cached(frame) is not None
+            if not prebuilt:
+                background.submit(('prebuild', id(frame)), prebuild, frame)
+
+    def frames(self) -> List[DataFrame]:
+        """
+        Returns all the live frames in the user namespace, DataFrames and non pandas frames we can adapt.
+        """
+        return [frame for frame in (ref() for ref in list(self._refs.values())) if frame is not None]
+
+    def get(self, name: str, deadline: Deadline = None) -> Optional[Union[DataFrame, SchemaFrame]]:
+        """
+        Returns the DataFrame bound to `name` (the SchemaFrame of a non pandas frame), or None if there isn't one.
+        :param deadline: of the request resolving `name`, see SchemaAdapters.get
+        """
+        ref = self._refs.get(name)
+        frame = ref() if ref is not None else None
+        if frame is not None:
+            count('namespace.hit')
+        else:
+            count('namespace.miss')
+            # the name was bound without going through a cell execution (ex. ip.ex)
+            if self._user_ns is None:
+                return None
+            frame = self._user_ns.get(name)
+            if not self._is_frame(frame):
+                return None
+            self._remember(name, frame)
+        if isinstance(frame, DataFrame):
+            return frame
+        return schema_adapters.get(frame, deadline)
+
+
+frame_namespace = FrameNamespace()
@@ -0,0 +1,198 @@
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from itertools import groupby
+from typing import Dict, List, Tuple, Optional, Sequence
+
+import logbook
+import numpy as np
+from pandas import MultiIndex
+
+from ipandas.config import config
+from ipandas.deadline import Deadline
+from ipandas.dtypes import dtypes_version, blocks_of
+from ipandas.schema import frame_type
+from ipandas.stats import Trace
+
+logger = logbook.Logger('IPandasCompleter')
+
+
+def _label(label):
+    """
+    Returns a column label as a JSON value, tuples (MultiIndex labels) become lists and other objects strings.
+    """
+    if isinstance(label, tuple):
+        return [_label(part) for part in label]
+    if isinstance(label, np.generic):
+        label = label.item()
+    if label is None or isinstance(label, (str, bool, int, float)):
+        return label
+    return str(label)
+
+
+def _dtype_runs(frame) -> Optional[List[List]]:
+    """
+    Returns the column dtypes of `frame` run-length encoded as [[dtype name, number of columns], ...],
+    None if they are unknown. Wide frames usually hold a few long runs of the same dtype.
+    """
+    blocks = blocks_of(frame)
+    if blocks is not None:
+        if not len(frame.columns):
+            return []
+        # the dtype of each column, as the position of its name in `names`, assigned per block
+        names = []  # type: List[str]
+        codes = np.empty(len(frame.columns), dtype=np.intp)
+        for block, positions in blocks:
+            name = str(block.dtype)
+            if name not in names:
+                names.append(name)
+            codes[positions] = names.index(name)
+        starts = np.flatnonzero(np.diff(codes)) + 1
+        lengths = np.diff(np.append(starts, len(codes)), prepend=0)
+        return [[names[code], int(length)] for code, length in zip(codes[np.append(0, starts)], lengths)]
+    dtypes = getattr(frame, 'dtypes', None)
+    if dtypes is None:
+        return None
+    return [[str(dtype), sum(1 for _ in run)] for dtype, run in groupby(dtypes)]
+
+
+def fingerprint(frame) -> Dict:
+    """
+    Returns the schema of `frame` as a JSON-able dict - its type, column labels and dtypes,
+    and the names, dtypes and length of its row index. No values are read.
+    """
+    columns = frame.columns
+    if isinstance(columns, MultiIndex) or columns.inferred_type != 'string':
+        labels = [_label(label) for label in columns]
+    else:
+        labels = columns.tolist()
+    cls = frame_type(frame)
+    schema = OrderedDict([
+        ('type', '{}.{}'.format(cls.__module__, cls.__qualname__)),
+        ('columns', labels),
+        ('column_levels', columns.nlevels),
+        ('columns_dtype', None if isinstance(columns, MultiIndex) else str(columns.dtype)),
+        ('dtypes', _dtype_runs(frame)),
+    ])
+    index = getattr(frame, 'index', None)
+    if index is not None:
+        levels = index.levels if isinstance(index, MultiIndex) else [index]
+        schema['index'] = OrderedDict([('names', [_label(name) for name in index.names]),
+                                       ('dtypes', [str(level.dtype) for level in levels]),
+                                       ('length', len(index))])
+    else:
+        schema['index'] = OrderedDict([('names', [_label(name) for name in frame.index_names]),
+                                       ('dtypes', None), ('length', None)])
+    return schema
+
+
+def schema_id(schema: Dict) -> str:
+    return hashlib.blake2b(json.dumps(schema).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def cell_hash(cell: str) -> str:
+    return hashlib.blake2b(cell.encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest()
+
+
+def _version(frame) -> Tuple:
+    index = getattr(frame, 'index', None)
+    return weakref.ref(frame.columns), None if index is None else weakref.ref(index), dtypes_version(frame)
+
+
+class SessionRecorder(object):
+    """
+    Appends every completion request to a JSON lines log, so slow requests seen in a real session
+    can be reproduced and profiled offline (`python -m ipandas.replay`).
+
+    The log holds two kinds of lines:
+    - schemas: {"schema": id, "type", "columns", "column_levels", "columns_dtype", "dtypes", "index"},
+      written once per distinct schema
+    - requests: {"time", "cell", "text", "generation", "frames", "matches", "partial", "truncated",
+      "stages_ms", "counters"} - the text until the cursor, a hash of the cell, the frames the request resolved
+      ({name: schema id}) and the time spent per stage
+
+    Values are never recorded, but column labels and the typed text are - treat a log like the notebook itself.
+    """
+
+    def __init__(self):
+        # id(frame) -> (weakref to frame, version of its schema, schema id)
+        self._schema_ids = {}  # type: Dict[int, Tuple[weakref.ref, Tuple, str]]
+        # the path the ids in `_written` were written to
+        self._path = None  # type: Optional[str]
+        self._written = set()
+        self._lock = threading.Lock()
+
+    def _forget(self, key: int) -> None:
+        with self._lock:
+            self._schema_ids.pop(key, None)
+
+    def _schema_of(self, frame, lines: List[str]) -> str:
+        """
+        Returns the schema id of `frame`, appending its schema to `lines` the first time it is written.
+        The schema is only fingerprinted again when the frame's columns, index or dtypes were replaced.
+        """
+        key = id(frame)
+        entry = self._schema_ids.get(key)
+        version = _version(frame)
+        if entry is not None and entry[0]() is frame and entry[1] == version:
+            identifier = entry[2]
+            if identifier in self._written:
+                return identifier
+            schema = fingerprint(frame)
+        else:
+            schema = fingerprint(frame)
+            identifier = schema_id(schema)
+            try:
+                ref = weakref.ref(frame, lambda _, key=key: self._forget(key))
+            except TypeError:
+                ref = None
+            if ref is not None:
+                with self._lock:
+                    self._schema_ids[key] = (ref, version, identifier)
+        if identifier not in self._written:
+            lines.append(json.dumps(OrderedDict([('schema', identifier)] + list(schema.items()))))
+            self._written.add(identifier)
+        return identifier
+
+    def record(self, text: str, cell: str, generation: int, bindings: Sequence[Tuple[str, object]],
+               matches: List[str], deadline: Deadline, trace: Trace) -> None:
+        """
+        Appends a completion request to the log at `config.record_path`.
+        :param text: the text until the cursor, as the completer received it
+        :param cell: the whole input, only its hash is recorded
+        :param bindings: the (name, frame) pairs the request resolved
+        """
+        path = config.record_path
+        if path is None:
+            return
+        if path != self._path:
+            self._path = path
+            self._written.clear()
+        lines = []
+        try:
+            frames = OrderedDict((name, self._schema_of(frame, lines)) for name, frame in bindings)
+            lines.append(json.dumps(OrderedDict([
+                ('time', round(time.time(), 3)),
+                ('cell', cell_hash(cell)),
+                ('text', text),
+                ('generation', generation),
+                ('frames', frames),
+                ('matches', len(matches)),
+                ('partial', deadline.partial),
+                ('truncated', deadline.truncated),
+                ('stages_ms', OrderedDict((stage, round(seconds * 1000, 4))
+                                          for stage, seconds in trace.stages.items())),
+                ('counters', OrderedDict(sorted(trace.counters.items()))),
+            ])))
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except (OSError, TypeError, ValueError) as e:
+            # recording must never break completion
+            logger.warning('could not record the completion request to {}: {!r}'.format(path, e))
+            self._written.clear()
+
+
+session_recorder = SessionRecorder()
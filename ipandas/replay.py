@@ -0,0 +1,174 @@
+"""
+Replays a completion log recorded with `config.record_path` (or %ipandas_record) under cProfile.
+
+    python -m ipandas.replay completions.jsonl --sort cumulative --limit 40 --output replay.prof
+
+The frames of the recorded session are rebuilt as empty DataFrames from their schemas - same column labels,
+dtypes and row index levels, no rows. Column, keyword and dtype completion reproduce the recorded work,
+completions that read values (column values, row labels) return nothing. Non pandas frames are stubbed as DataFrames.
+"""
+import argparse
+import cProfile
+import json
+import pstats
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Iterator, Tuple, Optional
+
+import logbook
+import numpy as np
+from pandas import DataFrame, Index, MultiIndex, Series, concat
+from pandas.api.types import pandas_dtype
+
+from ipandas import background
+from ipandas.config import config
+from ipandas.memo import completion_memo
+
+logger = logbook.Logger('IPandasCompleter')
+
+
+def read_log(path: str) -> Iterator[Tuple[Dict[str, dict], dict]]:
+    """
+    Yields the requests of a log with the schemas recorded so far, {schema id: schema}.
+    """
+    schemas = {}
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # the session may have been killed while writing the last line
+                logger.warning('skipping line {} of {}, it is not valid JSON'.format(number, path))
+                continue
+            if 'schema' in entry:
+                schemas[entry['schema']] = entry
+            else:
+                yield schemas, entry
+
+
+def _dtype(name: str):
+    try:
+        return pandas_dtype(name)
+    except (TypeError, ValueError, ImportError):
+        # ex. an Arrow dtype without pyarrow installed
+        return np.dtype(object)
+
+
+def _empty_columns(dtype_name: str, length: int) -> DataFrame:
+    dtype = _dtype(dtype_name)
+    if isinstance(dtype, np.dtype):
+        return DataFrame(np.empty((0, length), dtype=dtype))
+    return DataFrame({position: Series([], dtype=dtype) for position in range(length)})
+
+
+def stub_frame(schema: dict) -> DataFrame:
+    """
+    Builds an empty DataFrame with the column labels, dtypes and row index levels of a recorded schema.
+    """
+    labels = schema['columns']
+    if schema.get('column_levels', 1) > 1:
+        columns = MultiIndex.from_tuples([tuple(label) for label in labels])
+    else:
+        columns = Index(labels, dtype=_dtype(schema['columns_dtype']) if schema.get('columns_dtype') else None)
+    runs = schema.get('dtypes') or [['object', len(labels)]]
+    frame = concat([_empty_columns(dtype_name, length) for dtype_name, length in runs], axis=1, ignore_index=True)
+    frame.columns = columns
+    index = schema.get('index') or {}
+    names = index.get('names') or [None]
+    dtypes = index.get('dtypes') or ['int64'] * len(names)
+    levels = [Index([], dtype=_dtype(dtype_name), name=name) for dtype_name, name in zip(dtypes, names)]
+    frame.index = MultiIndex.from_arrays(levels) if len(levels) > 1 else levels[0]
+    return frame
+
+
+def replay(ip, path: str, profile: Optional[cProfile.Profile] = None) -> List[dict]:
+    """
+    Completes every request of the log at `path` with `ip.Completer`, which must have ipandas loaded.
+
+    Names are bound to the stub frames of the schemas the requests resolved, and a cell execution is simulated
+    (post_execute, waiting for the background prebuilds) wherever the recorded session executed one in between.
+    Replayed times are of the whole `Completer.complete`, IPython's other matchers included.
+    :param profile: enabled around each completion only
+    :return: per request {"text", "recorded_ms", "replayed_ms", "recorded_matches", "replayed_matches"}
+    """
+    record_path, config.record_path = config.record_path, None
+    completion_memo.clear()
+    bound = {}  # type: Dict[str, str]
+    stubs = {}  # type: Dict[str, DataFrame]
+    generation = None
+    results = []
+    # imports the completer and attaches it to the namespace, the first recorded request shouldn't pay for that
+    ip.Completer.complete(line_buffer='', cursor_pos=0)
+    try:
+        for schemas, request in read_log(path):
+            rebound = False
+            for name, identifier in request['frames'].items():
+                if bound.get(name) != identifier and identifier in schemas:
+                    if identifier not in stubs:
+                        stubs[identifier] = stub_frame(schemas[identifier])
+                    ip.user_ns[name] = stubs[identifier]
+                    bound[name] = identifier
+                    rebound = True
+            if rebound or request['generation'] != generation:
+                ip.events.trigger('post_execute')
+                background.wait()
+                generation = request['generation']
+            text = request['text']
+            start = time.perf_counter()
+            if profile is not None:
+                profile.enable()
+            try:
+                _, matches = ip.Completer.complete(line_buffer=text, cursor_pos=len(text))
+            finally:
+                if profile is not None:
+                    profile.disable()
+            results.append(OrderedDict([
+                ('text', text),
+                ('recorded_ms', request['stages_ms'].get('total')),
+                ('replayed_ms', (time.perf_counter() - start) * 1000),
+                ('recorded_matches', request['matches']),
+                ('replayed_matches', len(matches)),
+            ]))
+    finally:
+        config.record_path = record_path
+    return results
+
+
+def _format_slowest(results: List[dict], n: int) -> str:
+    lines = ['{:>12}{:>12}{:>10}  {}'.format('recorded ms', 'replayed ms', 'matches', 'text')]
+    for result in sorted(results, key=lambda r: r['recorded_ms'] or 0.0, reverse=True)[:n]:
+        # the line the cursor was on
+        text = (result['text'].splitlines() or [''])[-1]
+        lines.append('{:>12.3f}{:>12.3f}{:>10}  {}'.format(result['recorded_ms'] or 0.0, result['replayed_ms'],
+                                                           result['replayed_matches'], text[-60:]))
+    return '\n'.join(lines)
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m ipandas.replay', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('log', help='JSON lines log written by the recorder')
+    parser.add_argument('--sort', default='cumulative', help='pstats sort key (default: cumulative)')
+    parser.add_argument('--limit', type=int, default=30, help='number of functions printed (default: 30)')
+    parser.add_argument('--slowest', type=int, default=10, help='number of slowest requests printed (default: 10)')
+    parser.add_argument('--output', help='also dump the profile to this file, for snakeviz or pstats')
+    args = parser.parse_args(argv)
+
+    from IPython.core.interactiveshell import InteractiveShell
+    ip = InteractiveShell.instance()
+    ip.extension_manager.load_extension('ipandas')
+    profile = cProfile.Profile()
+    results = replay(ip, args.log, profile)
+
+    print('{} requests replayed\n'.format(len(results)))
+    print(_format_slowest(results, args.slowest))
+    print()
+    pstats.Stats(profile, stream=sys.stdout).sort_stats(args.sort).print_stats(args.limit)
+    if args.output:
+        profile.dump_stats(args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+import calendar
+import datetime
+import threading
+import weakref
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+from pandas import DatetimeIndex, Index, MultiIndex, Timedelta, Timestamp
+from pandas.api.types import is_string_dtype
+
+from ipandas import background
+from ipandas.config import config
+from ipandas.deadline import Deadline
+from ipandas.stats import count
+
+# non monotonic indexes up to this many labels are sorted inside the completion request, longer ones in the background
+SYNC_BUILD_ROWS = 100000
+
+# appended to a prefix to get the upper bound of all strings starting with it
+_MAX_CHAR = '\U0010ffff'
+# the string form of a timestamp, digits of a prefix are padded with the smallest / largest digits
+# that can follow them, and the fields are clamped to valid values afterwards
+_TIMESTAMP_LOW = '0000-00-00 00:00:00.000000000'
+_TIMESTAMP_HIGH = '9999-19-39 29:59:59.999999999'
+# years of timestamps representable in nanoseconds
+_MIN_YEAR = 1678
+_MAX_YEAR = 2261
+
+
+def _searchable(index: Index) -> bool:
+    """
+    Row labels are completed for string and timestamp indexes, other labels aren't typed as strings.
+    """
+    return isinstance(index, DatetimeIndex) or is_string_dtype(index.dtype)
+
+
+class RowLabelIndex(object):
+    """
+    Prefix queries over the (string or timestamp) labels of a row index.
+
+    Monotonic indexes are searched in place with Index.searchsorted - two binary searches and no copies.
+    Other indexes are searched through a sorted copy of their distinct labels, built once per index object.
+    """
+
+    def __init__(self, index: Index):
+        if index.is_monotonic_increasing:
+            # don't hold on to the index, the cache entry must not keep it alive
+            self.sorted_labels = None  # type: Optional[Index]
+        else:
+            labels = index.dropna().unique()
+            if isinstance(labels, DatetimeIndex):
+                self.sorted_labels = labels.sort_values()
+            else:
+                # numpy sorts fixed width strings about three times faster than pandas sorts objects,
+                # and labels of mixed types are sorted by their string form instead of failing
+                self.sorted_labels = Index(np.sort(labels.to_numpy(dtype=str)), dtype=object)
+
+    def prefix(self, index: Index, prefix: str = None, limit: int = 100) -> List[str]:
+        """
+        Returns up to `limit` distinct labels of `index` starting with `prefix`, in sorted order.
+        :param index: the index this was built for
+        """
+        labels = index if self.sorted_labels is None else self.sorted_labels
+        prefix = prefix or ''
+        try:
+            if isinstance(labels, DatetimeIndex):
+                return _timestamp_prefix(labels, prefix, limit)
+            start = labels.searchsorted(prefix, side='left')
+            stop = labels.searchsorted(prefix + _MAX_CHAR, side='left')
+        except TypeError:
+            return []
+        return _distinct_head(labels, start, stop, limit).astype(str).tolist()
+
+
+def _distinct_head(labels: Index, start: int, stop: int, limit: int) -> Index:
+    """
+    Returns the first `limit` distinct labels of the sorted `labels[start:stop]`, equal labels are adjacent.
+    """
+    window = limit
+    while True:
+        head = labels[start:min(stop, start + window)].unique()
+        if len(head) >= limit or start + window >= stop:
+            return head[:limit]
+        window *= 4
+
+
+def _timestamp_bound(text: str, tz) -> Timestamp:
+    year = min(max(int(text[0:4]), _MIN_YEAR), _MAX_YEAR)
+    month = min(max(int(text[5:7]), 1), 12)
+    day = min(max(int(text[8:10]), 1), calendar.monthrange(year, month)[1])
+    nanoseconds = int(text[20:29])
+    bound = Timestamp(datetime.datetime(year, month, day, min(int(text[11:13]), 23), min(int(text[14:16]), 59),
+                                        min(int(text[17:19]), 59), nanoseconds // 1000))
+    bound += Timedelta(nanoseconds % 1000, unit='ns')
+    if tz is not None:
+        bound = bound.tz_localize(tz, ambiguous=True, nonexistent='shift_forward')
+    return bound
+
+
+def _timestamp_prefix(labels: DatetimeIndex, prefix: str, limit: int) -> List[str]:
+    """
+    Completes the timestamps whose string form starts with `prefix` ("2021-0", "2021-03-01 1").
+
+    The string forms of the timestamps starting with a prefix are a contiguous range of timestamps,
+    so the prefix is turned into the smallest and largest timestamp it could be the start of.
+    """
+    prefix = prefix.replace('T', ' ')
+    if len(prefix) > len(_TIMESTAMP_LOW):
+        return []
+    for char, template in zip(prefix, _TIMESTAMP_LOW):
+        if char.isdigit() != template.isdigit() or (not char.isdigit() and char != template):
+            return []
+    # rounded (inwards) to the resolution of the index, searchsorted doesn't convert lossily
+    unit = labels.unit
+    low = _timestamp_bound(prefix + _TIMESTAMP_LOW[len(prefix):], labels.tz).ceil(unit).as_unit(unit)
+    high = _timestamp_bound(prefix + _TIMESTAMP_HIGH[len(prefix):], labels.tz).floor(unit).as_unit(unit)
+    start = labels.searchsorted(low, side='left')
+    stop = labels.searchsorted(high, side='right')
+    # clamping widens the range of a prefix with an invalid field ("2021-13"), check the few labels we return.
+    # labels are returned in the index's format - dates only if all of them are at midnight
+    head = _distinct_head(labels, start, stop, limit)
+    return [label for label, timestamp in zip(head.astype(str).tolist(), head) if str(timestamp).startswith(prefix)]
+
+
+# id(index) -> (weakref to index, row label index), see index._label_indexes
+_row_indexes = {}  # type: Dict[int, Tuple[weakref.ref, RowLabelIndex]]
+_lock = threading.Lock()
+
+
+def _forget(key: int) -> None:
+    with _lock:
+        _row_indexes.pop(key, None)
+
+
+def cached_row_index(index: Index) -> Optional[RowLabelIndex]:
+    entry = _row_indexes.get(id(index))
+    if entry is not None:
+        ref, row_index = entry
+        if ref() is index:
+            return row_index
+    return None
+
+
+def get_row_index(index: Index) -> RowLabelIndex:
+    """
+    Returns the cached RowLabelIndex of a pandas Index object, building it if we haven't seen this object yet.
+    """
+    row_index = cached_row_index(index)
+    if row_index is not None:
+        return row_index
+    key = id(index)
+    row_index = RowLabelIndex(index)
+    with _lock:
+        _row_indexes[key] = (weakref.ref(index, lambda _, key=key: _forget(key)), row_index)
+    return row_index
+
+
+def row_label_matches(frame, prefix: str = None, deadline: Deadline = None) -> List[str]:
+    """
+    Completes the row labels of `frame` starting with `prefix`, up to `config.max_completions` of them.
+    MultiIndex rows are completed by their first level.
+    """
+    index = getattr(frame, 'index', None)
+    if isinstance(index, MultiIndex):
+        index = index.levels[0]
+    if index is None or not _searchable(index):
+        return []
+    row_index = cached_row_index(index)
+    count('row_index.hit' if row_index is not None else 'row_index.miss')
+    if row_index is None and deadline is not None and len(index) > SYNC_BUILD_ROWS:
+        row_index = deadline.wait(background.submit(('row_index', id(index)), get_row_index, index))
+        if row_index is None:
+            return []
+    if row_index is None:
+        row_index = get_row_index(index)
+    matches = row_index.prefix(index, prefix, limit=config.max_completions)
+    if deadline is not None and len(matches) >= config.max_completions:
+        deadline.truncated = True
+    return matches
+
+
+def level_name_matches(frame, prefix: str = None) -> List[str]:
+    """
+    Completes the names of the row index levels of `frame`, ex. `df.groupby(level="`.
+    """
+    names = frame.index_names if hasattr(frame, 'index_names') else frame.index.names
+    prefix = prefix or ''
+    return [str(name) for name in names if name is not None and str(name).startswith(prefix)]
@@ -0,0 +1,106 @@
+from typing import List, Optional
+
+# on a cache miss we never look further back than this many characters from the cursor
+MAX_WINDOW = 4096
+
+_OPENING = {'(': ')', '[': ']', '{': '}'}
+_CLOSING = {')', ']', '}'}
+
+
+class ScanState(object):
+    """
+    Lexer state of a cell prefix.
+
+    Tracks just enough to find the statement the cursor is in: open brackets, open string
+    and comment state, and the offset where the current statement starts.
+    All offsets are absolute offsets into the scanned text.
+    """
+    __slots__ = ('text', 'statement_start', 'brackets', 'quote', 'escaped', 'in_comment')
+
+    def __init__(self, text: str = '', start: int = 0):
+        self.text = text[:start]
+        self.statement_start = start
+        self.brackets = []  # type: List[int]
+        self.quote = None  # type: Optional[str]
+        self.escaped = False
+        self.in_comment = False
+
+    def feed(self, text: str) -> None:
+        """
+        Advances the state over the characters of `text` that were not scanned yet.
+        `text` must start with the already scanned text.
+        """
+        offset = len(self.text)
+        brackets = self.brackets
+        for i in range(offset, len(text)):
+            char = text[i]
+            if self.in_comment:
+                if char == '\n':
+                    self.in_comment = False
+                    if not brackets:
+                        self.statement_start = i + 1
+            elif self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == self.quote:
+                    self.quote = None
+            elif char in '\'"':
+                self.quote = char
+            elif char == '#':
+                self.in_comment = True
+            elif char in _OPENING:
+                brackets.append(i)
+            elif char in _CLOSING:
+                if brackets:
+                    brackets.pop()
+            elif char in '\n;' and not brackets:
+                self.statement_start = i + 1
+        self.text = text
+
+    @property
+    def statement(self) -> str:
+        """
+        The text of the statement under the cursor
+        """
+        return self.text[self.statement_start:]
+
+
+class CellScanner(object):
+    """
+    Finds the statement under the cursor, reusing the lexer state of the previous request.
+
+    Consecutive completion requests usually extend the previous text by a few characters,
+    in that case only the newly typed characters are scanned.
+    Otherwise the text is scanned again, starting at most `MAX_WINDOW` characters back from the cursor.
+    """
+
+    def __init__(self, max_window: int = MAX_WINDOW):
+        self.max_window = max_window
+        self._state = ScanState()
+
+    def scan(self, text: str) -> ScanState:
+        state = self._state
+        if not state.text or not text.startswith(state.text):
+            state = self._state = ScanState(text, self._window_start(text))
+        state.feed(text)
+        return state
+
+    def _window_start(self, text: str) -> int:
+        start = len(text) - self.max_window
+        if start <= 0:
+            return 0
+        # start on a line boundary, this is a much better guess at the lexer state than a random char
+        newline = text.find('\n', start)
+        return newline + 1 if newline != -1 else start
+
+
+_scanner = CellScanner()
+
+
+def statement_until_cursor(text_until_cursor: str) -> str:
+    """
+    Returns the part of `text_until_cursor` that belongs to the statement being completed.
+    """
+    return _scanner.scan(text_until_cursor).statement
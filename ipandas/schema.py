@@ -0,0 +1,33 @@
+from typing import Sequence, Hashable, Optional
+
+from pandas import DataFrame, Index
+
+
+class SchemaFrame(object):
+    """
+    The schema of a frame we never materialized, ex. the result of a method chain that was inferred statically.
+
+    Column completers only look at `columns` (and `dtypes`, when known), so a SchemaFrame can stand in
+    for a DataFrame wherever no data is needed.
+    """
+    __slots__ = ('columns', 'index_names', 'frame_type', 'dtypes', '__weakref__')
+
+    def __init__(self, columns: Index, index_names: Sequence[Hashable] = (None,), frame_type: type = DataFrame,
+                 dtypes: Optional[Sequence] = None):
+        self.columns = columns
+        self.index_names = tuple(index_names)
+        self.frame_type = frame_type
+        # dtype of each column, None if unknown - dtype constraints are then not applied
+        self.dtypes = dtypes
+
+    def __repr__(self):
+        return 'SchemaFrame({} columns)'.format(len(self.columns))
+
+
+def frame_type(frame) -> type:
+    """
+    Returns the class whose methods are completed on `frame`.
+    """
+    if isinstance(frame, SchemaFrame):
+        return frame.frame_type
+    return type(frame)
@@ -0,0 +1,151 @@
+import inspect
+import threading
+import weakref
+from typing import Callable, Dict, Tuple, Optional, NamedTuple, Any
+
+import logbook
+
+from ipandas.stats import count
+
+logger = logbook.Logger('IPandasCompleter')
+
+Parameters = Tuple[str, ...]
+
+
+class SignatureEntry(NamedTuple('SignatureEntry', [('function', Any), ('code', Any), ('parameters', Parameters)])):
+    pass
+
+
+def _code_of(function) -> Any:
+    # functools.wraps sets __wrapped__, look at the innermost function to notice redefinitions
+    function = getattr(function, '__func__', function)
+    return getattr(inspect.unwrap(function), '__code__', None)
+
+
+def _signature_parameters(function, drop_self: bool = False) -> Optional[Parameters]:
+    try:
+        parameters = inspect.signature(function).parameters.values()
+    except (TypeError, ValueError):
+        logger.debug('could not get signature for {}'.format(function))
+        return None
+    # keyword only parameters can't be matched with positional arguments
+    params = tuple(parameter.name for parameter in parameters
+                   if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD))
+    if drop_self:
+        params = params[1:]
+    return params
+
+
+def _is_instance_method(cls: type, method_name: str) -> bool:
+    function = inspect.getattr_static(cls, method_name, None)
+    if isinstance(function, (staticmethod, classmethod)):
+        return False
+    bound = getattr(cls, method_name, None)
+    # python functions as well as the methods of extension types (ex. pyarrow's), but not their class methods
+    # or accessors (ex. DataFrame.plot, a descriptor returning a class)
+    return (inspect.isroutine(function) and not inspect.isclass(bound)
+            and getattr(bound, '__self__', None) is not cls)
+
+
+class SignatureRegistry(object):
+    """
+    Caches the names of the positional parameters (in order) of methods and callables,
+    so completion requests don't pay for `inspect.signature` on every keystroke.
+
+    Methods are keyed by (class, method name). For the pandas classes in `precomputed_classes`
+    all public methods are computed together the first time the class is looked up.
+    Each entry remembers the function object it was computed from and is recomputed
+    when that object (or its code) changes.
+    """
+
+    def __init__(self):
+        self._methods = {}  # type: Dict[Tuple[type, str], SignatureEntry]
+        self._callables = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+        self._precomputed = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def precomputed_classes() -> Tuple[type, ...]:
+        from pandas import DataFrame, Series
+        from pandas.core.groupby import DataFrameGroupBy, SeriesGroupBy
+        return DataFrame, Series, DataFrameGroupBy, SeriesGroupBy
+
+    def _entry_for(self, cls: type, method_name: str) -> Optional[SignatureEntry]:
+        function = inspect.getattr_static(cls, method_name, None)
+        if function is None:
+            return None
+        bound = getattr(cls, method_name, None)
+        if not callable(bound):
+            return None
+        params = _signature_parameters(bound, drop_self=_is_instance_method(cls, method_name))
+        if params is None:
+            return None
+        return SignatureEntry(function, _code_of(function), params)
+
+    def precompute(self, cls: type) -> None:
+        """
+        Computes the entries of all public methods of `cls`.
+        """
+        with self._lock:
+            if cls in self._precomputed:
+                return
+            self._precomputed.add(cls)
+
+        entries = {}
+        for method_name in dir(cls):
+            if method_name.startswith('_'):
+                continue
+            entry = self._entry_for(cls, method_name)
+            if entry is not None:
+                entries[(cls, method_name)] = entry
+        with self._lock:
+            self._methods.update(entries)
+
+    def parameters(self, cls: type, method_name: str) -> Optional[Parameters]:
+        """
+        Returns the positional parameter names of `cls.method_name` without `self`,
+        or None if it can't be introspected.
+        """
+        if cls not in self._precomputed and issubclass(cls, self.precomputed_classes()):
+            self.precompute(cls)
+
+        entry = self._methods.get((cls, method_name))
+        if entry is not None:
+            function = inspect.getattr_static(cls, method_name, None)
+            if function is entry.function and _code_of(function) is entry.code:
+                count('signatures.hit')
+                return entry.parameters
+
+        count('signatures.miss')
+        entry = self._entry_for(cls, method_name)
+        if entry is None:
+            return None
+        with self._lock:
+            self._methods[(cls, method_name)] = entry
+        return entry.parameters
+
+    def callable_parameters(self, function: Callable) -> Optional[Parameters]:
+        """
+        Returns the positional parameter names of any callable, memoized for as long as the function object is alive.
+        """
+        if inspect.ismethod(function):
+            # bound methods are created on every attribute access, cache the underlying function instead
+            params = self.callable_parameters(function.__func__)
+            return params[1:] if params is not None else None
+
+        code = _code_of(function)
+        try:
+            entry = self._callables.get(function)
+        except TypeError:
+            # not hashable or weak-referencable, nothing to cache
+            return _signature_parameters(function)
+        if entry is not None and entry.code is code:
+            return entry.parameters
+
+        params = _signature_parameters(function)
+        if params is not None:
+            self._callables[function] = SignatureEntry(None, code, params)
+        return params
+
+
+signature_registry = SignatureRegistry()
@@ -0,0 +1,211 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import nullcontext, contextmanager
+from typing import Dict, Iterator, Optional
+
+from ipandas.config import config
+
+# histogram buckets are log-scaled, 8 per doubling, starting at 1 microsecond.
+# 200 buckets cover up to ~30 minutes with a relative error of ~9%
+_BUCKETS_PER_DOUBLING = 8
+_NUM_BUCKETS = 200
+_MIN_SECONDS = 1e-6
+
+
+def _bucket_of(seconds: float) -> int:
+    if seconds <= _MIN_SECONDS:
+        return 0
+    bucket = int(math.log2(seconds / _MIN_SECONDS) * _BUCKETS_PER_DOUBLING) + 1
+    return min(bucket, _NUM_BUCKETS - 1)
+
+
+def _upper_bound_of(bucket: int) -> float:
+    return _MIN_SECONDS * 2 ** (bucket / _BUCKETS_PER_DOUBLING)
+
+
+class Histogram(object):
+    """
+    Fixed memory latency histogram, percentiles are estimated from log-scaled buckets.
+    """
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * _NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.buckets[_bucket_of(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the q-th percentile (0 < q <= 100), in seconds.
+        """
+        if not self.count:
+            return 0.0
+        rank = math.ceil(self.count * q / 100.0)
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(_upper_bound_of(bucket), self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, float]:
+        return OrderedDict([
+            ('count', self.count),
+            ('mean_ms', self.total / self.count * 1000 if self.count else 0.0),
+            ('p50_ms', self.percentile(50) * 1000),
+            ('p95_ms', self.percentile(95) * 1000),
+            ('p99_ms', self.percentile(99) * 1000),
+            ('max_ms', self.max * 1000),
+        ])
+
+
+class Trace(object):
+    """
+    Seconds spent per stage and counters of the requests completed while tracing, see `traced`.
+    """
+    __slots__ = ('stages', 'counters')
+
+    def __init__(self):
+        self.stages = OrderedDict()  # type: Dict[str, float]
+        self.counters = Counter()
+
+
+# the trace of the request being completed on this thread, if any
+_local = threading.local()
+
+
+class _Timer(object):
+    __slots__ = ('histogram', 'stage', 'trace', 'start')
+
+    def __init__(self, histogram: Optional[Histogram], stage: str, trace: Optional[Trace]):
+        self.histogram = histogram
+        self.stage = stage
+        self.trace = trace
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        seconds = time.perf_counter() - self.start
+        if self.histogram is not None:
+            self.histogram.record(seconds)
+        if self.trace is not None:
+            self.trace.stages[self.stage] = self.trace.stages.get(self.stage, 0.0) + seconds
+
+
+class Stopwatch(object):
+    """
+    Times a stage run in several pieces, between other stages, and records it as a single sample.
+    """
+    __slots__ = ('stage', 'seconds', 'start')
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.seconds += time.perf_counter() - self.start
+
+    def record(self) -> None:
+        if config.collect_stats:
+            stats.histogram(self.stage).record(self.seconds)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.stages[self.stage] = trace.stages.get(self.stage, 0.0) + self.seconds
+
+
+class Stats(object):
+    """
+    Per stage latency histograms and counters of the completion pipeline.
+    """
+
+    def __init__(self):
+        self.histograms = OrderedDict()  # type: Dict[str, Histogram]
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, Histogram())
+        return histogram
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def as_dict(self) -> dict:
+        return OrderedDict([
+            ('stages', OrderedDict((stage, histogram.as_dict()) for stage, histogram in self.histograms.items())),
+            ('counters', OrderedDict(sorted(self.counters.items()))),
+        ])
+
+    def format(self) -> str:
+        lines = ['{:<24}{:>8}{:>10}{:>10}{:>10}{:>10}'.format('stage', 'count', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms')]
+        for stage, histogram in self.histograms.items():
+            d = histogram.as_dict()
+            lines.append('{:<24}{:>8}{:>10.3f}{:>10.3f}{:>10.3f}{:>10.3f}'.format(
+                stage, d['count'], d['p50_ms'], d['p95_ms'], d['p99_ms'], d['max_ms']))
+        if self.counters:
+            lines.append('')
+            lines.append('{:<40}{:>8}'.format('counter', 'count'))
+            lines.extend('{:<40}{:>8}'.format(name, value) for name, value in sorted(self.counters.items()))
+        return '\n'.join(lines)
+
+
+stats = Stats()
+
+_null_timer = nullcontext()
+
+
+@contextmanager
+def traced() -> Iterator[Trace]:
+    """
+    Collects the timings and counters of the stages run inside, on this thread, whether or not stats are collected.
+    """
+    previous = getattr(_local, 'trace', None)
+    trace = _local.trace = Trace()
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def timed(stage: str):
+    """
+    Context manager timing a stage of the completion pipeline, a no-op when `config.collect_stats` is off
+    and nothing is traced.
+    """
+    trace = getattr(_local, 'trace', None)
+    if not config.collect_stats:
+        return _null_timer if trace is None else _Timer(None, stage, trace)
+    return _Timer(stats.histogram(stage), stage, trace)
+
+
+def count(name: str, increment: int = 1) -> None:
+    """
+    Increments a counter, a no-op when `config.collect_stats` is off and nothing is traced.
+    """
+    if config.collect_stats:
+        stats.counters[name] += increment
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.counters[name] += increment
+
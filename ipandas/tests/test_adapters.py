@@ -0,0 +1,143 @@
+import pandas as pd
+import pytest
+
+from ipandas.adapters import adapt, is_adaptable, schema_adapters
+from ipandas.deadline import Deadline
+from ipandas.dtypes import DATETIME, NUMERIC
+from ipandas.index import column_matches
+from ipandas.namespace import FrameNamespace, prebuild
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+class InterchangeColumn(object):
+    def __init__(self, kind):
+        self.dtype = (kind, 64, '', '=')
+
+    def get_buffers(self):
+        raise AssertionError('completion must not read data')
+
+
+class InterchangeFrame(object):
+    def __init__(self, columns):
+        self.columns = columns
+
+    def column_names(self):
+        return list(self.columns)
+
+    def get_column_by_name(self, name):
+        return InterchangeColumn(self.columns[name])
+
+
+class LazyFrame(object):
+    """
+    A frame we only know through the dataframe interchange protocol.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __dataframe__(self, nan_as_null=False, allow_copy=True):
+        return InterchangeFrame(self.columns)
+
+    def select(self, columns):
+        return self
+
+    def sort(self, by, descending=False):
+        return self
+
+
+def lazy_frame():
+    # DtypeKind INT, FLOAT, STRING, DATETIME
+    return LazyFrame({'count': 0, 'price': 2, 'city': 21, 'created': 22})
+
+
+def test_interchange_frames_are_adapted():
+    frame = lazy_frame()
+    assert is_adaptable(frame)
+    assert not is_adaptable(pd.DataFrame())
+    assert not is_adaptable(LazyFrame)
+
+    # the interchange object of a lazy frame may run its query
+    assert adapt(frame) is None
+    schema = adapt(frame, interchange=True)
+    assert schema.frame_type is LazyFrame
+    assert list(schema.columns) == ['count', 'price', 'city', 'created']
+    assert column_matches(schema, 'c') == ['count', 'city', 'created']
+    assert column_matches(schema, 'c', kinds=DATETIME) == ['created']
+    assert column_matches(schema, kinds=NUMERIC) == ['count', 'price']
+
+
+def test_schema_is_read_once_per_object():
+    frame = lazy_frame()
+    namespace = FrameNamespace()
+    namespace._user_ns = {'lazy': frame, 'df': pd.DataFrame(columns=['a'])}
+    namespace.refresh()
+    assert len(namespace.frames()) == 2
+    assert namespace.get('lazy') is None
+    schema = namespace.get('lazy', Deadline(1))
+    assert namespace.get('lazy') is schema is schema_adapters.get(frame)
+
+
+class QueryFrame(LazyFrame):
+    """
+    A lazy frame knowing its schema, building its interchange object runs the query.
+    """
+
+    def __init__(self, schema):
+        super().__init__({})
+        self.schema = schema
+
+    def __dataframe__(self, nan_as_null=False, allow_copy=True):
+        raise AssertionError('the query must not run')
+
+
+class IbisSchema(object):
+    def __init__(self):
+        self.names = ('city', 'created')
+        self.types = ('!string', 'timestamp')
+
+
+def test_lazy_frames_are_adapted_by_their_schema():
+    # polars
+    frame = QueryFrame({'count': 'Int64', 'price': 'Float32', 'created': "Datetime(time_unit='us')"})
+    prebuild(frame)
+    schema = schema_adapters.cached(frame)
+    assert list(schema.columns) == ['count', 'price', 'created']
+    assert column_matches(schema, kinds=DATETIME) == ['created']
+    assert schema_adapters.get(frame, Deadline(1)) is schema
+
+    # ibis, Table.schema() is a method
+    frame = QueryFrame(IbisSchema)
+    schema = schema_adapters.get(frame, Deadline(1))
+    assert list(schema.columns) == ['city', 'created']
+    assert column_matches(schema, 'c', kinds=DATETIME) == ['created']
+
+
+def test_interchange_frames_are_not_read_by_the_prebuild():
+    frame = lazy_frame()
+    prebuild(frame)
+    assert schema_adapters.cached(frame) is None
+
+
+def test_completes_interchange_frames(ipython_with_ipandas_ext):
+    ip = ipython_with_ipandas_ext
+    ip.user_ns['lazy'] = lazy_frame()
+    c = ip.Completer
+    text, matches = c.complete('lazy[["ci')
+    assert matches == ['city']
+
+    text, matches = c.complete('lazy.sort(by="c')
+    assert set(matches) == {'count', 'city', 'created'}
+
+    text, matches = c.complete('lazy.select(["pr')
+    assert matches == ['price']
+    del ip.user_ns['lazy']
+
+
+def test_arrow_tables_are_adapted():
+    pyarrow = pytest.importorskip('pyarrow')
+    table = pyarrow.table({'city': ['London'], 'created': pyarrow.array([0], pyarrow.timestamp('s'))})
+    schema = schema_adapters.get(table)
+    assert list(schema.columns) == ['city', 'created']
+    assert column_matches(schema, 'c', kinds=DATETIME) == ['created']
@@ -0,0 +1,242 @@
+"""
+Completion latency benchmarks.
+
+These are skipped by default, run them with
+
+    IPANDAS_BENCHMARK=1 python -m pytest ipandas/tests/test_benchmarks.py
+
+Every case is compared against benchmark_baseline.json and fails when its median latency is more than
+IPANDAS_BENCHMARK_THRESHOLD (default 1.5) times the baseline, plus a small absolute slack for sub-millisecond cases
+and the run to run noise of the case.
+Set IPANDAS_BENCHMARK_SAVE=1 to record the results instead. The baseline of a case is the median of its last
+BASELINE_RUNS recorded runs, their spread is its noise - record it several times on a quiet machine.
+"""
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import textwrap
+import time
+import tracemalloc
+
+import logbook
+import numpy as np
+import pandas as pd
+from IPython.core.completer import IPCompleter
+
+from ipandas import background
+from ipandas.config import config, FUZZY
+from ipandas.memo import completion_memo
+from ipandas import utils
+from ipandas.utils import extract_keyword_args_from_arguments_string
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+THRESHOLD = float(os.environ.get('IPANDAS_BENCHMARK_THRESHOLD', '1.5'))
+# absolute slack, timings below a millisecond are mostly noise
+SLACK_MS = 0.5
+REPEAT = 20
+# recorded runs kept per case, and how many standard deviations of them a result may exceed the baseline by
+BASELINE_RUNS = 5
+NOISE_SIGMAS = 3
+
+pytestmark = pytest.mark.skipif(not os.environ.get('IPANDAS_BENCHMARK'),
+                                reason='set IPANDAS_BENCHMARK=1 to run the benchmarks')
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    results = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            stored = json.load(f)
+    else:
+        stored = {}
+    yield stored, results
+    if os.environ.get('IPANDAS_BENCHMARK_SAVE'):
+        for case, result in results.items():
+            runs = (stored.get(case, {}).get('runs_ms', []) + [result['median_ms']])[-BASELINE_RUNS:]
+            stored[case] = dict(result, median_ms=round(statistics.median(runs), 3), runs_ms=runs)
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def quiet_logging():
+    # the DEBUG handler of conftest formats and prints every record, it would dominate the timings
+    handler = logbook.NullHandler(filter=lambda record, _: record.level <= logbook.DEBUG)
+    handler.push_application()
+    yield
+    handler.pop_application()
+
+
+@pytest.fixture
+def completer_with_frames(ipython_with_ipandas_ext: InteractiveShell):
+    """
+    Returns a function that puts frames into the user namespace and returns the completer,
+    waiting for the background prebuild of their indexes.
+    """
+    ip = ipython_with_ipandas_ext
+
+    # the first completion request imports the completer and starts tracking the namespace
+    ip.Completer.complete('x')
+
+    def _completer(**frames) -> IPCompleter:
+        ip.user_ns.update(frames)
+        ip.events.trigger('post_execute')
+        for frame in frames.values():
+            background.submit(('prebuild', id(frame)), lambda: None).result()
+        return ip.Completer
+
+    yield _completer
+    ip.run_line_magic('reset', '-f')
+
+
+def wide_frame(n_columns: int) -> pd.DataFrame:
+    columns = ['sensor_{:07d}_temp_c'.format(i) for i in range(n_columns)]
+    return pd.DataFrame(np.zeros((1, n_columns)), columns=columns)
+
+
+def measure(case: str, baseline, function, *args, **kwargs) -> None:
+    # repeating a request would narrow the memo of the previous one, every run goes through the whole pipeline
+    completion_memo.clear()
+    # first call warms caches, like the first keystroke after a cell ran
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    first_ms = (time.perf_counter() - start) * 1000
+
+    timings = []
+    # like timeit, garbage collections left over from other cases would land in random runs
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(REPEAT):
+            completion_memo.clear()
+            start = time.perf_counter()
+            function(*args, **kwargs)
+            timings.append((time.perf_counter() - start) * 1000)
+    finally:
+        gc.enable()
+
+    completion_memo.clear()
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    result = {'first_ms': round(first_ms, 3),
+              'median_ms': round(statistics.median(timings), 3),
+              'peak_kb': round(peak / 1024, 1)}
+    compare(case, baseline, result)
+
+
+def compare(case: str, baseline, result: dict) -> None:
+    stored, results = baseline
+    results[case] = result
+    print('{}: {}'.format(case, result))
+
+    if os.environ.get('IPANDAS_BENCHMARK_SAVE') or case not in stored:
+        return
+    runs = stored[case].get('runs_ms', [])
+    noise_ms = statistics.pstdev(runs) if len(runs) > 1 else 0.0
+    allowed = stored[case]['median_ms'] * THRESHOLD + SLACK_MS + NOISE_SIGMAS * noise_ms
+    assert result['median_ms'] <= allowed, '{} regressed: {:.3f}ms, baseline {:.3f}ms (noise {:.3f}ms)'.format(
+        case, result['median_ms'], stored[case]['median_ms'], noise_ms)
+
+
+@pytest.mark.parametrize('n_columns', [10, 1000, 100000, 1000000])
+def test_wide_frame_completion(completer_with_frames, baseline, n_columns):
+    c = completer_with_frames(df=wide_frame(n_columns))
+    measure('slice_{}_columns'.format(n_columns), baseline, c.complete, 'df[["sensor_00001')
+    measure('keyword_{}_columns'.format(n_columns), baseline, c.complete, 'df.groupby(by="sensor_00001')
+
+
+@pytest.mark.parametrize('n_lines', [10, 1000])
+def test_long_cell_completion(completer_with_frames, baseline, n_lines):
+    c = completer_with_frames(df=wide_frame(100))
+    cell = '\n'.join('x_{0} = df["sensor_{0:07d}_temp_c"].sum()'.format(i % 100) for i in range(n_lines))
+    multiline = cell + '\ndf = df.groupby(by=["sensor_0000001_temp_c",\n                 "sensor_000002'
+    measure('long_cell_{}_lines'.format(n_lines), baseline, c.complete, line_buffer=multiline,
+            cursor_pos=len(multiline))
+
+
+@pytest.mark.parametrize('n_items', [10, 1000, 10000, 40000])
+def test_nested_list_argument(baseline, n_items):
+    arguments = 'by=[' + ', '.join('["a_{0}", "b_{0}", ["c_{0}"]]'.format(i) for i in range(n_items)) + ', ["d'
+
+    def parse_pasted_list():
+        # the first request after the list was pasted, nothing to resume from
+        utils._checkpoint = None
+        extract_keyword_args_from_arguments_string(arguments)
+
+    measure('nested_list_{}_items'.format(n_items), baseline, parse_pasted_list)
+    typed = iter(range(REPEAT * 4))
+    measure('nested_list_keystroke_{}_items'.format(n_items), baseline,
+            lambda: extract_keyword_args_from_arguments_string(arguments + 'e' * next(typed)))
+
+
+@pytest.mark.parametrize('n_frames', [10, 1000])
+def test_many_frames_in_namespace(completer_with_frames, baseline, n_frames):
+    frames = {'df_{}'.format(i): wide_frame(10) for i in range(n_frames)}
+    c = completer_with_frames(**frames)
+    measure('namespace_{}_frames'.format(n_frames), baseline, c.complete, 'df_0[["sensor_0')
+
+
+@pytest.mark.parametrize('n_columns', [1000, 100000])
+def test_fuzzy_column_completion(completer_with_frames, baseline, monkeypatch, n_columns):
+    monkeypatch.setattr(config, 'completion_mode', FUZZY)
+    c = completer_with_frames(df=wide_frame(n_columns))
+    measure('fuzzy_{}_columns'.format(n_columns), baseline, c.complete, 'df[["421temp')
+
+
+@pytest.mark.parametrize('n_columns', [1000, 100000])
+def test_merge_keys_completion(completer_with_frames, baseline, n_columns):
+    c = completer_with_frames(left=wide_frame(n_columns), right=wide_frame(n_columns).iloc[:, ::2])
+    measure('merge_on_{}_columns'.format(n_columns), baseline, c.complete, 'pd.merge(left, right, on="sensor_00001')
+
+
+@pytest.mark.parametrize('n_columns', [1000, 1000000])
+def test_consecutive_keystrokes(completer_with_frames, baseline, n_columns):
+    c = completer_with_frames(df=wide_frame(n_columns))
+    timings = []
+    for _ in range(REPEAT):
+        completion_memo.clear()
+        c.complete('df[["sensor_0000')
+        start = time.perf_counter()
+        c.complete('df[["sensor_00001')
+        timings.append((time.perf_counter() - start) * 1000)
+    compare('keystroke_{}_columns'.format(n_columns), baseline, {'median_ms': round(statistics.median(timings), 3)})
+
+
+IMPORT_AND_LOAD = textwrap.dedent('''
+    import time
+    from IPython.testing.globalipapp import start_ipython
+    ip = start_ipython()
+    start = time.perf_counter()
+    import ipandas
+    imported = time.perf_counter()
+    ipandas.load_ipython_extension(ip)
+    loaded = time.perf_counter()
+    ip.Completer.complete('x')
+    completed = time.perf_counter()
+    print((imported - start) * 1000, (loaded - imported) * 1000, (completed - loaded) * 1000)
+''')
+
+
+def test_import_and_load_time(baseline):
+    runs = []
+    for _ in range(5):
+        output = subprocess.run([sys.executable, '-c', IMPORT_AND_LOAD], stdout=subprocess.PIPE, check=True,
+                                universal_newlines=True).stdout
+        runs.append([float(ms) for ms in output.split()[-3:]])
+    import_ms, load_ms, first_completion_ms = (statistics.median(stage) for stage in zip(*runs))
+    print('import_ms: {:.3f}, load_ext_ms: {:.3f}, first_completion_ms: {:.3f}'.format(
+        import_ms, load_ms, first_completion_ms))
+    # the first completion pays for the deferred imports, that's reported but not compared
+    compare('import_and_load_ext', baseline, {'median_ms': round(import_ms + load_ms, 3),
+                                               'first_completion_ms': round(first_completion_ms, 3)})
@@ -0,0 +1,117 @@
+import pandas as pd
+
+from ipandas.chains import chain_span, ChainCache, resolve_chain, CHAIN_ALIAS
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+@pytest.fixture
+def frames():
+    people = pd.DataFrame(columns=['Name', 'FavoriteFood', 'City'])
+    cities = pd.DataFrame(columns=['City', 'Country', 'Name'])
+    return {'people': people, 'cities': cities}
+
+
+def infer(source, frames):
+    schema = ChainCache().infer(source, frames.get)
+    return None if schema is None else list(schema.columns)
+
+
+def test_chain_span():
+    text = 'x = df.rename(columns={"a": "b"}).groupby(by=["b", "'
+    start, end = chain_span(text)
+    assert text[start:end] == 'df.rename(columns={"a": "b"})'
+
+    text = '(df[["a", "b"]]\n   .sort_values("a")\n   .groupby("'
+    start, end = chain_span(text)
+    assert text[start:end] == 'df[["a", "b"]]\n   .sort_values("a")\n   '
+
+    text = 'f(df[df.a > 1][["'
+    start, end = chain_span(text)
+    assert text[start:end] == 'df[df.a > 1]'
+
+    # brackets inside strings don't count
+    text = 'df.query("a == \')\'").groupby("'
+    assert text[slice(*chain_span(text))] == 'df.query("a == \')\'")'
+
+    assert chain_span('df.groupby(by=["a", "') == (0, 2)
+    assert chain_span('x = 1') is None
+    assert chain_span('f("') is None
+
+
+def test_infers_column_changes(frames):
+    assert infer('people[["Name", "City"]]', frames) == ['Name', 'City']
+    assert infer('people.rename(columns={"Name": "FirstName"})', frames) == ['FirstName', 'FavoriteFood', 'City']
+    assert infer('people.rename(str.lower, axis=1)', frames) == ['name', 'favoritefood', 'city']
+    assert infer('people.drop(columns="City").assign(Age=lambda x: 1)', frames) == ['Name', 'FavoriteFood', 'Age']
+    assert infer('people.drop(["City"], axis=1).head(10)', frames) == ['Name', 'FavoriteFood']
+    assert infer('people.set_index("Name")', frames) == ['FavoriteFood', 'City']
+    assert infer('people.set_index("Name").reset_index()', frames) == ['Name', 'FavoriteFood', 'City']
+    assert infer('people.reset_index()', frames) == ['index', 'Name', 'FavoriteFood', 'City']
+    assert infer('people.loc[people.City == "London", ["Name"]]', frames) == ['Name']
+    assert infer('people[people.City == "London"].iloc[:, [0, 2]]', frames) == ['Name', 'City']
+
+
+def test_infers_merge(frames):
+    assert infer('people.merge(cities, on="City")', frames) == \
+        ['Name_x', 'FavoriteFood', 'City', 'Country', 'Name_y']
+    assert infer('pd.merge(people, cities.drop(columns="Name"))', frames) == \
+        ['Name', 'FavoriteFood', 'City', 'Country']
+
+
+def test_unknown_chains(frames):
+    assert infer('people["Name"]', frames) is None
+    assert infer('people.pipe(f)', frames) is None
+    assert infer('people.rename(columns=mapping)', frames) is None
+    assert infer('missing[["Name"]]', frames) is None
+
+
+def test_cached_until_frame_changes(frames):
+    cache = ChainCache()
+    first = cache.infer('people[["Name"]].sort_values("Name")', frames.get)
+    assert cache.infer('people[["Name"]].sort_values("Name")', frames.get) is first
+
+    frames['people'] = frames['people'].rename(columns={'Name': 'FirstName'})
+    assert list(cache.infer('people.drop(columns="City")', frames.get).columns) == ['FirstName', 'FavoriteFood']
+    assert cache.infer('people[["Name"]].sort_values("Name")', frames.get) is not first
+
+    text, schema = resolve_chain('people.drop(columns="City").groupby(by="', frames.get)
+    assert text == CHAIN_ALIAS + '.groupby(by="'
+    assert resolve_chain('people.groupby(by="', frames.get) is None
+
+
+def test_completes_chains(completer_with_dataframe):
+    c = completer_with_dataframe
+    text, matches = c.complete('df[["Name"]].groupby(by="')
+    assert matches == ['Name']
+
+    text, matches = c.complete('df.rename(columns={"Name": "FirstName"}).groupby(by="F')
+    assert set(matches) == {'FirstName', 'FavoriteFood'}
+
+    text, matches = c.complete('df.assign(Nickname="x")[["N')
+    assert matches == ['Name', 'Nickname']
+
+
+def test_infers_concat(frames):
+    assert infer('pd.concat([people, cities])', frames) == ['Name', 'FavoriteFood', 'City', 'Country']
+    assert infer('pd.concat([people, cities], join="inner")', frames) == ['Name', 'City']
+    assert infer('pd.concat([people[["Name"]], cities[["Country"]]], axis=1)', frames) == ['Name', 'Country']
+
+
+def test_completes_merge_keys(completer_with_dataframe):
+    c = completer_with_dataframe
+    c.shell.ex('cities = pd.DataFrame(columns=["City", "Country", "Name"])')
+    text, matches = c.complete('pd.merge(df, cities, on="')
+    assert matches == ['Name']
+
+    text, matches = c.complete('df.merge(cities, how="left", left_on="Name", right_on="C')
+    assert matches == ['City', 'Country']
+
+    text, matches = c.complete('df.merge(right=cities, left_on="F')
+    assert matches == ['FavoriteFood']
+
+    text, matches = c.complete('df[["Name"]].merge(cities, on=["')
+    assert matches == ['Name']
+
+    text, matches = c.complete('pd.concat([df, cities], join="inner").groupby(by="')
+    assert matches == ['Name']
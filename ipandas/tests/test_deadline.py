@@ -0,0 +1,19 @@
+import pandas as pd
+
+from ipandas import index, background
+from ipandas.deadline import Deadline
+from ipandas.index import column_matches
+
+
+def test_returns_partial_results_when_index_is_not_ready(monkeypatch):
+    monkeypatch.setattr(index, 'SYNC_BUILD_COLUMNS', 1)
+    df = pd.DataFrame(columns=['a_{}'.format(i) for i in range(10)])
+
+    deadline = Deadline(0)
+    assert column_matches(df, 'a_1', deadline=deadline) == []
+    assert deadline.partial
+
+    background.submit(('column_index', id(df.columns)), lambda: None).result()
+    deadline = Deadline(1)
+    assert column_matches(df, 'a_1', deadline=deadline) == ['a_1']
+    assert not deadline.partial
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+from ipandas.config import config, FUZZY, PREFIX
+from ipandas.dtypes import blocks_of, dtypes_version, kind_codes, NUMERIC, DATETIME, STRING, OBJECT, BOOLEAN, CATEGORICAL, TIMEDELTA
+from ipandas.index import column_matches, get_column_index
+from ipandas.recorder import _dtype_runs
+from ipandas.schema import SchemaFrame
+
+
+def make_frame():
+    return pd.DataFrame({
+        'count': [1, 2],
+        'price': [1.5, 2.5],
+        'flag': [True, False],
+        'created': pd.to_datetime(['2020-01-01', '2020-01-02']),
+        'elapsed': pd.to_timedelta([1, 2], unit='s'),
+        'category': pd.Categorical(['a', 'b']),
+        'comment': pd.Series(['x', 'y'], dtype=object),
+        'code': pd.Series(['x', 'y'], dtype='string'),
+    })
+
+
+def test_kind_codes():
+    df = make_frame()
+    assert kind_codes(df).tolist() == [NUMERIC, NUMERIC, BOOLEAN, DATETIME, TIMEDELTA, CATEGORICAL, OBJECT, STRING]
+    schema = SchemaFrame(df.columns, dtypes=df.dtypes)
+    assert kind_codes(schema).tolist() == kind_codes(df).tolist()
+    assert kind_codes(SchemaFrame(df.columns)) is None
+
+
+class FutureFrame(object):
+    """
+    A DataFrame whose block manager isn't what we expect, as a future pandas might have it.
+    """
+
+    def __init__(self, df):
+        self._mgr = object()
+        self.columns = df.columns
+        self.dtypes = df.dtypes
+
+
+def test_frames_without_the_expected_block_manager():
+    df = make_frame()
+    frame = FutureFrame(df)
+    assert blocks_of(df) is not None and blocks_of(frame) is None
+    assert kind_codes(frame).tolist() == kind_codes(df).tolist()
+    assert _dtype_runs(frame) == _dtype_runs(df)
+    assert dtypes_version(frame) is not None
+
+
+def test_column_matches_filters_by_kind():
+    df = make_frame()
+    assert column_matches(df, kinds=NUMERIC) == ['count', 'price']
+    assert column_matches(df, 'c', kinds=DATETIME) == ['created']
+    assert column_matches(df, 'c', kinds=STRING | OBJECT) == ['comment', 'code']
+    assert column_matches(df, 'c') == ['count', 'created', 'category', 'comment', 'code']
+    # unknown dtypes are not filtered
+    assert column_matches(SchemaFrame(df.columns), 'c', kinds=DATETIME) == column_matches(df, 'c')
+
+
+def test_kind_codes_follow_dtype_changes():
+    df = make_frame()
+    assert column_matches(df, 'c', kinds=DATETIME) == ['created']
+    codes = get_column_index(df)._kinds[1]
+    assert column_matches(df, 'c', kinds=DATETIME) == ['created']
+    assert get_column_index(df)._kinds[1] is codes
+
+    df['count'] = pd.to_datetime(df['count'])
+    assert column_matches(df, 'c', kinds=DATETIME) == ['count', 'created']
+
+
+def test_fuzzy_and_multi_index_filters(monkeypatch):
+    monkeypatch.setattr(config, 'completion_mode', FUZZY)
+    df = make_frame()
+    assert column_matches(df, 'ce', kinds=NUMERIC) == ['price']
+
+    columns = pd.MultiIndex.from_tuples([('a', 'x'), ('a', 'y'), ('b', 'x')])
+    multi = pd.DataFrame(np.zeros((1, 3)), columns=columns).astype({('a', 'y'): 'datetime64[ns]'})
+    assert column_matches(multi, kinds=DATETIME) == ['a']
+    monkeypatch.setattr(config, 'completion_mode', PREFIX)
+    assert column_matches(multi, kinds=NUMERIC) == ['a', 'b']
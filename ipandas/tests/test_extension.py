@@ -0,0 +1,57 @@
+import subprocess
+import sys
+import textwrap
+
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+LOAD_EXTENSION = textwrap.dedent('''
+    import sys
+    from IPython.testing.globalipapp import start_ipython
+    ip = start_ipython()
+    ip.run_line_magic('load_ext', 'ipandas')
+    print(' '.join(sorted(name for name in ('pandas', 'ipandas.ipandas', 'ipandas.namespace') if name in sys.modules)))
+    ip.Completer.complete('x.groupby(by="')
+    print(' '.join(sorted(name for name in ('pandas', 'ipandas.ipandas', 'ipandas.namespace') if name in sys.modules)))
+''')
+
+
+def test_loading_the_extension_imports_nothing_heavy():
+    output = subprocess.run([sys.executable, '-c', LOAD_EXTENSION], stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout.splitlines()
+    assert output == ['', 'ipandas.ipandas ipandas.namespace pandas']
+
+PREBUILD_BEFORE_COMPLETION = textwrap.dedent('''
+    import sys
+    from IPython.testing.globalipapp import start_ipython
+    ip = start_ipython()
+    ip.run_line_magic('load_ext', 'ipandas')
+    ip.run_cell('x = 1')
+    print('ipandas.namespace' in sys.modules)
+    ip.run_cell('import pandas as pd; df = pd.DataFrame({"a": [1]})')
+    from ipandas import background
+    from ipandas.index import cached_label_index
+    background.wait()
+    print(cached_label_index(ip.user_ns['df'].columns) is not None)
+''')
+
+
+def test_frames_are_prebuilt_once_pandas_is_imported():
+    output = subprocess.run([sys.executable, '-c', PREBUILD_BEFORE_COMPLETION], stdout=subprocess.PIPE, check=True,
+                            universal_newlines=True).stdout.splitlines()
+    assert output[-2:] == ['False', 'True']
+
+
+def test_namespace_is_tracked_after_first_completion(ipython_with_ipandas_ext, capsys):
+    ip = ipython_with_ipandas_ext
+    assert capsys.readouterr().out == ''
+    ip.Completer.complete('x')
+    assert any(getattr(callback, '__self__', None) is not None and callback.__name__ == 'on_post_execute'
+               for callback in ip.events.callbacks['post_execute'])
+
+
+def test_config_is_exported():
+    import ipandas
+    from ipandas.config import config
+    assert ipandas.config is config
+    assert ipandas.config.latency_budget == config.latency_budget
@@ -0,0 +1,69 @@
+import gzip
+
+import pandas as pd
+import pytest
+
+from ipandas.files import SchemaCache, read_csv_header
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = str(tmp_path / 'people.csv')
+    pd.DataFrame({'Name': ['Omer'], 'Nickname': ['O'], 'FavoriteFood': ['Sushi']}).to_csv(path, index=False)
+    return path
+
+
+def test_csv_header(tmp_path, csv_path):
+    assert read_csv_header(csv_path) == ['Name', 'Nickname', 'FavoriteFood']
+
+    compressed = str(tmp_path / 'people.tsv.gz')
+    with gzip.open(compressed, 'wt') as f:
+        f.write('\ufeffcity\t"zip code"\nLondon\t1\n')
+    assert read_csv_header(compressed, sep='\t') == ['city', 'zip code']
+
+
+def test_schema_cache_invalidated_when_file_changes(csv_path):
+    cache = SchemaCache()
+    assert cache.get(csv_path, 'read_csv').prefix('N') == ['Name', 'Nickname']
+    assert len(cache) == 1
+    assert cache.get(csv_path, 'read_csv').prefix('N') == ['Name', 'Nickname']
+    assert len(cache) == 1
+
+    with open(csv_path, 'w') as f:
+        f.write('Number,Other\n1,2\n')
+    assert cache.get(csv_path, 'read_csv').prefix('N') == ['Number']
+    assert cache.get(csv_path + '.missing', 'read_csv') is None
+
+
+def test_complete_csv_columns(completer_with_dataframe, csv_path):
+    c = completer_with_dataframe
+    _, matches = c.complete('pd.read_csv("{}", usecols=["Name", "N'.format(csv_path))
+    assert matches == ['Name', 'Nickname']
+
+    c.shell.user_ns['people_path'] = csv_path
+    _, matches = c.complete("pd.read_csv(people_path, sep=',', usecols=['F")
+    assert matches == ['FavoriteFood']
+
+
+def test_complete_parquet_columns(completer_with_dataframe, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'people.parquet')
+    pd.DataFrame({'Name': ['Omer'], 'Nickname': ['O'], 'Age': [30]}).to_parquet(path)
+    _, matches = completer_with_dataframe.complete('pd.read_parquet("{}", columns=["N'.format(path))
+    assert matches == ['Name', 'Nickname']
+
+
+def test_parquet_index_columns_are_not_completed(completer_with_dataframe, tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'people.parquet')
+    people = pd.DataFrame({'Name': ['Omer'], 'Nickname': ['O'], 'Age': [30]}, index=[7])
+    people.to_parquet(path)
+    _, matches = completer_with_dataframe.complete('pd.read_parquet("{}", columns=["'.format(path))
+    assert sorted(matches) == ['Age', 'Name', 'Nickname']
+
+    path = str(tmp_path / 'nicknames.parquet')
+    people.set_index('Nickname').to_parquet(path)
+    _, matches = completer_with_dataframe.complete('pd.read_parquet("{}", columns=["N'.format(path))
+    assert matches == ['Name']
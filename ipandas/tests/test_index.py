@@ -0,0 +1,69 @@
+import pandas as pd
+
+from ipandas.config import config, FUZZY
+from ipandas.index import ColumnIndex, MultiColumnIndex, get_column_index, get_label_index, shared_column_matches
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+def test_prefix_query_keeps_frame_order():
+    index = ColumnIndex(pd.Index(['b_2', 'a', 'b_1', 'ab', 'c']))
+    assert index.prefix('b') == ['b_2', 'b_1']
+    assert index.prefix('a') == ['a', 'ab']
+    assert index.prefix('x') == []
+    assert index.prefix(None) == ['b_2', 'a', 'b_1', 'ab', 'c']
+
+
+def test_index_is_reused_while_columns_are_unchanged():
+    df = pd.DataFrame(columns=['Name', 'FavoriteFood'])
+    index = get_column_index(df)
+    assert get_column_index(df) is index
+
+    df['Age'] = None
+    new_index = get_column_index(df)
+    assert new_index is not index
+    assert new_index.prefix('A') == ['Age']
+
+
+def test_fuzzy_query_ranks_matches():
+    index = ColumnIndex(pd.Index(['sensor_0421_temp_c', 'sensor_0421_hum', 'temp', 'TEMPERATURE', 'x_t_e_m_p']))
+    assert index.fuzzy('421temp') == ['sensor_0421_temp_c']
+    # prefix, then substring, then subsequence matches. shorter labels first
+    assert index.fuzzy('temp') == ['temp', 'TEMPERATURE', 'sensor_0421_temp_c', 'x_t_e_m_p']
+    assert index.fuzzy('temp', limit=2) == ['temp', 'TEMPERATURE']
+    assert index.fuzzy('xyz') == []
+
+
+def test_fuzzy_completion_mode(completer_with_dataframe, monkeypatch):
+    monkeypatch.setattr(config, 'completion_mode', FUZZY)
+    text, matches = completer_with_dataframe.complete('df[["food')
+    assert matches == ['FavoriteFood']
+
+
+def test_non_string_labels_are_completed_by_their_string_form():
+    index = ColumnIndex(pd.Index([1, 12, 2]))
+    assert index.prefix('1') == ['1', '12']
+    assert index.position_of('2') == 2
+
+
+def test_multi_index_is_completed_level_by_level():
+    columns = pd.MultiIndex.from_product([['metric', 'meta'], ['mean', 'max'], [2019, 2020]])
+    index = get_label_index(columns[columns.get_level_values(0) == 'metric'])
+    assert isinstance(index, MultiColumnIndex)
+    # unused levels are not completed
+    assert index.prefix('me') == ['metric']
+    assert index.complete_level(['metric'], 'm') == ['max', 'mean']
+    assert index.complete_level(['metric', 'max'], '') == ['2019', '2020']
+    assert index.complete_level(['meta'], '') == []
+    assert index.complete_level(['metric', 'max', '2019'], '') == []
+
+
+def test_shared_columns():
+    left = pd.DataFrame(columns=['Name', 'City', 'Age', 1])
+    right = pd.DataFrame(columns=['Country', 'City', 'Name', '1'])
+    third = pd.DataFrame(columns=['Name'])
+    assert shared_column_matches([left, right]) == ['Name', 'City', '1']
+    assert shared_column_matches([left, right], 'N') == ['Name']
+    assert shared_column_matches([left, right, third]) == ['Name']
+    assert shared_column_matches([left, pd.DataFrame()]) == []
+    assert shared_column_matches([left]) == ['Name', 'City', 'Age', '1']
@@ -25,3 +25,97 @@ def test_completes_simple_slicing(completer_with_dataframe):
     # this should not complete anything
     text, matches = c.complete('df[["test"]].')
     assert not matches
+
+
+def test_completes_last_statement_of_cell(completer_with_dataframe):
+    c = completer_with_dataframe
+    text, matches = c.complete(line_buffer='x = df[["Name"]]\ndf.groupby(by="F', cursor_pos=34)
+    assert set(matches) == {'FavoriteFood'}
+
+
+def test_completes_values(completer_with_dataframe):
+    c = completer_with_dataframe
+    text, matches = c.complete('df[df.Name == "O')
+    assert set(matches) == {'Omer', 'Ohad', 'Ofir'}
+
+    text, matches = c.complete('df[df["FavoriteFood"].isin(["Sushi", "P')
+    assert set(matches) == {'Pizza'}
+
+    text, matches = c.complete('df.query("FavoriteFood != \'H')
+    assert set(matches) == {'Hamburger'}
+
+
+def test_replaces_the_whole_typed_value(completer_with_dataframe):
+    from IPython.core.completer import provisionalcompleter
+    c = completer_with_dataframe
+    get_ipython().run_cell("cities = pd.DataFrame({'city': ['New York', 'New Delhi', 'Paris']})")
+    text = 'cities[cities.city == "New Y'
+    with provisionalcompleter():
+        completions = [completion for completion in c.completions(text, len(text)) if completion.text == 'New York']
+    assert len(completions) == 1
+    assert text[:completions[0].start] + completions[0].text == 'cities[cities.city == "New York'
+
+
+def test_completes_multi_index_levels(completer_with_dataframe):
+    c = completer_with_dataframe
+    c.shell.ex('pivot = pd.DataFrame(columns=pd.MultiIndex.from_product([["size"], ["Pizza", "Sushi"]]))')
+    text, matches = c.complete('pivot[("size", "P')
+    assert matches == ['Pizza']
+
+    text, matches = c.complete('pivot.loc[:, [("size", "Sushi"), ("s')
+    assert matches == ['size']
+
+
+def test_completes_non_string_keyword_values(completer_with_dataframe):
+    c = completer_with_dataframe
+    c.shell.ex('numbered = pd.DataFrame(columns=[1, 10, 2, True])')
+    text, matches = c.complete('numbered.groupby(by=1')
+    assert set(matches) == {'1', '10'}
+
+    text, matches = c.complete('numbered.groupby(by=True')
+    assert matches == ['True']
+
+    text, matches = c.complete('numbered[[1')
+    assert set(matches) == {'1', '10'}
+    # nothing typed after the separator
+    text, matches = c.complete('numbered[[1, ')
+    assert set(matches) == {'1', '10', '2', 'True'}
+
+
+def test_completes_columns_of_the_required_dtype(completer_with_dataframe):
+    c = completer_with_dataframe
+    # through the cell execution hooks, which refresh the tracked frames
+    get_ipython().run_cell("df['Born'] = pd.to_datetime(['1990-01-01', '1991-01-01', '1992-01-01'])")
+    text, matches = c.complete('df.resample("1D", on="')
+    assert matches == ['Born']
+
+    text, matches = c.complete('df.groupby(by="')
+    assert set(matches) == {'Name', 'FavoriteFood', 'Born'}
+
+
+def test_completes_row_labels(completer_with_dataframe):
+    c = completer_with_dataframe
+    get_ipython().run_cell("people = df.set_index('Name')")
+    text, matches = c.complete('people.loc["Of')
+    assert matches == ['Ofir']
+
+    text, matches = c.complete('people.loc[["Ofir", "Oh')
+    assert matches == ['Ohad']
+
+    text, matches = c.complete('people.xs("Om')
+    assert matches == ['Omer']
+
+    text, matches = c.complete('people.groupby(level="')
+    assert matches == ['Name']
+
+
+def test_completes_positional_arguments_of_callables_set_on_the_frame(completer_with_dataframe, monkeypatch):
+    from ipandas import ipandas as completer
+    from ipandas.keywords import KeywordTable
+    c = completer_with_dataframe
+    table = KeywordTable(default_completer=completer.complete_columns, overrides={'column': completer.complete_columns})
+    monkeypatch.setattr(completer, 'keyword_table', table)
+    # not a DataFrame method, its parameters are introspected from the function object
+    object.__setattr__(c.shell.user_ns['df'], 'top', lambda column, n=5: None)
+    text, matches = c.complete('df.top("F')
+    assert matches == ['FavoriteFood']
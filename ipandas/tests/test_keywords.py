@@ -0,0 +1,77 @@
+from ipandas.keywords import KeywordTable
+from ipandas.dtypes import DATETIME, NUMERIC
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+def complete_nothing(**kwargs):
+    return []
+
+
+def test_table_is_derived_from_the_dataframe_api():
+    table = KeywordTable(default_completer=complete_nothing, overrides={})
+    assert table.entry('sort_values', 'by') is not None
+    assert table.entry('merge', 'left_on') is not None
+    assert table.entry('pivot_table', 'index') is not None
+    assert table.entry('drop', 'columns') is not None
+    assert table.entry('dropna', 'subset') is not None
+    assert table.entry('set_index', 'keys') is not None
+
+    assert table.entry('reindex', 'index') is None
+    assert table.entry('rename', 'columns') is None
+    assert table.entry('insert', 'column') is None
+    assert table.entry('to_csv', 'index') is None
+
+
+def test_overrides():
+    def complete_by(**kwargs):
+        return ['by']
+
+    def complete_groupby(**kwargs):
+        return ['groupby']
+
+    table = KeywordTable(default_completer=complete_nothing, overrides={'by': {'*': complete_by}})
+    assert table.completer('sort_values', 'by') is complete_by
+    assert table.completer('user_defined_method', 'by') is complete_by
+
+    table.register('by', complete_groupby, 'groupby')
+    assert table.completer('groupby', 'by') is complete_groupby
+    assert table.completer('sort_values', 'by') is complete_by
+
+
+def test_completes_derived_keywords(completer_with_dataframe):
+    c = completer_with_dataframe
+    text, matches = c.complete('df.sort_values(by=["Name", "F')
+    assert matches == ['FavoriteFood']
+
+    text, matches = c.complete('df.pivot_table(values="Name", index="F')
+    assert matches == ['FavoriteFood']
+
+    text, matches = c.complete('df.set_index("N')
+    assert matches == ['Name']
+
+    text, matches = c.complete('df.to_csv("out.csv", index="')
+    assert not matches
+
+
+def test_dtype_constraints():
+    table = KeywordTable(default_completer=complete_nothing, overrides={})
+    assert table.entry('resample', 'on').kinds == DATETIME
+    assert table.entry('pivot_table', 'values').kinds & NUMERIC
+    assert table.entry('groupby', 'by').kinds is None
+
+    table.register('subset', complete_nothing, 'dropna', kinds=NUMERIC)
+    assert table.entry('dropna', 'subset').kinds == NUMERIC
+    assert table.entry('drop_duplicates', 'subset').kinds is None
+
+
+def test_dtype_constraints_of_overrides_for_any_method():
+    table = KeywordTable(default_completer=complete_nothing, overrides={})
+    table.register('by', complete_nothing, kinds=NUMERIC)
+    assert table.entry('sort_values', 'by').kinds == NUMERIC
+    assert table.entry('user_defined_method', 'by').kinds == NUMERIC
+
+    table.register('on', complete_nothing, kinds=NUMERIC)
+    assert table.entry('merge', 'on').kinds == NUMERIC
+    # the constraint of the method still applies
+    assert table.entry('resample', 'on').kinds == DATETIME
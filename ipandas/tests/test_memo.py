@@ -0,0 +1,55 @@
+import pandas as pd
+
+from ipandas.config import config, FUZZY
+from ipandas.memo import CompletionMemo, completion_memo
+from ipandas.stats import stats
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+def test_narrows_previous_matches():
+    memo = CompletionMemo()
+    frame = pd.DataFrame(columns=['temp_a', 'temp_b', 'tempo'])
+    resolve = {'df': frame}.get
+    memo.remember('df[["te', ['temp_a', 'temp_b', 'tempo'], generation=1, bindings=[('df', frame)])
+    assert memo.refine('df[["temp_', 1, resolve) == ['temp_a', 'temp_b']
+    assert memo.refine('df[["temp_b', 1, resolve) == ['temp_b']
+    # nothing left to narrow
+    assert memo.refine('df[["temp_bx', 1, resolve) is None
+
+
+def test_invalidation():
+    memo = CompletionMemo()
+    frame = pd.DataFrame(columns=['temp_a', 'tempo'])
+    memo.remember('df[["te', ['temp_a', 'tempo'], generation=1, bindings=[('df', frame)])
+    # the cursor left the argument
+    assert memo.refine('df[["te", "', 1, {'df': frame}.get) is None
+    assert memo.refine('df[["t', 1, {'df': frame}.get) is None
+    # a cell was executed, the name was rebound
+    assert memo.refine('df[["temp', 2, {'df': frame}.get) is None
+    assert memo.refine('df[["temp', 1, {'df': frame.copy()}.get) is None
+    assert memo.refine('df[["temp', 1, {'df': frame}.get) == ['temp_a', 'tempo']
+
+
+def test_consecutive_keystrokes(completer_with_dataframe):
+    c = completer_with_dataframe
+    completion_memo.clear()
+    stats.reset()
+    c.complete('df.groupby(by="F')
+    text, matches = c.complete('df.groupby(by="Fav')
+    assert matches == ['FavoriteFood']
+    assert stats.counters['memo.hit'] == 1
+
+    get_ipython().run_cell("df = df.rename(columns={'FavoriteFood': 'Favorite'})")
+    text, matches = c.complete('df.groupby(by="Favo')
+    assert matches == ['Favorite']
+
+
+def test_ranked_matches_are_not_narrowed(completer_with_dataframe, monkeypatch):
+    monkeypatch.setattr(config, 'completion_mode', FUZZY)
+    c = completer_with_dataframe
+    completion_memo.clear()
+    stats.reset()
+    c.complete('df.groupby(by="a')
+    c.complete('df.groupby(by="am')
+    assert stats.counters['memo.hit'] == 0
@@ -0,0 +1,54 @@
+import gc
+import weakref
+
+import pandas as pd
+
+from ipandas import background
+from ipandas.index import cached_label_index
+from ipandas.namespace import FrameNamespace
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+def test_refreshes_after_cell_execution(ipython_with_ipandas_ext):
+    ip = ipython_with_ipandas_ext
+    namespace = FrameNamespace()
+    namespace.attach(ip)
+    try:
+        ip.run_cell('import pandas as pd; frame_a = pd.DataFrame(columns=["a"]); not_a_frame = 1')
+        frame = namespace.get('frame_a')
+        assert list(frame.columns) == ['a']
+        assert namespace.get('not_a_frame') is None
+
+        ip.run_cell('frame_a = pd.DataFrame(columns=["b"])')
+        assert list(namespace.get('frame_a').columns) == ['b']
+    finally:
+        namespace.detach(ip)
+
+
+def test_does_not_keep_frames_alive():
+    user_ns = {'df': pd.DataFrame(columns=['a'])}
+    namespace = FrameNamespace()
+    namespace._user_ns = user_ns
+    namespace.refresh()
+    ref = weakref.ref(user_ns['df'])
+    assert namespace.get('df') is ref()
+
+    del user_ns['df']
+    gc.collect()
+    assert ref() is None
+    assert namespace.get('df') is None
+    assert not namespace._refs
+
+
+def test_prebuilds_column_index_after_execution(ipython_with_ipandas_ext):
+    ip = ipython_with_ipandas_ext
+    namespace = FrameNamespace()
+    namespace.attach(ip)
+    try:
+        ip.run_cell('import pandas as pd; prebuilt = pd.DataFrame(columns=["a", "b"])')
+        frame = namespace.get('prebuilt')
+        background.submit(('prebuild', id(frame)), lambda: None).result()
+        assert cached_label_index(frame.columns).prefix('a') == ['a']
+    finally:
+        namespace.detach(ip)
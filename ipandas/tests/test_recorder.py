@@ -0,0 +1,68 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from ipandas.config import config
+from ipandas.recorder import fingerprint, schema_id
+from ipandas.replay import stub_frame, replay
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+def test_stub_frame_has_the_schema_of_the_frame():
+    frame = pd.DataFrame({'a': [1], 'b': [2], 'c': [1.5], 'd': ['x'], 'e': pd.Categorical(['y']),
+                          'f': pd.to_datetime(['2021-01-01']).tz_localize('UTC'), 'g': [3]})
+    frame = frame.set_index(['d', 'f'])
+    schema = fingerprint(frame)
+    # dtypes are run-length encoded, in column order
+    assert schema['dtypes'] == [['int64', 2], ['float64', 1], ['category', 1], ['int64', 1]]
+    assert schema['index']['names'] == ['d', 'f']
+    stub = stub_frame(json.loads(json.dumps(schema)))
+    assert len(stub) == 0
+    assert stub.columns.equals(frame.columns)
+    assert stub.dtypes.astype(str).tolist() == frame.dtypes.astype(str).tolist()
+    assert list(stub.index.names) == ['d', 'f']
+    assert schema_id(fingerprint(stub)) != schema_id(schema)  # the stub has no rows
+
+
+def test_stub_frame_of_multi_level_columns():
+    columns = pd.MultiIndex.from_product([['metric', 2], ['a', 'b']])
+    frame = pd.DataFrame(np.zeros((2, 4)), columns=columns)
+    stub = stub_frame(json.loads(json.dumps(fingerprint(frame))))
+    assert stub.columns.tolist() == columns.tolist()
+
+
+def test_record_and_replay(ipython_with_ipandas_ext, tmp_path, monkeypatch):
+    ip = ipython_with_ipandas_ext
+    path = str(tmp_path / 'completions.jsonl')
+    ip.run_cell('import pandas as pd\n'
+                'df = pd.DataFrame({"temp": [1.0], "when": pd.to_datetime(["2021"]), "city": ["a"]})\n'
+                'other = pd.DataFrame({"temp": [1.0], "k": [1]})')
+    ip.run_line_magic('ipandas_record', path)
+    try:
+        for text in ('df.resample(on="', 'df.groupby(by="', 'df.groupby(by="te', 'df.merge(other, on="'):
+            ip.Completer.complete(line_buffer=text, cursor_pos=len(text))
+    finally:
+        ip.run_line_magic('ipandas_record', '--stop')
+    assert config.record_path is None
+
+    with open(path) as f:
+        entries = [json.loads(line) for line in f]
+    schemas = [entry for entry in entries if 'schema' in entry]
+    requests = [entry for entry in entries if 'schema' not in entry]
+    # each schema is written once
+    assert len(schemas) == 2
+    assert [request['text'] for request in requests] == ['df.resample(on="', 'df.groupby(by="', 'df.groupby(by="te',
+                                                         'df.merge(other, on="']
+    assert requests[0]['frames'] == {'df': schemas[0]['schema']}
+    assert requests[0]['matches'] == 1 and requests[0]['stages_ms']['total'] > 0
+    assert requests[0]['cell'] != requests[1]['cell']
+    # narrowed from the memo, nothing was resolved
+    assert requests[2]['frames'] == {} and requests[2]['counters']['memo.hit'] == 1
+    assert set(requests[3]['frames']) == {'df', 'other'}
+
+    monkeypatch.setitem(ip.user_ns, 'df', None)
+    results = replay(ip, path)
+    assert [result['replayed_matches'] for result in results] == [request['matches'] for request in requests]
+    assert isinstance(ip.user_ns['df'], pd.DataFrame) and len(ip.user_ns['df']) == 0
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from ipandas import rows
+from ipandas.config import config
+from ipandas.deadline import Deadline
+from ipandas.rows import row_label_matches, level_name_matches, get_row_index
+
+
+def test_monotonic_index_is_searched_in_place():
+    df = pd.DataFrame({'a': range(5)}, index=['a1', 'a2', 'a2', 'b1', 'c'])
+    assert row_label_matches(df, 'a') == ['a1', 'a2']
+    assert row_label_matches(df, 'b') == ['b1']
+    assert row_label_matches(df, 'x') == []
+    assert get_row_index(df.index).sorted_labels is None
+
+
+def test_non_monotonic_index_is_sorted_once():
+    df = pd.DataFrame({'a': range(4)}, index=['b1', 'a2', None, 'a1'])
+    assert row_label_matches(df, 'a') == ['a1', 'a2']
+    sorted_labels = get_row_index(df.index).sorted_labels
+    assert sorted_labels.tolist() == ['a1', 'a2', 'b1']
+    assert row_label_matches(df) == ['a1', 'a2', 'b1']
+    assert get_row_index(df.index).sorted_labels is sorted_labels
+
+
+def test_timestamp_prefixes():
+    days = pd.DataFrame({'a': range(5)}, index=pd.date_range('2021-02-27', periods=5, freq='D'))
+    assert row_label_matches(days, '2021-03') == ['2021-03-01', '2021-03-02', '2021-03-03']
+    assert row_label_matches(days, '2021-02-2') == ['2021-02-27', '2021-02-28']
+    assert row_label_matches(days, '2021-13') == []
+    assert row_label_matches(days, 'x') == []
+
+    hours = pd.DataFrame({'a': range(30)}, index=pd.date_range('2021-01-01', periods=30, freq='h', unit='ns'))
+    assert row_label_matches(hours, '2021-01-02T0') == ['2021-01-02 00:00:00', '2021-01-02 01:00:00',
+                                                        '2021-01-02 02:00:00', '2021-01-02 03:00:00',
+                                                        '2021-01-02 04:00:00', '2021-01-02 05:00:00']
+
+
+def test_matches_are_capped(monkeypatch):
+    monkeypatch.setattr(config, 'max_completions', 3)
+    df = pd.DataFrame({'a': range(10)}, index=['k{}'.format(i) for i in range(10)][::-1])
+    assert row_label_matches(df, 'k') == ['k0', 'k1', 'k2']
+
+
+def test_long_index_is_sorted_in_the_background(monkeypatch):
+    monkeypatch.setattr(rows, 'SYNC_BUILD_ROWS', 2)
+    df = pd.DataFrame({'a': range(3)}, index=['c', 'a', 'b'])
+    deadline = Deadline(10)
+    assert row_label_matches(df, 'b', deadline=deadline) == ['b']
+    assert not deadline.partial
+
+
+def test_level_names():
+    df = pd.DataFrame({'a': [1]}, index=pd.MultiIndex.from_tuples([('x', 1)], names=['key', None]))
+    assert level_name_matches(df) == ['key']
+    assert level_name_matches(df, 'x') == []
+    assert row_label_matches(df, 'x') == ['x']
@@ -0,0 +1,26 @@
+from ipandas.scanner import CellScanner
+
+
+def test_finds_statement_under_cursor():
+    scanner = CellScanner()
+    cell = 'x = df[["a"]]\ndf = df.groupby(by=["a",\n                  "b'
+    assert scanner.scan(cell).statement == 'df = df.groupby(by=["a",\n                  "b'
+
+    # brackets and statement separators inside strings and comments are ignored
+    assert scanner.scan('df[["a;b", "(\n# ]\n"c').statement == 'df[["a;b", "(\n# ]\n"c'
+
+
+def test_scans_only_new_characters():
+    scanner = CellScanner()
+    state = scanner.scan('a = 1\ndf.groupby(by="')
+    assert scanner.scan('a = 1\ndf.groupby(by="Na') is state
+    assert state.statement == 'df.groupby(by="Na'
+    assert state.quote == '"'
+    assert state.brackets == [16]
+
+
+def test_window_is_bounded():
+    scanner = CellScanner(max_window=20)
+    # an unterminated string far away from the cursor is outside of the window
+    cell = '\n'.join(['"'] + ['x = {}'.format(i) for i in range(100)] + ['df[["a'])
+    assert scanner.scan(cell).statement == 'df[["a'
@@ -0,0 +1,46 @@
+import functools
+
+import pandas as pd
+
+from ipandas.signatures import SignatureRegistry
+
+
+def test_pandas_methods_are_precomputed():
+    registry = SignatureRegistry()
+    assert registry.parameters(pd.DataFrame, 'groupby')[:2] == ('by', 'level')
+    assert pd.DataFrame in registry._precomputed
+    assert registry.parameters(pd.DataFrame, 'drop_duplicates')[0] == 'subset'
+    assert registry.parameters(pd.DataFrame, 'columns') is None
+    # keyword only parameters are left out
+    assert registry.parameters(pd.DataFrame, 'pivot') == ()
+
+
+def test_entry_is_invalidated_when_method_changes():
+    class Frame(object):
+        def method(self, a, b):
+            pass
+
+    registry = SignatureRegistry()
+    assert registry.parameters(Frame, 'method') == ('a', 'b')
+
+    def method(self, c):
+        pass
+
+    Frame.method = method
+    assert registry.parameters(Frame, 'method') == ('c',)
+
+
+def test_callables_are_memoized_by_function_object():
+    def f(a, b=None):
+        pass
+
+    registry = SignatureRegistry()
+    assert registry.callable_parameters(f) == ('a', 'b')
+    assert f in registry._callables
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        pass
+
+    assert registry.callable_parameters(wrapper) == ('a', 'b')
+    assert registry.callable_parameters(functools.partial(f, 1)) == ('b',)
@@ -0,0 +1,55 @@
+import json
+
+from ipandas.config import config
+from ipandas.stats import Histogram, stats, timed, traced, count
+# noinspection PyUnresolvedReferences
+from .fixtures import *
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000.0)
+    assert histogram.count == 100
+    # buckets have a relative error of ~9%
+    assert 0.045 <= histogram.percentile(50) <= 0.055
+    assert 0.09 <= histogram.percentile(95) <= 0.1
+    assert histogram.percentile(100) == 0.1
+
+
+def test_disabled_stats_are_not_recorded(monkeypatch):
+    stats.reset()
+    monkeypatch.setattr(config, 'collect_stats', False)
+    with timed('stage'):
+        pass
+    assert not stats.histograms
+
+
+def test_traced_without_stats(monkeypatch):
+    stats.reset()
+    monkeypatch.setattr(config, 'collect_stats', False)
+    with traced() as trace:
+        with timed('stage'):
+            count('hit')
+        with timed('stage'):
+            pass
+    with timed('after'):
+        pass
+    assert list(trace.stages) == ['stage'] and trace.stages['stage'] > 0
+    assert trace.counters == {'hit': 1}
+    assert not stats.histograms and not stats.counters
+
+
+def test_stats_magic(completer_with_dataframe, capsys):
+    stats.reset()
+    completer_with_dataframe.complete('df.groupby(by="')
+    ip = completer_with_dataframe.shell
+    capsys.readouterr()
+    ip.run_line_magic('ipandas_stats', '--json --reset')
+    output = json.loads(capsys.readouterr().out)
+    assert output['stages']['total']['count'] == 1
+    assert output['stages']['callback.complete_keyword']['count'] == 1
+    # every matcher tried is scanned under a single sample
+    assert output['stages']['matchers']['count'] == 1
+    assert output['counters'].get('namespace.hit', 0) + output['counters'].get('namespace.miss', 0) == 1
+    assert not stats.histograms
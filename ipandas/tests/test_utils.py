@@ -1,7 +1,5 @@
-import pytest
-
 from ipandas.utils import extract_keyword_args_from_arguments_string, KeywordMatch, _extract_argument_from_string, \
-    ArgumentResult
+    ArgumentResult, parse_arguments
 
 
 def f(a, b, c=None):
@@ -30,10 +28,10 @@ def test_parses_argument_correctly():
     assert _extract_argument_from_string(argument) == ArgumentResult(['a', 'b', ["c", 1]], is_complete=False,
                                                                      is_collection=True, current_value=None)
     argument = '["a","b",["c]", 1],'
-    assert _extract_argument_from_string(argument) == ArgumentResult(['a', 'b', ["c", 1]], is_complete=False,
+    assert _extract_argument_from_string(argument) == ArgumentResult(['a', 'b', ["c]", 1]], is_complete=False,
                                                                      is_collection=True, current_value=None)
 
-@pytest.mark.xfail
+
 def test_parses_correctly_with_dict():
     argument = '["a","b",{"k": "v'
     assert _extract_argument_from_string(argument) == ArgumentResult(['a', 'b'], is_complete=False,
@@ -45,4 +43,42 @@ def test_extracts_params_correctly():
     assert arguments == [KeywordMatch('a', '1'), KeywordMatch('b', 2), KeywordMatch('c', 3)]
 
     arguments = extract_keyword_args_from_arguments_string('"1", ["a","b","c"], ["a", "', f)
-    assert arguments == [KeywordMatch('a', '1')]
+    assert arguments == [KeywordMatch('a', '1'), KeywordMatch('b', ''), KeywordMatch('c', '')]
+
+
+def test_parses_arguments_in_one_pass():
+    arguments = parse_arguments('"a(", by=[("x", 1), {"k": [1, 2]}], sort=True, key=str.lower, axis=df.x + 1, level="l')
+    assert arguments == [
+        (None, ArgumentResult('a(', is_complete=True, is_collection=False, current_value=None)),
+        ('by', ArgumentResult([('x', 1), {'k': [1, 2]}], is_complete=True, is_collection=True, current_value=None)),
+        ('sort', ArgumentResult(True, is_complete=True, is_collection=False, current_value=None)),
+        ('key', ArgumentResult('str.lower', is_complete=True, is_collection=False, current_value=None)),
+        ('axis', ArgumentResult('df.x + 1', is_complete=True, is_collection=False, current_value=None)),
+        ('level', ArgumentResult(None, is_complete=False, is_collection=False, current_value='l')),
+    ]
+
+    # escaped quotes and brackets inside strings
+    assert _extract_argument_from_string('["a\\"]", "b\'[", (\'c') == \
+        ArgumentResult(['a"]', "b'["], is_complete=False, is_collection=True, current_value='c')
+
+
+def test_positional_arguments_after_keywords_are_ignored():
+    assert extract_keyword_args_from_arguments_string('"x", c=1, "', f) == [KeywordMatch('a', 'x'), KeywordMatch('c', 1)]
+    assert extract_keyword_args_from_arguments_string('', parameters=('by',)) == [KeywordMatch('by', '')]
+    assert extract_keyword_args_from_arguments_string('"x", "') == []
+
+
+def test_skips_collection_items_without_values():
+    typed = 'by=[("x", 1), {"k": [1, 2]}], key=str.lower, level=["a", r"b\\\\", {"c": 1, "d'
+    assert parse_arguments(typed, values=False) == [
+        ('by', ArgumentResult([], is_complete=True, is_collection=True, current_value=None)),
+        ('key', ArgumentResult('str.lower', is_complete=True, is_collection=False, current_value=None)),
+        ('level', ArgumentResult([], is_complete=False, is_collection=True, current_value='d')),
+    ]
+    # a dict being typed keeps its items
+    assert parse_arguments('by={"a": 1, "b"')[-1][1].argument == [('a', 1), 'b']
+
+    # resumes from the previous keystroke, and starts over when the text doesn't extend it
+    for text in ('by=["a", "b", ["c", "d"], "e', 'by=["a", "b", ["c", "d"], "ef', 'by=["a", ["b"]], x="y',
+                 'by=["a", "b", "c'):
+        assert parse_arguments(text, values=False)[-1][1].current_value == parse_arguments(text)[-1][1].current_value
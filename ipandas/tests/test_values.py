@@ -0,0 +1,58 @@
+import pandas as pd
+
+from ipandas import values, background
+from ipandas.namespace import frame_namespace
+from ipandas.values import SketchCache, complete_column_values
+
+
+def test_categorical_values_come_from_categories():
+    df = pd.DataFrame({'city': pd.Categorical(['London', 'Paris'], categories=['London', 'Lyon', 'Paris'])})
+    assert complete_column_values(df, 'city', 'L') == ['London', 'Lyon']
+
+
+def test_values_ordered_by_frequency():
+    df = pd.DataFrame({'city': ['Lyon', 'London', 'London', None, 'Paris'], 'n': range(5)})
+    assert complete_column_values(df, 'city', 'L') == ['London', 'Lyon']
+    assert complete_column_values(df, 'n', '1') == []
+    assert complete_column_values(df, 'missing', 'L') == []
+
+
+def test_sketches_follow_column_changes(monkeypatch):
+    df = pd.DataFrame({'city': ['London', 'Lyon'], 'n': [1, 2]})
+    assert set(complete_column_values(df, 'city', 'L')) == {'London', 'Lyon'}
+    df['city'] = df['city'].str.upper()
+    assert set(complete_column_values(df, 'city', 'L')) == {'LONDON', 'LYON'}
+    # written in place, sketched again after the next cell execution
+    df.loc[0, 'city'] = 'Leeds'
+    monkeypatch.setattr(frame_namespace, 'generation', frame_namespace.generation + 1)
+    assert set(complete_column_values(df, 'city', 'L')) == {'Leeds', 'LYON'}
+
+
+def test_sketches_follow_column_changes_without_blocks(monkeypatch):
+    monkeypatch.setattr(values, 'column_block', lambda frame, column: None)
+    df = pd.DataFrame({'city': ['London', 'Lyon'], 'n': [1, 2]})
+    assert set(complete_column_values(df, 'city', 'L')) == {'London', 'Lyon'}
+    df['city'] = df['city'].str.upper()
+    monkeypatch.setattr(frame_namespace, 'generation', frame_namespace.generation + 1)
+    assert set(complete_column_values(df, 'city', 'L')) == {'LONDON', 'LYON'}
+
+
+def test_long_columns_are_sketched_in_the_background(monkeypatch):
+    monkeypatch.setattr(values, 'SYNC_BUILD_ROWS', 2)
+    cache = SketchCache()
+    df = pd.DataFrame({'city': ['London', 'Lyon', 'Paris']})
+    assert cache.get(df, 'city') is None
+    background.submit(('value_sketch', id(df), 'city'), lambda: None).result()
+    assert cache.get(df, 'city').prefix('L') == ['London', 'Lyon']
+
+
+def test_cache_evicts_least_recently_used():
+    df = pd.DataFrame({'a': ['x' * 100], 'b': ['y' * 100], 'c': ['z' * 100]})
+    cache = SketchCache(max_bytes=400)
+    cache.get(df, 'a')
+    cache.get(df, 'b')
+    cache.get(df, 'a')
+    cache.get(df, 'c')
+    assert len(cache) == 2
+    assert (id(df), 'b') not in cache._sketches
+    assert cache.nbytes <= 400
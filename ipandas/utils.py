@@ -1,25 +1,47 @@
 import ast
-import inspect
 import re
 from collections import namedtuple
-from inspect import Signature
-from typing import NamedTuple, List, Callable
+from typing import NamedTuple, List, Callable, Sequence, Optional, Tuple
 
 import logbook
 
+from ipandas.signatures import signature_registry
+
 logger = logbook.Logger('IPandasCompleter')
 
-kwargs_re = re.compile('''
-                       (?P<identifier>\w+)=
-                       (?P<kw>(?:'\w*'*|\"\w*\"*)         # Option 1 - Keyword is string
-                       |(?P<num>[\d\.]+)                  # Option 2 - Keyword is number (capture it)
-                       |(?:[\[{(]                         # Option 2 - Keyword is a list/dict
-                       [{@\w:,\s\'\"]+                    # contents of list
-                       [}\])]?$                           # Closing is optional - as it might not be provided
-                       ))?                                # The whole group is optional
-                       ''', re.VERBOSE | re.MULTILINE)
-commas_not_preceded_by_brackets = re.compile(r'(?<=[\]})])\s*,', re.MULTILINE)
-comma_followed_by_brackets = re.compile(r',(?=\s*[\[{(])\s*', re.MULTILINE)
+# tokens of an argument list, strings may be unterminated - the cursor is inside the last one
+token_re = re.compile(r'''\s*(
+    [rRbBuUfF]{0,2}(?:"[^"\\\n]*(?:\\.[^"\\\n]*)*"?|'[^'\\\n]*(?:\\.[^'\\\n]*)*'?)  # string
+    |(?:\d[\d_]*(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?j?                                # number
+    |\w+                                                                            # name
+    |==|!=|<=|>=|->|\*\*                                                            # operators
+    |.)''', re.VERBOSE | re.DOTALL)
+
+
+
+def _closed_items_re(depth: int) -> str:
+    """
+    A pattern for the items of a collection: anything but brackets and quotes, closed strings,
+    and closed (balanced) collections nested up to `depth` levels. Loops are unrolled (`a*(?:b a*)*`)
+    so a failed match backtracks linearly.
+    """
+    other = r'[^\'"()\[\]{}]'
+    string = r'"[^"\\\n]*(?:\\.[^"\\\n]*)*"|\'[^\'\\\n]*(?:\\.[^\'\\\n]*)*\''
+    items = '{0}*(?:(?:{1}){0}*)*'.format(other, string)
+    for _ in range(depth):
+        group = r'\[{0}\]|\({0}\)|\{{{0}\}}'.format(items)
+        items = '{0}*(?:(?:{1}|{2}){0}*)*'.format(other, string, group)
+    return items
+
+
+# skips the closed items of a collection in a single match, when their values aren't needed
+_closed_items_re = re.compile(_closed_items_re(3))
+
+_QUOTES = frozenset('\'"')
+_STRING_PREFIXES = frozenset('rRbBuUfF')
+_CONSTANTS = {'True': True, 'False': False, 'None': None}
+_CLOSING = {'[': ']', '(': ')', '{': '}'}
+_CLOSED_BY = frozenset(_CLOSING.values())
 
 
 class KeywordMatch(NamedTuple('KeywordMatch', [('keyword', str), ('is_complete', str)])):
@@ -31,119 +53,279 @@ class ArgumentResult(namedtuple('ArgumentResult',
     pass
 
 
-def has_open_quotes(s):
-    # We check " first, then ', so complex cases with nested quotes will get
-    # the " to take precedence.
-    if s.count('"') % 2:
-        return '"'
-    elif s.count("'") % 2:
-        return "'"
-    else:
-        return False
+class _Container(object):
+    """
+    An open bracket while parsing, collects the values of its completed items.
+    """
+    __slots__ = ('bracket', 'items', 'keys', 'slot_start', 'slot_tokens', 'slot_value', 'key')
+
+    def __init__(self, bracket: Optional[str], start: int):
+        self.bracket = bracket
+        self.items = []
+        # dict literals collect (key, value) pairs in `items`
+        self.keys = False
+        self.key = _NOTHING
+        self.slot_start = start
+        self.slot_tokens = 0
+        self.slot_value = None
+
+    def end_slot(self, text: str, end: int, start: int):
+        """
+        Ends the item that started at `slot_start`, returns its value or _NOTHING for an empty item.
+        An item of more than one token is an expression, its value is its source text.
+        """
+        if self.slot_tokens == 0:
+            value = _NOTHING
+        elif self.slot_tokens == 1:
+            value = self.slot_value
+        else:
+            value = text[self.slot_start:end].strip()
+        self.slot_start = start
+        self.slot_tokens = 0
+        self.slot_value = None
+        return value
+
+    def append(self, value) -> None:
+        if value is _NOTHING:
+            return
+        if self.key is not _NOTHING:
+            self.items.append((self.key, value))
+            self.key = _NOTHING
+        else:
+            self.items.append(value)
 
+    def value(self):
+        if self.bracket == '(':
+            return tuple(self.items)
+        if self.bracket == '{':
+            try:
+                return dict(self.items) if self.keys else set(self.items)
+            except (TypeError, ValueError):
+                # unhashable items, or a dict being typed ({"a": 1, "b")
+                return list(self.items)
+        return list(self.items)
 
-# TODO: this doesn't consider brackets inside strings at all
-def has_open_bracket(string):
-    if string.count('[') == string.count(']'):
-        return False
-    return True
 
+class _Nothing(object):
+    def __repr__(self):
+        return '<nothing>'
 
-# TODO: this is not finished..
-def has_open_dict(string):
-    if string.count('{') == string.count('}'):
-        return False
-    else:
-        comma_followed_by_brackets = re.compile(r',(?=\s*[\[{(])\s*', re.MULTILINE)
 
+_NOTHING = _Nothing()
 
-def _extract_argument_from_string(argument_string: str) -> ArgumentResult:
-    argument_is_complete = False
-    if not argument_string:
-        argument_is_complete = True
-        return ArgumentResult(None, argument_is_complete, is_collection=False, current_value=None)
-
-    argument_string = argument_string.strip('"').strip("'").strip()
-    first_char = argument_string[0]
-    arguments = None
-    if first_char == '[':
-        argument_is_complete = not has_open_bracket(argument_string)
-        if argument_is_complete:
-            return ArgumentResult(ast.literal_eval(argument_string),
-                                  is_complete=argument_is_complete,
-                                  is_collection=True,
-                                  current_value=None)
-        open_quote = has_open_quotes(argument_string)
-        last_in_collection = None
-        if open_quote:
-            last_in_collection = argument_string[argument_string.rfind(open_quote):].strip(open_quote)
-
-        while has_open_quotes(argument_string):
-            open_quote = has_open_quotes(argument_string)
-            argument_string += open_quote
-
-        while has_open_bracket(argument_string):
-            argument_string += ']'
-
-        # we don't return the last value as part of the collection
-        if last_in_collection:
-            ret = ast.literal_eval(argument_string)[:-1]
-        else:
-            ret = ast.literal_eval(argument_string)
 
-        return ArgumentResult(ret,
-                              is_complete=argument_is_complete,
-                              is_collection=True,
-                              current_value=last_in_collection)
+def _string_token(token: str) -> Tuple[str, bool]:
+    """
+    Returns the value of a string token and whether it's closed.
+    """
+    prefix_length = 0 if token[0] in _QUOTES else (1 if token[1] in _QUOTES else 2)
+    quote = token[prefix_length]
+    body = token[prefix_length + 1:]
+    closed = False
+    if body and body[-1] == quote:
+        # an odd number of backslashes escapes the last quote
+        backslashes = len(body) - 1 - len(body[:-1].rstrip('\\'))
+        closed = backslashes % 2 == 0
+    if closed:
+        body = body[:-1]
+    if '\\' in body and 'r' not in token[:prefix_length].lower():
+        try:
+            body = ast.literal_eval(quote + (body if closed else body.rstrip('\\')) + quote)
+        except (ValueError, SyntaxError):
+            pass
+    return body, closed
+
 
+class _Checkpoint(object):
+    """
+    The parser state inside the collection the cursor was in, at the end of its last skipped items.
 
-def _extract_last_value_from_string_argument(argument_string: str) -> str:
+    Consecutive completion requests extend the text of the previous one, parsing an argument list without values
+    resumes here instead of skipping the items of the collection again - a keystroke costs the characters typed
+    since, not the length of the list. Containers inside collections hold no items without values,
+    so the state is the arguments before and the slots of the open brackets.
     """
-    Internal function for argument string cleanup.
+    __slots__ = ('text', 'arguments', 'keyword', 'containers')
 
-    Parameters
-    ----------
-    argument_string
-        A string representing an argument to a function.
-        Can be a string containing a list/tuple/set.
+    def __init__(self, text: str, arguments: list, keyword: Optional[str], stack: List[_Container]):
+        self.text = text
+        self.arguments = list(arguments)
+        self.keyword = keyword
+        self.containers = [(c.bracket, c.keys, c.key, c.slot_start, c.slot_tokens, c.slot_value) for c in stack]
 
-    Returns
-    -------
-    last_argument - string
-        A clean string (no brackets, quotation marks) of the last value in iterable argument or the argument.
-    """
+    def restore(self) -> Tuple[list, Optional[str], List[_Container]]:
+        stack = []
+        for bracket, keys, key, slot_start, slot_tokens, slot_value in self.containers:
+            container = _Container(bracket, slot_start)
+            container.keys, container.key = keys, key
+            container.slot_tokens, container.slot_value = slot_tokens, slot_value
+            stack.append(container)
+        return list(self.arguments), self.keyword, stack
 
-    # we can't have trailing spaces because we will not receive them from IPython
-    # (since it always gives us string util tab)
-    def _remove_unwanted_chars(string):
-        if not string:
-            return ''
 
-        for i, char in enumerate(string):
-            if char in r'\'\"[]()':
+_checkpoint = None  # type: Optional[_Checkpoint]
+
+
+def _open_token_start(text: str, start: int, end: int) -> int:
+    """
+    Returns where the token at `end` starts, a string prefix (r"...) skipped as part of the items belongs to it.
+    """
+    if end == len(text) or text[end] not in _QUOTES:
+        return end
+    # tokenize the names and numbers right before the quote, the token reaching past it is the open string
+    position = end
+    while position > start and (text[position - 1].isalnum() or text[position - 1] == '_'):
+        position -= 1
+    while position < end:
+        match = token_re.match(text, position)
+        if match.end() > end:
+            return match.start(1)
+        position = match.end()
+    return end
+
+
+def parse_arguments(arguments_string: str, values: bool = True) -> List[Tuple[Optional[str], ArgumentResult]]:
+    """
+    Parses the arguments of a call up to the cursor in one pass over its tokens.
+
+    The values of complete items are built while scanning - strings, numbers, constants and nested
+    lists, tuples, sets and dicts. Anything else (names, expressions) is kept as its source text.
+    The value of the last argument only holds its complete items: the open string the cursor is in is
+    its `current_value`, and open brackets nested in it are left out.
+
+    :param values: False skips the items of collections instead of building them - collections are empty,
+                   scalars and `current_value` are the same. Completion only needs the latter,
+                   and a list of thousands of items is then skipped at regex speed
+    :return: (keyword or None for positional arguments, ArgumentResult) for every argument,
+             the last one being the argument the cursor is in
+    """
+    global _checkpoint
+    checkpoint = _checkpoint
+    if not values and checkpoint is not None and arguments_string.startswith(checkpoint.text):
+        arguments, keyword, stack = checkpoint.restore()
+        position = len(checkpoint.text)
+    else:
+        arguments, keyword, stack = [], None, [_Container(None, 0)]
+        position = 0
+    container = stack[-1]
+    current_value = None
+    length = len(arguments_string)
+    skip_start = skip_end = None
+    while True:
+        if not values and len(stack) > 1:
+            # stops at a bracket, or at an open string
+            skip_start = position
+            position = skip_end = _open_token_start(arguments_string, position,
+                                                    _closed_items_re.match(arguments_string, position).end())
+        match = token_re.match(arguments_string, position)
+        if match is None:
+            break
+        position = match.end()
+        token = match.group(1)
+        first = token[0]
+        if first in _QUOTES and len(token) > 1 and token[-1] == first and '\\' not in token:
+            # plain closed string, the common case
+            container.slot_tokens += 1
+            container.slot_value = token[1:-1]
+        elif first in _QUOTES or (first in _STRING_PREFIXES and ('"' in token or "'" in token)):
+            value, closed = _string_token(token)
+            if not closed:
+                current_value = value
+                break
+            container.slot_tokens += 1
+            container.slot_value = value
+        elif first.isalnum() or first == '_' or (first == '.' and len(token) > 1):
+            if first.isdigit() or first == '.':
+                value = coerce_to_number(token.replace('_', ''))
+            else:
+                value = _CONSTANTS.get(token, token)
+            container.slot_tokens += 1
+            container.slot_value = value
+        elif first in _CLOSING:
+            container = _Container(first, match.end())
+            stack.append(container)
+        elif first in _CLOSED_BY:
+            if len(stack) == 1 or _CLOSING[container.bracket] != first:
+                # unbalanced, this isn't a well formed argument list
+                container.slot_tokens += 1
+                container.slot_value = token
                 continue
+            if values:
+                container.append(container.end_slot(arguments_string, match.start(1), match.end()))
+            stack.pop()
+            value = container.value()
+            container = stack[-1]
+            if values or len(stack) == 1:
+                container.slot_tokens += 1
+                container.slot_value = value
+        elif first == ',':
+            value = container.end_slot(arguments_string, match.start(1), match.end())
+            if len(stack) == 1:
+                arguments.append((keyword, _complete_argument(value)))
+                keyword = None
             else:
-                return string[i:]
-        return string
+                container.append(value)
+        elif first == ':' and container.bracket == '{':
+            container.keys = True
+            container.key = container.end_slot(arguments_string, match.start(1), match.end())
+        elif token == '=' and len(stack) == 1 and container.slot_tokens == 1 \
+                and isinstance(container.slot_value, str) and container.slot_value.isidentifier():
+            keyword = container.slot_value
+            container.end_slot(arguments_string, match.start(1), match.end())
+        else:
+            container.slot_tokens += 1
+            container.slot_value = token
+
+    if not values and len(stack) > 1 and skip_end is not None:
+        # a name or number before the cursor may still grow, resume before it
+        while skip_end > skip_start and (arguments_string[skip_end - 1].isalnum() or
+                                         arguments_string[skip_end - 1] == '_'):
+            skip_end -= 1
+        _checkpoint = _Checkpoint(arguments_string[:skip_end], arguments, keyword, stack)
+
+    if len(stack) > 1:
+        # the cursor is inside a collection - its complete items are the value, open nested collections are not
+        collection = stack[1]
+        if len(stack) == 2 and current_value is None:
+            collection.append(collection.end_slot(arguments_string, length, length))
+        result = ArgumentResult(collection.value(), is_complete=False, is_collection=True,
+                                current_value=current_value)
+    elif current_value is not None:
+        result = ArgumentResult(None, is_complete=False, is_collection=False, current_value=current_value)
+    else:
+        result = _complete_argument(stack[0].end_slot(arguments_string, length, length))
+    arguments.append((keyword, result))
+    return arguments
 
-    if argument_string is None:
-        return ''
 
-    argument_string = argument_string.strip('"').strip("'").strip()
+def _complete_argument(value) -> ArgumentResult:
+    if value is _NOTHING:
+        return ArgumentResult(None, is_complete=True, is_collection=False, current_value=None)
+    return ArgumentResult(value, is_complete=True, is_collection=isinstance(value, (list, tuple, set, dict)),
+                          current_value=None)
 
-    # we accept string which represent a list/tuple/set argument
-    if argument_string and argument_string[0] in ['[', '(']:
-        # if only a bracket - there is no value
-        if len(argument_string) == 1:
-            return ''
 
-        # we want the last value from the list
-        return _remove_unwanted_chars(argument_string.split(',')[-1].strip())
-    return _remove_unwanted_chars(argument_string)
+def _extract_argument_from_string(argument_string: str) -> ArgumentResult:
+    """
+    Parses a single argument, ex. `["a", "b", "c` is ['a', 'b'] with 'c' being typed.
+    """
+    return parse_arguments(argument_string)[-1][1]
+
+
+def _keyword_value(result: ArgumentResult):
+    """
+    The value completed for an argument - the text typed in the open string, or the value of a complete scalar.
+    """
+    if result.current_value is not None:
+        return result.current_value
+    if result.is_collection or result.argument is None:
+        return ''
+    return result.argument
 
 
 def extract_keyword_args_from_arguments_string(arguments_string_until_current_value: str,
-                                               function_object: Callable = None) -> List[KeywordMatch]:
+                                               function_object: Callable = None,
+                                               parameters: Sequence[str] = None) -> List[KeywordMatch]:
     """
     This function gets a string representing the arguments we have so far,
     and returns a tuple of the current keyword and the current value being completed.
@@ -158,59 +340,31 @@ def extract_keyword_args_from_arguments_string(arguments_string_until_current_va
         the function object we are that will be used for introspection
         if not provided will skip introspection and fail
 
+    parameters: Sequence[str], Optional
+        parameter names of the function in positional order,
+        takes precedence over introspecting `function_object`
+
     Returns
     -------
      list of KeywordMatch
     """
-    logger.debug('text to kwargs regex: {}'.format(arguments_string_until_current_value))
-    kw_matches = list(kwargs_re.finditer(arguments_string_until_current_value))
-    if kw_matches:
-        logger.debug(kw_matches)
-        matches = list()
-        for match in kw_matches:
-            d = match.groupdict()
-            param, value = d['identifier'], d['kw']
-            numerical_match = d.get('num')
-            if numerical_match:
-                value = coerce_to_number(value)
-            matches.append((param, value))
-
-    elif function_object:
-        logger.debug('kwargs regex failed, inferring parameters from function signature')
-        # extract keyword_name from signature
-        sig = inspect.signature(function_object)  # type: Signature
-        params = list(sig.parameters.values())
-        # we need to cover all the following cases
-        # field = ['a', 'b'], ['b', 'c', 'd', # bracket preceding comma
-        # field = ['b', 'c', 'd'], 'a', # bracket preceding comma
-        # field = 'a', ['b', 'c', 'd', # bracket following comma
-        # field = ['a', ' # single list argument
-        # field = 'a', 'b' # no list arguments, split by ,
-        if commas_not_preceded_by_brackets.findall(arguments_string_until_current_value):
-            arguments = commas_not_preceded_by_brackets.split(arguments_string_until_current_value)
-        elif comma_followed_by_brackets.findall(arguments_string_until_current_value):
-            arguments = comma_followed_by_brackets.split(arguments_string_until_current_value)
-        elif any([x in arguments_string_until_current_value for x in '[{(']):
-            arguments = [arguments_string_until_current_value]
-        else:
-            arguments = arguments_string_until_current_value.split(',')
-
-        matches = zip(map(lambda p: p.name, params), arguments)
-
-    else:
-        return []
+    logger.debug('arguments: {}', arguments_string_until_current_value)
+    arguments = parse_arguments(arguments_string_until_current_value, values=False)
+    if parameters is None and function_object is not None and arguments[0][0] is None:
+        parameters = signature_registry.callable_parameters(function_object)
 
     keywords = list()
-    for match in matches:
-        logger.debug(match)
-        # this will handle the case where the argument is list-like
-        current_param, current_value = match
-        if isinstance(current_value, str):
-            current_value = _extract_last_value_from_string_argument(current_value)
-
-        logger.debug('{}: {}'.format(current_param, current_value))
-        keywords.append(KeywordMatch(current_param, current_value))
-
+    seen_keyword = False
+    for position, (keyword, result) in enumerate(arguments):
+        if keyword is not None:
+            seen_keyword = True
+        elif seen_keyword or parameters is None or position >= len(parameters):
+            # positional arguments can't follow keyword arguments
+            continue
+        else:
+            keyword = parameters[position]
+        keywords.append(KeywordMatch(keyword, _keyword_value(result)))
+    logger.debug(keywords)
     return keywords
 
 
@@ -0,0 +1,163 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import List, Optional, Hashable, Tuple
+
+import logbook
+from pandas import DataFrame, Series, Index, CategoricalDtype
+from pandas.api.types import is_object_dtype, is_string_dtype
+
+from ipandas import background
+from ipandas.deadline import Deadline
+from ipandas.dtypes import column_block
+from ipandas.index import ColumnIndex, get_label_index
+from ipandas.namespace import frame_namespace
+from ipandas.stats import count
+
+logger = logbook.Logger('IPandasCompleter')
+
+# columns up to this length are sketched inside the completion request, longer ones in the background
+SYNC_BUILD_ROWS = 100000
+# number of rows sampled when building a sketch for a long column
+SAMPLE_ROWS = 1000000
+# most frequent values kept per column
+MAX_VALUES = 10000
+# total (approximate) memory of cached sketches, least recently used sketches are evicted first
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# python object overhead of a cached string, used to estimate sketch size
+_STRING_OVERHEAD = 64
+
+
+class ValueSketch(object):
+    """
+    The most frequent distinct string values of a column, ordered by frequency.
+
+    Short columns are sketched exactly, long columns from a random sample of `SAMPLE_ROWS` rows,
+    so the sketch is bounded to `MAX_VALUES` values regardless of the column length.
+    """
+
+    def __init__(self, values: Index):
+        self.index = ColumnIndex(values)
+        self.nbytes = sum(len(value) + _STRING_OVERHEAD for value in self.index.labels)
+
+    @classmethod
+    def from_series(cls, series: Series) -> 'ValueSketch':
+        if len(series) > SAMPLE_ROWS:
+            series = series.sample(SAMPLE_ROWS, random_state=0)
+        counts = series.value_counts(dropna=True)
+        return cls(counts.index[:MAX_VALUES])
+
+    def prefix(self, prefix: str = None) -> List[str]:
+        return self.index.prefix(prefix)
+
+
+def _version(frame: DataFrame, column: Hashable) -> Tuple:
+    """
+    Returns a value that changes whenever the values of `frame[column]` may have changed.
+
+    Reassigning the column or changing its dtype replaces its block, see dtypes.dtypes_version.
+    Values written in place (`df.loc[0, "city"] = ...`) keep the block, so short columns are sketched again
+    after every cell execution - long columns only when replaced.
+    Without the block (see dtypes.blocks_of) a replaced column can't be told apart, any column is sketched again.
+    """
+    block = column_block(frame, column)
+    if block is None:
+        return len(frame), str(frame.dtypes[column]), None, frame_namespace.generation
+    generation = frame_namespace.generation if len(frame) <= SYNC_BUILD_ROWS else None
+    return len(frame), str(block.dtype), weakref.ref(block), generation
+
+
+class SketchCache(object):
+    """
+    LRU cache of ValueSketches keyed by frame and column, bounded by the total memory of the sketches.
+    """
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        # (id(frame), column) -> (weakref to frame, version, sketch)
+        self._sketches = OrderedDict()
+        # reentrant, the weakref callbacks may run during a garbage collection triggered while holding it
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._sketches)
+
+    def _forget_frame(self, frame_id: int) -> None:
+        with self._lock:
+            for key in [key for key in self._sketches if key[0] == frame_id]:
+                self.nbytes -= self._sketches.pop(key)[2].nbytes
+
+    def _lookup(self, frame: DataFrame, column: Hashable) -> Optional[ValueSketch]:
+        key = (id(frame), column)
+        with self._lock:
+            entry = self._sketches.get(key)
+            if entry is None:
+                return None
+            ref, version, sketch = entry
+            if ref() is frame and version == _version(frame, column):
+                self._sketches.move_to_end(key)
+                return sketch
+            # stale entry, the frame was replaced or the column changed
+            self.nbytes -= self._sketches.pop(key)[2].nbytes
+            return None
+
+    def _build(self, frame: DataFrame, column: Hashable) -> ValueSketch:
+        version = _version(frame, column)
+        sketch = ValueSketch.from_series(frame[column])
+        key = (id(frame), column)
+        ref = weakref.ref(frame, lambda _, frame_id=id(frame): self._forget_frame(frame_id))
+        with self._lock:
+            old = self._sketches.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2].nbytes
+            self._sketches[key] = (ref, version, sketch)
+            self.nbytes += sketch.nbytes
+            while self.nbytes > self.max_bytes and len(self._sketches) > 1:
+                _, (_, _, evicted) = self._sketches.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        logger.debug('built value sketch for {!r} with {} values'.format(column, len(sketch.index)))
+        return sketch
+
+    def get(self, frame: DataFrame, column: Hashable, deadline: Deadline = None) -> Optional[ValueSketch]:
+        """
+        Returns the sketch for `frame[column]`.
+        For long columns this starts building the sketch in the background
+        and returns None if it isn't ready by the deadline.
+        """
+        sketch = self._lookup(frame, column)
+        count('value_sketch.hit' if sketch is not None else 'value_sketch.miss')
+        if sketch is not None:
+            return sketch
+        if len(frame) <= SYNC_BUILD_ROWS:
+            return self._build(frame, column)
+        future = background.submit(('value_sketch', id(frame), column), self._build, frame, column)
+        if deadline is None:
+            return None
+        return deadline.wait(future)
+
+
+value_sketches = SketchCache()
+
+
+def complete_column_values(frame: DataFrame, column: Hashable, current_value: str = None,
+                           deadline: Deadline = None) -> List[str]:
+    """
+    Completes the string values of `frame[column]`.
+    Categorical columns are completed from their categories, object and string columns from a ValueSketch.
+    """
+    if not isinstance(frame, DataFrame):
+        # the schema of a non pandas frame, we don't read its data
+        return []
+    if column not in frame.columns or not frame.columns.is_unique:
+        return []
+    dtype = frame[column].dtype
+    if isinstance(dtype, CategoricalDtype):
+        return get_label_index(dtype.categories).prefix(current_value)
+    if not (is_object_dtype(dtype) or is_string_dtype(dtype)):
+        return []
+    sketch = value_sketches.get(frame, column, deadline=deadline)
+    if sketch is None:
+        return []
+    return sketch.prefix(current_value)
@@ -1,6 +1,6 @@
 from setuptools import setup, find_packages
 
-REQUIRES = ['logbook', 'pytest', 'pandas']
+REQUIRES = ['logbook', 'pytest', 'pandas', 'numpy']
 
 
 def main():